@@ -0,0 +1,123 @@
+"""Ansible callback plugin writing the task results as json lines for the toolbox."""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+    name: toolbox_events
+    type: notification
+    short_description: Write the task results of a run as json lines
+    description:
+      - Appends one json object per task result and one with the final stats of
+        the run to a file, so the toolbox webapp can report per-host and per-task
+        results without parsing the human readable output.
+    requirements:
+      - enable in configuration
+    options:
+      events_file:
+        description: The file to append the events to.
+        env:
+          - name: TOOLBOX_EVENTS_FILE
+"""
+
+import json  # noqa: E402
+import time  # noqa: E402
+
+from ansible.plugins.callback import CallbackBase  # noqa: E402
+
+MAX_MESSAGE_LENGTH = 1000
+
+
+class CallbackModule(CallbackBase):
+    """Callback writing the task results to the file in TOOLBOX_EVENTS_FILE."""
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "notification"
+    CALLBACK_NAME = "toolbox_events"
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        """Initialize the callback."""
+        super(CallbackModule, self).__init__()
+        self._events_file = None
+        self._task_started = {}
+        self._host_started = {}
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        """Open the events file."""
+        super(CallbackModule, self).set_options(
+            task_keys=task_keys, var_options=var_options, direct=direct
+        )
+        events_file = self.get_option("events_file")
+        if events_file:
+            self._events_file = open(events_file, "a")
+
+    def _write(self, event):
+        """Append an event to the events file."""
+        if self._events_file is None:
+            return
+        self._events_file.write(json.dumps(event) + "\n")
+        self._events_file.flush()
+
+    def _write_result(self, result, status, ignored=False):
+        """Append the result of a task on a host to the events file."""
+        host = result._host.get_name()
+        task = result._task
+        now = time.time()
+        started = self._host_started.pop(
+            (host, task._uuid), self._task_started.get(task._uuid, now)
+        )
+        message = result._result.get("msg", "")
+        if not isinstance(message, str):
+            message = json.dumps(message)
+        self._write(
+            {
+                "event": "task_result",
+                "host": host,
+                "task": task.get_name(),
+                "role": task._role.get_name() if task._role else None,
+                "action": task.action,
+                "status": status,
+                "changed": bool(result._result.get("changed", False)),
+                "ignored": ignored,
+                "started": started,
+                "duration": round(now - started, 3),
+                "message": message[:MAX_MESSAGE_LENGTH],
+            }
+        )
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        """Remember when the task started."""
+        self._task_started[task._uuid] = time.time()
+
+    def v2_playbook_on_handler_task_start(self, task):
+        """Remember when the handler started."""
+        self._task_started[task._uuid] = time.time()
+
+    def v2_runner_on_start(self, host, task):
+        """Remember when the task started on the host."""
+        self._host_started[(host.get_name(), task._uuid)] = time.time()
+
+    def v2_runner_on_ok(self, result):
+        """Record a successful task."""
+        self._write_result(result, "ok")
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        """Record a failed task."""
+        self._write_result(result, "failed", ignored=ignore_errors)
+
+    def v2_runner_on_skipped(self, result):
+        """Record a skipped task."""
+        self._write_result(result, "skipped")
+
+    def v2_runner_on_unreachable(self, result):
+        """Record an unreachable host."""
+        self._write_result(result, "unreachable")
+
+    def v2_playbook_on_stats(self, stats):
+        """Record the final stats of every host."""
+        hosts = {host: stats.summarize(host) for host in sorted(stats.processed)}
+        self._write({"event": "stats", "hosts": hosts})
+        if self._events_file is not None:
+            self._events_file.close()
+            self._events_file = None
@@ -2,18 +2,25 @@
 
 import json
 from pathlib import Path
+from typing import Dict, Union
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+from toolbox.api.jobs import job_output_response
 from toolbox.core.ansible import Ansible
 from toolbox.core.file import CustomFiles
-from toolbox.core.rsakey import RSAKey
+from toolbox.core.jobs import JobManager
+from toolbox.core.rsakey import open_request
 
 
 def custom_endpoints(app: FastAPI) -> FastAPI:
     """
     Aggregate of all the /api/custom endpoints.
 
+    The fields encrypted with the public key may instead be sealed together in
+    {"envelope": {...}}, as described in RSAKey.open_envelope.
+
     Args:
         app (FastAPI): The FastAPI app.
     Returns:
@@ -69,8 +76,8 @@ def custom_endpoints(app: FastAPI) -> FastAPI:
             raise HTTPException(status_code=404, detail=str(e))
         return jsonable_encoder(items)
 
-    @app.put("/api/custom/run", response_model=str)
-    async def run_custom(request: Request) -> str:
+    @app.put("/api/custom/run", response_model=Union[str, Dict[str, str]])
+    async def run_custom(request: Request) -> Union[str, Dict[str, str]]:
         """
         Run a custom playbook.
 
@@ -79,8 +86,21 @@ def custom_endpoints(app: FastAPI) -> FastAPI:
             "hosts": "hosts",
             "user": "user",
             "password": "password",
-            "playbook": "playbook"
+            "playbook": "playbook",
+            "background": false,
+            "timeout": 3600,
+            "retries": 0,
+            "retry_delay": 30
         }
+
+        "hosts" may also name groups of the inventory/hosts file, or ansible host
+        patterns of its groups and hosts, which the run is then limited to.
+        If "background" is true, return {"job_id": "job_id"} right away instead of the output.
+        If "timeout" is given, the run is stopped and failed after that many seconds.
+        If "retries" is given, the hosts that failed are run on again that many times
+        at most, waiting "retry_delay" seconds before the first retry and twice as
+        long before every next one. The job of a retry is given as "retried_by" in
+        the status of the job it retries.
         """
         try:
             data = await request.json()
@@ -90,6 +110,10 @@ def custom_endpoints(app: FastAPI) -> FastAPI:
             )
         if data is None:
             raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, decrypt = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         try:
             if (
                 data["hosts"] == ""
@@ -111,14 +135,14 @@ def custom_endpoints(app: FastAPI) -> FastAPI:
         except ValueError:
             verbosity = 0
         try:
-            hosts = RSAKey().decrypt(data["hosts"])
-            user = RSAKey().decrypt(data["user"])
-            password = RSAKey().decrypt(data["password"])
-            playbook = RSAKey().decrypt(data["playbook"])
+            hosts = decrypt(data["hosts"])
+            user = decrypt(data["user"])
+            password = decrypt(data["password"])
+            playbook = decrypt(data["playbook"])
             try:
-                extra_vars = RSAKey().decrypt(data["extra_vars"])
-                tags = RSAKey().decrypt(data["tags"])
-                extra_args = RSAKey().decrypt(data["extra_args"])
+                extra_vars = decrypt(data["extra_vars"])
+                tags = decrypt(data["tags"])
+                extra_args = decrypt(data["extra_args"])
             except KeyError:
                 extra_vars = json.dumps([])
                 tags = ""
@@ -156,16 +180,28 @@ def custom_endpoints(app: FastAPI) -> FastAPI:
             verbosity=verbosity,
             tags=tags,
             extra_args=extra_args,
-        )
+        ).resolve_groups()
         try:
-            ansible.verify_auth()
+            await run_in_threadpool(ansible.verify_auth)
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
         install_command = ansible.get_command()
         try:
-            result = ansible.run_command(install_command)
+            job = JobManager().submit(
+                ansible,
+                install_command,
+                timeout=data.get("timeout"),
+                retries=data.get("retries", 0),
+                retry_delay=data.get("retry_delay", 30),
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if data.get("background", False):
+            return {"job_id": job.id}
+        try:
+            await job.wait()
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
-        return result
+        return job_output_response(job)
 
     return app
@@ -7,12 +7,16 @@ from typing import Dict, List, Union
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.encoders import jsonable_encoder
 from toolbox.core.file import AnsibleRootFolder, File, Folder
+from toolbox.core.rsakey import open_request
 
 
 def editor_endpoints(app: FastAPI) -> FastAPI:
     """
     Aggregate of all the /api/editor endpoints.
 
+    The data of the requests may be sealed in {"envelope": {...}}, as described
+    in open_request.
+
     Args:
         app (FastAPI): The FastAPI app.
     Returns:
@@ -86,6 +90,10 @@ def editor_endpoints(app: FastAPI) -> FastAPI:
             raise HTTPException(status_code=400, detail="No data provided.")
         if data is None or data == {}:
             raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, _ = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         try:
             if data["path"] == "":
                 raise HTTPException(status_code=400, detail="Missing path or content.")
@@ -116,6 +124,10 @@ def editor_endpoints(app: FastAPI) -> FastAPI:
             raise HTTPException(status_code=400, detail="No data provided.")
         if data is None or data == {}:
             raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, _ = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         try:
             if data["path"] == "":
                 raise HTTPException(status_code=400, detail="Missing path.")
@@ -149,6 +161,10 @@ def editor_endpoints(app: FastAPI) -> FastAPI:
             raise HTTPException(status_code=400, detail="No data provided.")
         if data is None or data == {}:
             raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, _ = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         try:
             if data["path"] == "":
                 raise HTTPException(status_code=400, detail="Missing path.")
@@ -178,6 +194,10 @@ def editor_endpoints(app: FastAPI) -> FastAPI:
             raise HTTPException(status_code=400, detail="No data provided.")
         if data is None or data == {}:
             raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, _ = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         try:
             if data["path"] == "" or data["new_path"] == "":
                 raise HTTPException(status_code=400, detail="Missing path or new_path.")
@@ -208,6 +228,10 @@ def editor_endpoints(app: FastAPI) -> FastAPI:
             raise HTTPException(status_code=400, detail="No data provided.")
         if data is None or data == {}:
             raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, _ = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         try:
             if data["path"] == "":
                 raise HTTPException(status_code=400, detail="Missing path.")
@@ -241,6 +265,10 @@ def editor_endpoints(app: FastAPI) -> FastAPI:
             raise HTTPException(status_code=400, detail="No data provided.")
         if data is None or data == {}:
             raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, _ = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         try:
             if data["path"] == "":
                 raise HTTPException(status_code=400, detail="Missing path.")
@@ -274,6 +302,10 @@ def editor_endpoints(app: FastAPI) -> FastAPI:
             raise HTTPException(status_code=400, detail="No data provided.")
         if data is None or data == {}:
             raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, _ = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         try:
             if data["path"] == "":
                 raise HTTPException(status_code=400, detail="Missing path.")
@@ -303,6 +335,10 @@ def editor_endpoints(app: FastAPI) -> FastAPI:
             raise HTTPException(status_code=400, detail="No data provided.")
         if data is None:
             raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, _ = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         try:
             if data["path"] == "" or data["new_path"] == "":
                 raise HTTPException(status_code=400, detail="Missing path or new_path.")
@@ -0,0 +1,407 @@
+"""Job API endpoints."""
+
+from datetime import datetime
+import json
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import (
+    FileResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
+from pydantic import ValidationError
+from toolbox.core.jobs import Job, JobManager
+from toolbox.core.results import TaskResult, filter_tasks
+from toolbox.core.timings import (
+    Timing,
+    get_role_durations,
+    get_slowest_tasks,
+)
+
+
+def job_output_response(job: Job) -> StreamingResponse:
+    """
+    Return the output of a finished job as one JSON string, streamed from its log.
+
+    The response reads as the same JSON string as returning the whole output
+    would, without the output ever being held in memory.
+
+    Args:
+        job (Job): The finished job.
+    Returns:
+        StreamingResponse: The response.
+    """
+
+    def chunks() -> Iterator[str]:
+        yield '"'
+        empty = True
+        for chunk in job.iter_output():
+            empty = False
+            yield json.dumps(chunk)[1:-1]
+        if empty:
+            yield json.dumps(str(job.result))[1:-1]
+        yield '"'
+
+    return StreamingResponse(chunks(), media_type="application/json")
+
+
+def jobs_endpoints(app: FastAPI) -> FastAPI:
+    """
+    Aggregate of all the /api/jobs endpoints.
+
+    Args:
+        app (FastAPI): The FastAPI app.
+    Returns:
+        FastAPI: The FastAPI app.
+    """
+
+    @app.get("/api/jobs", response_model=Dict[str, Any])
+    def list_jobs(
+        host: Optional[str] = None,
+        tag: Optional[str] = None,
+        status: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        before: Optional[str] = None,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """
+        Return a page of the job history, newest first.
+
+        The history can be narrowed down with the "host", "tag", "status", "since"
+        and "until" query parameters. To get the next page, pass the "next" value
+        of the current page as "before". At most 500 jobs are returned per page.
+
+        Format:
+        {
+            "jobs": [
+                {
+                    "id": "job_id",
+                    "playbook": "install.yml",
+                    "inventory": "host1,host2,",
+                    "tags": ["tag1", "tag2", ...],
+                    "hosts": {"host1": "ok" | "changed" | "failed" | "unreachable" | null, ...},
+                    "status": "pending" | "running" | "succeeded" | "failed" | "cancelled",
+                    "created_at": "2023-01-01T00:00:00",
+                    "started_at": "2023-01-01T00:00:00",
+                    "finished_at": "2023-01-01T00:00:00",
+                    "duration": 12.5,
+                    "error": "ansible error",
+                    "log_path": "/path/to/job_id.log"
+                },
+                ...
+            ],
+            "next": "job_id" | null
+        }
+        """
+        if limit < 1 or limit > 500:
+            raise HTTPException(
+                status_code=400, detail="Limit must be between 1 and 500."
+            )
+        try:
+            jobs, next_before = (
+                JobManager()
+                .get_store()
+                .list_jobs(
+                    host=host,
+                    tag=tag,
+                    status=status,
+                    since=since,
+                    until=until,
+                    before=before,
+                    limit=limit,
+                )
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"jobs": jobs, "next": next_before}
+
+    @app.get("/api/jobs/timings", response_model=Dict[str, Any])
+    def get_timings(top: int = 10, jobs: int = 100) -> Dict[str, Any]:
+        """
+        Return the tasks and roles that took the most time in the last playbook runs.
+
+        The timings of the last "jobs" playbook runs are aggregated. The time of a
+        role is the time it took on a single host in a single run.
+
+        Format:
+        {
+            "tasks": [
+                {
+                    "role": "role1",
+                    "task": "Install package",
+                    "runs": 4,
+                    "total": 120.0,
+                    "mean": 30.0,
+                    "max": 42.5
+                },
+                ...
+            ],
+            "roles": [
+                {"role": "role1", "task": "", "runs": 2, ...},
+                ...
+            ]
+        }
+        """
+        try:
+            timings = JobManager().get_store().get_timings(top, jobs)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {
+            key: [Timing(**timing) for timing in rows] for key, rows in timings.items()
+        }
+
+    @app.get("/api/jobs/{job_id}", response_model=Dict[str, Any])
+    def get_job_status(job_id: str) -> Dict[str, Any]:
+        """
+        Return the status of a job.
+
+        Format:
+        {
+            "id": "job_id",
+            "playbook": "install.yml",
+            "inventory": "host1,host2,",
+            "tags": ["tag1", "tag2", ...],
+            "status": "pending" | "running" | "succeeded" | "failed" | "cancelled",
+            "created_at": "2023-01-01T00:00:00",
+            "started_at": "2023-01-01T00:00:00",
+            "finished_at": "2023-01-01T00:00:00"
+        }
+
+        Jobs that are no longer kept in memory are looked up in the job history.
+        """
+        try:
+            job = JobManager().get_job(job_id)
+        except ValueError:
+            try:
+                record = JobManager().get_store().get_job(job_id)
+            except ValueError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            return {
+                key: value
+                for key, value in record.items()
+                if key not in ("error", "log_path")
+            }
+        return jsonable_encoder(job.get_status())
+
+    @app.put("/api/jobs/{job_id}/cancel", response_model=Dict[str, Any])
+    async def cancel_job(job_id: str) -> Dict[str, Any]:
+        """
+        Cancel a pending or running job.
+
+        A running ansible process is stopped together with the ssh sessions it
+        started. The status of the cancelled job is returned, in the same format
+        as /api/jobs/{job_id}.
+        """
+        try:
+            job = JobManager().get_job(job_id)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        try:
+            job.cancel()
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        await job.wait_finished()
+        return jsonable_encoder(job.get_status())
+
+    @app.put("/api/jobs/{job_id}/retry", response_model=Dict[str, str])
+    async def retry_job(job_id: str, request: Request) -> Dict[str, str]:
+        """
+        Run a finished job again, only on the hosts that failed or were unreachable.
+
+        Input Format (optional):
+        {
+            "retries": 0,
+            "retry_delay": 30
+        }
+
+        Return {"job_id": "job_id"} of the job retrying the failed hosts.
+        If "retries" is given, the hosts failing again are retried automatically
+        that many more times, waiting "retry_delay" seconds before the first retry
+        and twice as long before every next one.
+        """
+        body = await request.body()
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Malformed data.")
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=400, detail="Malformed data.")
+        try:
+            JobManager().get_job(job_id)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        try:
+            job = JobManager().retry(
+                job_id,
+                retries=data.get("retries", 0),
+                retry_delay=data.get("retry_delay", 30),
+            )
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return {"job_id": job.id}
+
+    @app.get("/api/jobs/{job_id}/result", response_model=Dict[str, Any])
+    def get_job_result(job_id: str) -> Dict[str, Any]:
+        """
+        Return the result of a finished job.
+
+        Format:
+        {
+            "id": "job_id",
+            "status": "succeeded" | "failed" | "cancelled",
+            "result": "ansible outcome",
+            "error": "ansible error",
+            "output": "last lines of the ansible output"
+        }
+        """
+        try:
+            job = JobManager().get_job(job_id)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        if not job.is_finished():
+            raise HTTPException(status_code=409, detail="Job has not finished yet.")
+        return {
+            "id": job.id,
+            "status": job.status,
+            "result": job.result,
+            "error": job.error,
+            "output": job.get_output_tail(),
+        }
+
+    @app.get("/api/jobs/{job_id}/hosts", response_model=Dict[str, Dict[str, Any]])
+    def get_job_hosts(job_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the task counts and the overall status of every host of a job.
+
+        While the job is running, the counts cover the tasks finished so far.
+
+        Format:
+        {
+            "host1": {
+                "host": "host1",
+                "ok": 10,
+                "changed": 2,
+                "failures": 0,
+                "skipped": 1,
+                "unreachable": 0,
+                "rescued": 0,
+                "ignored": 0,
+                "status": "ok" | "changed" | "failed" | "unreachable"
+            },
+            ...
+        }
+        """
+        try:
+            job = JobManager().get_job(job_id)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return job.get_results().get_hosts()
+
+    @app.get("/api/jobs/{job_id}/tasks", response_model=List[TaskResult])
+    def get_job_tasks(
+        job_id: str, host: Optional[str] = None, status: Optional[str] = None
+    ) -> List[TaskResult]:
+        """
+        Return the result of every task on every host of a job, in order.
+
+        The results can be narrowed down with the "host" and "status" query
+        parameters. The status is one of ok, changed, failed, skipped or unreachable.
+
+        Format:
+        [
+            {
+                "host": "host1",
+                "task": "Install package",
+                "role": "role1",
+                "action": "apt",
+                "status": "ok" | "failed" | "skipped" | "unreachable",
+                "changed": true,
+                "ignored": false,
+                "started": 1672531200.0,
+                "duration": 1.5,
+                "message": ""
+            },
+            ...
+        ]
+        """
+        try:
+            job = JobManager().get_job(job_id)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return filter_tasks(job.iter_task_results(), host=host, status=status)
+
+    @app.get("/api/jobs/{job_id}/timings", response_model=Dict[str, Any])
+    def get_job_timings(job_id: str, top: int = 10) -> Dict[str, Any]:
+        """
+        Return the slowest tasks and the time of every role on every host of a job.
+
+        Format:
+        {
+            "tasks": {
+                "host1": [{"task": "Install package", "duration": 42.5, ...}, ...],
+                ...
+            },
+            "roles": {
+                "host1": {"role1": 60.0, "role2": 12.5, "": 3.0},
+                ...
+            }
+        }
+
+        Tasks outside of roles are counted under the empty role.
+        """
+        if top < 1:
+            raise HTTPException(status_code=400, detail="Top must be at least 1.")
+        try:
+            job = JobManager().get_job(job_id)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return jsonable_encoder(
+            {
+                "tasks": get_slowest_tasks(job.iter_task_results(), top),
+                "roles": get_role_durations(job.iter_task_results()),
+            }
+        )
+
+    @app.get("/api/jobs/{job_id}/log", response_class=PlainTextResponse)
+    def get_job_log(job_id: str) -> Response:
+        """Return the whole output of a job as plain text."""
+        try:
+            log_path = JobManager().get_job(job_id).get_log_path()
+        except ValueError:
+            try:
+                log_path = Path(JobManager().get_store().get_job(job_id)["log_path"])
+            except ValueError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+        if not log_path.is_file():
+            return PlainTextResponse("")
+        return FileResponse(log_path, media_type="text/plain")
+
+    @app.get("/api/jobs/{job_id}/stream")
+    async def stream_job_output(job_id: str) -> StreamingResponse:
+        """
+        Stream the output of a job line by line as server-sent events.
+
+        Every line of output is sent as a "data" event. Once the job has finished,
+        an "end" event with the final status of the job is sent.
+        """
+        try:
+            job = JobManager().get_job(job_id)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+
+        async def events() -> AsyncIterator[str]:
+            async for line in job.follow_output():
+                line = line.rstrip("\r\n")
+                yield f"data: {line}\n\n"
+            yield f"event: end\ndata: {job.status.value}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
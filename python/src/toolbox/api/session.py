@@ -0,0 +1,67 @@
+"""Session API endpoints."""
+
+from json import JSONDecodeError
+from typing import Any, Dict
+
+from fastapi import FastAPI, HTTPException, Request
+from toolbox.core.rsakey import RSAKey
+from toolbox.core.sessions import SessionCache
+
+
+def session_endpoints(app: FastAPI) -> FastAPI:
+    """
+    Aggregate of all the /api/session endpoints.
+
+    Args:
+        app (FastAPI): The FastAPI app.
+    Returns:
+        FastAPI: The FastAPI app.
+    """
+
+    @app.put("/api/session", response_model=Dict[str, Any])
+    async def open_session(request: Request) -> Dict[str, Any]:
+        """
+        Open a session whose requests are sealed with a symmetric key.
+
+        Input Format:
+        {
+            "key": "base64 of an AES key encrypted with the public key (RSA-OAEP)"
+        }
+
+        Format:
+        {
+            "session": "session id",
+            "expires_in": 3600
+        }
+
+        The requests of the session then send their fields in
+        {"envelope": {"session": "session id", "iv": ..., "data": ...}}, with the
+        fields encrypted with the key of the session and a new iv every time.
+        Once the session has expired, requests fail with "Unknown or expired
+        session." and a new session has to be opened.
+        """
+        try:
+            data = await request.json()
+        except JSONDecodeError:
+            raise HTTPException(
+                status_code=400, detail="No data provided or malformed data."
+            )
+        if not isinstance(data, dict) or not isinstance(data.get("key"), str):
+            raise HTTPException(status_code=400, detail="Missing key.")
+        try:
+            key = RSAKey().decrypt_key(data["key"])
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Malformed key.")
+        session_id = SessionCache().open(key)
+        return {"session": session_id, "expires_in": SessionCache().ttl}
+
+    @app.delete("/api/session/{session_id}", response_model=Dict[str, str])
+    def close_session(session_id: str) -> Dict[str, str]:
+        """Close a session."""
+        try:
+            SessionCache().close(session_id)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return {"closed": "true"}
+
+    return app
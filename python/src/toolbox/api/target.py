@@ -1,17 +1,32 @@
 """Target API endpoints."""
 
 from json import JSONDecodeError
+from typing import Dict, Union
 
 from fastapi import FastAPI, HTTPException, Request
-from toolbox.core.ansible import Ansible
-from toolbox.core.rsakey import RSAKey
+from starlette.concurrency import run_in_threadpool
+from toolbox.api.jobs import job_output_response
+from toolbox.core.ansible import Ansible, check_auth_report
+from toolbox.core.facts import FactCache
+from toolbox.core.installed import InstalledState
+from toolbox.core.jobs import JobManager
+from toolbox.core.results import HostReachability, get_reachability
+from toolbox.core.rolling import Rollout
+from toolbox.core.rsakey import open_request
 from toolbox.helpers.config_target import config_target
 
+ALREADY_INSTALLED = "All the selected software is installed on the hosts already."
+PING_FORKS = 100
+PING_TIMEOUT = 10
+
 
 def target_endpoints(app: FastAPI) -> FastAPI:
     """
     Aggregate of all the /api/target endpoints.
 
+    The fields encrypted with the public key may instead be sealed together in
+    {"envelope": {...}}, as described in RSAKey.open_envelope.
+
     Args:
         app (FastAPI): The FastAPI app.
     Returns:
@@ -39,6 +54,10 @@ def target_endpoints(app: FastAPI) -> FastAPI:
             )
         if data is None:
             raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, decrypt = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         try:
             if (
                 data["hosts"] == ""
@@ -54,10 +73,10 @@ def target_endpoints(app: FastAPI) -> FastAPI:
                 status_code=400, detail="Missing hosts, user, password or OS."
             )
         try:
-            hosts = RSAKey().decrypt(data["hosts"])
-            user = RSAKey().decrypt(data["user"])
-            password = RSAKey().decrypt(data["password"])
-            operating_system = RSAKey().decrypt(data["os"])
+            hosts = decrypt(data["hosts"])
+            user = decrypt(data["user"])
+            password = decrypt(data["password"])
+            operating_system = decrypt(data["os"])
         except ValueError:
             raise HTTPException(
                 status_code=400,
@@ -79,8 +98,13 @@ def target_endpoints(app: FastAPI) -> FastAPI:
             )
         return "Configured target machines."
 
-    @app.put("/api/target/ping", response_model=str)
-    async def ping_target(request: Request) -> str:
+    @app.put(
+        "/api/target/ping",
+        response_model=Union[Dict[str, str], Dict[str, HostReachability]],
+    )
+    async def ping_target(
+        request: Request,
+    ) -> Union[Dict[str, str], Dict[str, HostReachability]]:
         """
         Ping the target machines.
 
@@ -88,8 +112,28 @@ def target_endpoints(app: FastAPI) -> FastAPI:
         {
             "hosts": "hosts",
             "user": "user",
-            "password": "password"
+            "password": "password",
+            "background": false,
+            "forks": 100,
+            "timeout": 10
         }
+
+        Format:
+        {
+            "host1": {"reachable": true, "message": "pong"},
+            "host2": {"reachable": false, "message": "Permission denied."},
+            ...
+        }
+
+        The credentials are verified and the hosts pinged with an ad-hoc ansible
+        ping, "forks" hosts at the same time, each getting "timeout" seconds to
+        connect. Hosts the credentials fail on are reported as not reachable
+        without being pinged. If the credentials fail on all of them, the request
+        fails instead.
+        "hosts" may also name groups of the inventory/hosts file, or ansible host
+        patterns of its groups and hosts, which the run is then limited to.
+        If "background" is true, return {"job_id": "job_id"} right away instead of the
+        reachability, which the results of the job then give.
         """
         try:
             data = await request.json()
@@ -99,6 +143,10 @@ def target_endpoints(app: FastAPI) -> FastAPI:
             )
         if data is None:
             raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, decrypt = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         if data == {}:
             raise HTTPException(status_code=400, detail="No data provided.")
         try:
@@ -111,9 +159,9 @@ def target_endpoints(app: FastAPI) -> FastAPI:
                 status_code=400, detail="Missing hosts, user or password."
             )
         try:
-            hosts = RSAKey().decrypt(data["hosts"])
-            user = RSAKey().decrypt(data["user"])
-            password = RSAKey().decrypt(data["password"])
+            hosts = decrypt(data["hosts"])
+            user = decrypt(data["user"])
+            password = decrypt(data["password"])
         except ValueError:
             raise HTTPException(
                 status_code=400,
@@ -123,25 +171,51 @@ def target_endpoints(app: FastAPI) -> FastAPI:
             raise HTTPException(
                 status_code=400, detail="Missing hosts, user or password."
             )
+        forks = data.get("forks", PING_FORKS)
+        timeout = data.get("timeout", PING_TIMEOUT)
+        if any(
+            not isinstance(value, int) or isinstance(value, bool) or value < 1
+            for value in (forks, timeout)
+        ):
+            raise HTTPException(
+                status_code=400, detail="Forks and timeout must be positive integers."
+            )
         ansible = Ansible(
             inventory=hosts,
             user=user,
             password=password,
             playbook="ping.yml",
-        )
-        try:
-            ansible.verify_auth()
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-        install_command = ansible.get_command()
+            verify_concurrency=forks,
+            connect_timeout=timeout,
+        ).resolve_groups()
+        report = await run_in_threadpool(ansible.verify_auth_report)
+        verified = [host for host, status in report.items() if status == "success"]
+        if report != {} and verified == []:
+            try:
+                check_auth_report(report)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        if report != {}:
+            ansible = ansible.copy(update={"inventory": ",".join(verified)})
+        ping_command = ansible.get_ping_command(forks=forks, timeout=timeout)
+        job = JobManager().submit(ansible, ping_command)
+        if data.get("background", False):
+            return {"job_id": job.id}
         try:
-            result = ansible.run_command(install_command)
+            await job.wait()
         except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-        return result
+            if job.get_results().hosts == {}:
+                raise HTTPException(status_code=400, detail=str(e))
+        reachability = {
+            host: HostReachability(message=status)
+            for host, status in report.items()
+            if status != "success"
+        }
+        reachability.update(get_reachability(verified, job.iter_task_results()))
+        return {host: reachability[host] for host in report or reachability}
 
-    @app.put("/api/target/install", response_model=str)
-    async def install_target(request: Request) -> str:
+    @app.put("/api/target/install", response_model=Union[str, Dict[str, str]])
+    async def install_target(request: Request) -> Union[str, Dict[str, str]]:
         """
         Install the software on the target machines.
 
@@ -150,8 +224,32 @@ def target_endpoints(app: FastAPI) -> FastAPI:
             "hosts": "hosts",
             "user": "user",
             "password": "password",
-            "tags": ["tag1", "tag2", ...]
+            "tags": ["tag1", "tag2", ...],
+            "background": false,
+            "rolling": {"batch_size": "10%", "max_failures": "0", "pause": 0},
+            "timeout": 3600,
+            "retries": 0,
+            "retry_delay": 30,
+            "force": false
         }
+
+        "hosts" may also name groups of the inventory/hosts file, or ansible host
+        patterns of its groups and hosts, which the run is then limited to.
+        If "background" is true, return {"job_id": "job_id"} right away instead of the output.
+        If "rolling" is given, the hosts are run on in batches of "batch_size" hosts,
+        or a percentage of them, with "pause" seconds in between. The batches stop
+        once more than "max_failures" hosts, or a percentage of them, have failed.
+        If "timeout" is given, the run is stopped and failed after that many seconds.
+        If "retries" is given, the hosts that failed are run on again that many times
+        at most, waiting "retry_delay" seconds before the first retry and twice as
+        long before every next one. The job of a retry is given as "retried_by" in
+        the status of the job it retries.
+        Only the roles owning the selected tags are run, from a playbook generated
+        once for every selection of tags.
+        Tags installed successfully before are skipped on every host, unless the
+        roles owning them or the facts of the host have changed since, or "force"
+        is true. If everything is installed already, no job is run and
+        {"result": "..."} is returned in the background.
         """
         try:
             data = await request.json()
@@ -161,6 +259,10 @@ def target_endpoints(app: FastAPI) -> FastAPI:
             )
         if data is None:
             raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, decrypt = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         if data == {}:
             raise HTTPException(status_code=400, detail="No data provided.")
         try:
@@ -178,9 +280,9 @@ def target_endpoints(app: FastAPI) -> FastAPI:
         except KeyError:
             raise HTTPException(status_code=400, detail="No tags provided.")
         try:
-            hosts = RSAKey().decrypt(data["hosts"])
-            user = RSAKey().decrypt(data["user"])
-            password = RSAKey().decrypt(data["password"])
+            hosts = decrypt(data["hosts"])
+            user = decrypt(data["user"])
+            password = decrypt(data["password"])
         except ValueError:
             raise HTTPException(
                 status_code=400,
@@ -197,20 +299,51 @@ def target_endpoints(app: FastAPI) -> FastAPI:
             password=password,
             tags=tags,
             playbook="install.yml",
-        )
+            minimal_playbook=True,
+        ).resolve_groups()
+        rollout = None
+        if data.get("rolling") is not None:
+            try:
+                rollout = Rollout(**data["rolling"])
+            except (ValueError, TypeError) as e:
+                raise HTTPException(status_code=400, detail=str(e))
         try:
-            ansible.verify_auth()
+            await run_in_threadpool(ansible.verify_auth)
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
+        fingerprints = await run_in_threadpool(
+            InstalledState().get_role_fingerprints, ansible
+        )
+        if not data.get("force", False):
+            pending = InstalledState().get_pending(ansible, fingerprints)
+            if pending is None:
+                if data.get("background", False):
+                    return {"result": ALREADY_INSTALLED}
+                return ALREADY_INSTALLED
+            ansible = pending
         install_command = ansible.get_command()
         try:
-            result = ansible.run_command(install_command)
+            job = JobManager().submit(
+                ansible,
+                install_command,
+                rollout=rollout,
+                timeout=data.get("timeout"),
+                retries=data.get("retries", 0),
+                retry_delay=data.get("retry_delay", 30),
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        InstalledState().track_install(job, fingerprints)
+        if data.get("background", False):
+            return {"job_id": job.id}
+        try:
+            await job.wait()
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
-        return result
+        return job_output_response(job)
 
-    @app.put("/api/target/uninstall", response_model=str)
-    async def uninstall_target(request: Request) -> str:
+    @app.put("/api/target/uninstall", response_model=Union[str, Dict[str, str]])
+    async def uninstall_target(request: Request) -> Union[str, Dict[str, str]]:
         """
         Uninstall the software on the target machines.
 
@@ -219,8 +352,28 @@ def target_endpoints(app: FastAPI) -> FastAPI:
             "hosts": "hosts",
             "user": "user",
             "password": "password",
-            "tags": ["tag1", "tag2", ...]
+            "tags": ["tag1", "tag2", ...],
+            "background": false,
+            "rolling": {"batch_size": "10%", "max_failures": "0", "pause": 0},
+            "timeout": 3600,
+            "retries": 0,
+            "retry_delay": 30
         }
+
+        "hosts" may also name groups of the inventory/hosts file, or ansible host
+        patterns of its groups and hosts, which the run is then limited to.
+        If "background" is true, return {"job_id": "job_id"} right away instead of the output.
+        If "rolling" is given, the hosts are run on in batches of "batch_size" hosts,
+        or a percentage of them, with "pause" seconds in between. The batches stop
+        once more than "max_failures" hosts, or a percentage of them, have failed.
+        If "timeout" is given, the run is stopped and failed after that many seconds.
+        If "retries" is given, the hosts that failed are run on again that many times
+        at most, waiting "retry_delay" seconds before the first retry and twice as
+        long before every next one. The job of a retry is given as "retried_by" in
+        the status of the job it retries.
+        Only the roles owning the selected tags are run, from a playbook generated
+        once for every selection of tags.
+        The tags are no longer skipped on the hosts they were uninstalled from.
         """
         try:
             data = await request.json()
@@ -230,6 +383,10 @@ def target_endpoints(app: FastAPI) -> FastAPI:
             )
         if data is None:
             raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, decrypt = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         if data == {}:
             raise HTTPException(status_code=400, detail="No data provided.")
         try:
@@ -247,9 +404,9 @@ def target_endpoints(app: FastAPI) -> FastAPI:
         except KeyError:
             raise HTTPException(status_code=400, detail="No tags provided.")
         try:
-            hosts = RSAKey().decrypt(data["hosts"])
-            user = RSAKey().decrypt(data["user"])
-            password = RSAKey().decrypt(data["password"])
+            hosts = decrypt(data["hosts"])
+            user = decrypt(data["user"])
+            password = decrypt(data["password"])
         except ValueError:
             raise HTTPException(
                 status_code=400,
@@ -266,16 +423,116 @@ def target_endpoints(app: FastAPI) -> FastAPI:
             password=password,
             tags=tags,
             playbook="uninstall.yml",
-        )
+            minimal_playbook=True,
+        ).resolve_groups()
+        rollout = None
+        if data.get("rolling") is not None:
+            try:
+                rollout = Rollout(**data["rolling"])
+            except (ValueError, TypeError) as e:
+                raise HTTPException(status_code=400, detail=str(e))
         try:
-            ansible.verify_auth()
+            await run_in_threadpool(ansible.verify_auth)
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
         uninstall_command = ansible.get_command()
         try:
-            result = ansible.run_command(uninstall_command)
+            job = JobManager().submit(
+                ansible,
+                uninstall_command,
+                rollout=rollout,
+                timeout=data.get("timeout"),
+                retries=data.get("retries", 0),
+                retry_delay=data.get("retry_delay", 30),
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        InstalledState().track_uninstall(job, tags)
+        if data.get("background", False):
+            return {"job_id": job.id}
+        try:
+            await job.wait()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return job_output_response(job)
+
+    @app.put("/api/target/facts/warm", response_model=Union[str, Dict[str, str]])
+    async def warm_facts(request: Request) -> Union[str, Dict[str, str]]:
+        """
+        Gather the facts of the target machines into the fact cache.
+
+        Hosts whose cached facts have not expired are skipped unless "force" is true.
+        Installs and uninstalls on the warmed hosts then skip gathering facts.
+
+        Input Format:
+        {
+            "hosts": "hosts",
+            "user": "user",
+            "password": "password",
+            "force": false,
+            "background": false
+        }
+
+        If "background" is true, return {"job_id": "job_id"} right away instead of the output.
+        """
+        try:
+            data = await request.json()
+        except JSONDecodeError:
+            raise HTTPException(
+                status_code=400, detail="No data provided or malformed data."
+            )
+        if data is None:
+            raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            data, decrypt = open_request(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if data == {}:
+            raise HTTPException(status_code=400, detail="No data provided.")
+        try:
+            if data["hosts"] == "" or data["user"] == "" or data["password"] == "":
+                raise HTTPException(
+                    status_code=400, detail="Missing hosts, user or password."
+                )
+        except KeyError:
+            raise HTTPException(
+                status_code=400, detail="Missing hosts, user or password."
+            )
+        try:
+            hosts = decrypt(data["hosts"])
+            user = decrypt(data["user"])
+            password = decrypt(data["password"])
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail=str("Missing hosts, user or password, or malformed data."),
+            )
+        if hosts == "" or user == "" or password == "":
+            raise HTTPException(
+                status_code=400, detail="Missing hosts, user or password."
+            )
+        hosts_list = [host.strip() for host in hosts.split(",") if host.strip()]
+        if not data.get("force", False):
+            hosts_list = FactCache().get_stale_hosts(hosts_list)
+        if hosts_list == []:
+            return "Facts of all hosts are already cached."
+        ansible = Ansible(
+            inventory=",".join(hosts_list),
+            user=user,
+            password=password,
+        )
+        try:
+            await run_in_threadpool(ansible.verify_auth)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        facts_command = ansible.get_facts_command()
+        job = JobManager().submit(ansible, facts_command)
+        if data.get("background", False):
+            return {"job_id": job.id}
+        try:
+            await job.wait()
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
-        return result
+        return job_output_response(job)
 
     return app
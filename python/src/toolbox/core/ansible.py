@@ -1,9 +1,22 @@
 """Ansible class for handling the ansible cli commands."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
 from pathlib import Path
+import signal
 import subprocess
-from typing import Dict, List
+from typing import AsyncIterator, Callable, Dict, List, Optional, Union
 
 from pydantic import BaseModel, Field, validator
+from toolbox.core.ansible_profile import AnsibleProfile
+from toolbox.core.inventory import InventoryCache
+from toolbox.core.playbooks import PlaybookCache
+from toolbox.core.results import get_events_env
+from toolbox.core.runner import RunnerBackend
+from toolbox.core.ssh import SSHMultiplexer
+from toolbox.core.warm import WarmExecutor, WarmProcess
 
 
 class Ansible(BaseModel):
@@ -14,19 +27,20 @@ class Ansible(BaseModel):
         run_folder (Path): The folder to run ansible from.
         playbook (str): The ansible playbook file.
         inventory (str): The ansible inventory file/hosts.
+        limit (str): The hosts or groups of the inventory to run on.
         tags (List[str]): The ansible tags to run.
         extra_vars (List[Dict[str, str]]): The extra variables to pass to ansible.
         user (str): The user to run ansible as.
         password (str): The password for the user.
         verbosity (int): The verbosity level for ansible.
+        extra_args (str): Other arguments to pass to ansible.
+        verify_concurrency (int): The number of hosts to verify at the same time.
+        connect_timeout (int): The number of seconds to wait for a host to connect.
+        profile (AnsibleProfile): The ansible settings to run the commands with.
+        minimal_playbook (bool): Whether to run a playbook with only the roles the
+            tags need instead of the whole playbook.
     """
 
-    def __new__(cls, **data) -> "Ansible":
-        """Return the singleton instance."""
-        if not hasattr(cls, "instance"):
-            cls.instance = super().__new__(cls)
-        return cls.instance
-
     def __init__(self, **data):
         """Initialize the ansible class."""
         super().__init__(**data)
@@ -65,6 +79,10 @@ class Ansible(BaseModel):
         "roles/hosts",
         description="The ansible inventory file/hosts.",
     )
+    limit: str = Field(
+        "",
+        description="The hosts or groups of the inventory to run on.",
+    )
     tags: List[str] = Field(
         [],
         description="The ansible tags to run.",
@@ -83,6 +101,22 @@ class Ansible(BaseModel):
         "",
         description="Other arguments to pass to ansible.",
     )
+    verify_concurrency: int = Field(
+        20,
+        description="The number of hosts to verify the credentials on at the same time.",
+    )
+    connect_timeout: int = Field(
+        10,
+        description="The number of seconds to wait for a host to accept a connection.",
+    )
+    profile: AnsibleProfile = Field(
+        default_factory=lambda: AnsibleProfile.current,
+        description="The ansible settings to run the commands with.",
+    )
+    minimal_playbook: bool = Field(
+        False,
+        description="Whether to run a playbook with only the roles the tags need.",
+    )
 
     @validator("playbook")
     def validate_playbook(cls, playbook):
@@ -114,6 +148,13 @@ class Ansible(BaseModel):
             raise ValueError("Password cannot be empty.")
         return password
 
+    @validator("verify_concurrency", "connect_timeout")
+    def validate_positive(cls, value, field):
+        """Validate the concurrency and timeout settings."""
+        if value < 1:
+            raise ValueError(f"{field.name} must be at least 1.")
+        return value
+
     @validator("verbosity")
     def validate_verbosity(cls, verbosity):
         """Validate the verbosity."""
@@ -123,55 +164,152 @@ class Ansible(BaseModel):
 
     def verify_auth(self) -> bool:
         """Verify the username, password and inventory are correct."""
+        check_auth_report(self.verify_auth_report())
+        return True
+
+    def verify_auth_report(self) -> Dict[str, str]:
+        """
+        Verify the credentials on all the hosts in parallel.
+
+        At most verify_concurrency hosts are checked at the same time, and each
+        host gets connect_timeout seconds to accept the connection. The ssh
+        connections are left open for ansible to reuse.
+
+        Returns:
+            Dict[str, str]: "success" or the reason of the failure for every host.
+        """
+        if Path(self.inventory).is_file():
+            return {}
+        hosts = [host.strip() for host in self.inventory.split(",") if host.strip()]
+        if hosts == []:
+            return {}
+        ssh_args = SSHMultiplexer().get_ssh_args(self.user, self.password)
+        with ThreadPoolExecutor(
+            max_workers=min(self.verify_concurrency, len(hosts))
+        ) as executor:
+            statuses = executor.map(
+                lambda host: self._verify_host(host, ssh_args), hosts
+            )
+            return dict(zip(hosts, statuses))
+
+    def _verify_host(self, host: str, ssh_args: List[str]) -> str:
+        """Verify the credentials on a single host."""
+        command = [
+            "sshpass",
+            "-p",
+            self.password,
+            "ssh",
+            *ssh_args,
+            "-o",
+            "PreferredAuthentications=password",
+            "-o",
+            f"ConnectTimeout={self.connect_timeout}",
+            f"{self.user}@{host}",
+            "echo",
+            "success",
+        ]
+        try:
+            output = subprocess.run(
+                command,
+                cwd=self.run_folder,
+                check=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=self.connect_timeout * 3,
+            )
+        except subprocess.TimeoutExpired:
+            return "Timed out."
+        except OSError as e:
+            return str(e)
+        except subprocess.CalledProcessError as e:
+            if e.stderr:
+                return e.stderr.decode("utf-8").strip() or "Failed to connect."
+            return "Failed to connect."
+        if output.returncode != 0:
+            return "Failed to connect."
+        if output.stdout and output.stdout.decode("utf-8") != "success\n":
+            return "Unexpected response."
+        return "success"
+
+    def get_env(self, events_path: Optional[Path] = None) -> Dict[str, str]:
+        """
+        Get the environment to run the ansible commands in.
+
+        Args:
+            events_path (Path): The file to record the structured results in.
+        Returns:
+            Dict[str, str]: The environment variables.
+        """
+        env = dict(os.environ)
+        env.update(self.profile.get_env())
+        env.update(SSHMultiplexer().get_ansible_env(self.user, self.password))
+        if self.minimal_playbook:
+            env["ANSIBLE_ROLES_PATH"] = str(self.run_folder / "roles")
+        if events_path is not None:
+            env.update(get_events_env(events_path, self.profile.callbacks_enabled))
+        return env
+
+    def resolve_groups(self) -> "Ansible":
+        """
+        Return the ansible instance to run on the groups the inventory names.
+
+        Returns:
+            Ansible: A copy running on the inventory/hosts file of the run folder,
+                limited to the hosts, if they name groups of that file. Else the
+                instance itself.
+        """
+        inventory, limit = InventoryCache().resolve_hosts(
+            self.inventory, self.run_folder
+        )
+        if limit == "":
+            return self
+        return self.copy(update={"inventory": inventory, "limit": limit})
+
+    def get_inventory(self) -> str:
+        """
+        Get the inventory argument, with a trailing comma for a list of hosts.
+
+        Long lists of hosts are passed as an inventory file written for them.
+        """
+        return InventoryCache().get_inventory(self.inventory)
+
+    def get_fingerprint(self, command: List[str]) -> str:
+        """
+        Get a hash identifying the runs of a command that do the same thing.
+
+        The order of the hosts and of the tags does not change the fingerprint.
+
+        Args:
+            command (List[str]): The command built from this instance.
+        Returns:
+            str: The fingerprint.
+        """
+        inventory = self.inventory
         if not Path(self.inventory).is_file():
-            inventory = self.inventory.split(",")
-            for host in inventory:
-                command = [
-                    "sshpass",
-                    "-p",
-                    self.password,
-                    "ssh",
-                    "-o",
-                    "PreferredAuthentications=password",
-                    f"{self.user}@{host}",
-                    "echo",
-                    "success",
-                ]
-                try:
-                    output = subprocess.run(
-                        command,
-                        cwd=self.run_folder,
-                        check=True,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                    )
-                    if output.returncode != 0:
-                        raise ValueError(
-                            "Failed to verify ansible credentials for host: " + host
-                        )
-                    if output.stdout:
-                        if output.stdout.decode("utf-8") != "success\n":
-                            raise ValueError(
-                                "Failed to verify ansible credentials for host: " + host
-                            )
-                except subprocess.CalledProcessError as e:
-                    raise ValueError(
-                        "Failed to verify ansible credentials for host: " + host
-                    ) from e
-            return True
-        else:
-            return True
+            hosts = sorted({host.strip() for host in inventory.split(",")} - {""})
+            inventory = ",".join(hosts) + ","
+        arguments = []
+        for index, argument in enumerate(command):
+            if index > 0 and command[index - 1] == "-i":
+                argument = inventory
+            elif index > 0 and command[index - 1] == "--tags":
+                argument = ",".join(sorted(self.tags))
+            arguments.append(argument)
+        payload = json.dumps({"run_folder": str(self.run_folder), "command": arguments})
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
     def get_command(self) -> List[str]:
         """Get the ansible command."""
-        if not Path(self.inventory).is_file():
-            if self.inventory[-1] != ",":
-                self.inventory += ","
+        playbook = self.playbook
+        if self.minimal_playbook:
+            playbook = PlaybookCache().get_playbook(
+                self.run_folder, self.playbook, self.tags
+            )
         command = [
             "ansible-playbook",
-            self.playbook,
+            playbook,
             "-i",
-            self.inventory,
+            self.get_inventory(),
             "-u",
             self.user,
             "-e",
@@ -181,6 +319,8 @@ class Ansible(BaseModel):
             "-e",
             f"ansible_ssh_password={self.password}",
         ]
+        if self.limit != "":
+            command += ["--limit", self.limit]
         if self.verbosity > 0:
             verbosity = "-" + ("v" * self.verbosity)
             command.append(verbosity)
@@ -196,16 +336,24 @@ class Ansible(BaseModel):
             command.append(self.extra_args)
         return command
 
-    def get_ping_command(self) -> List[str]:
-        """Get the ansible ping command."""
-        if not Path(self.inventory).is_file():
-            if self.inventory[-1] != ",":
-                self.inventory += ","
+    def get_ping_command(
+        self, forks: Optional[int] = None, timeout: Optional[int] = None
+    ) -> List[str]:
+        """
+        Get the ad-hoc ansible ping command.
+
+        Args:
+            forks (int): The number of hosts to ping at the same time, the forks of
+                the profile if not given.
+            timeout (int): The number of seconds to wait for a host to connect.
+        Returns:
+            List[str]: The command.
+        """
         command = [
             "ansible",
             "all",
             "-i",
-            self.inventory,
+            self.get_inventory(),
             "-u",
             self.user,
             "-e",
@@ -213,36 +361,205 @@ class Ansible(BaseModel):
             "-m",
             "ping",
         ]
+        if self.limit != "":
+            command += ["--limit", self.limit]
+        if forks is not None:
+            command += ["-f", str(forks)]
+        if timeout is not None:
+            command += ["-T", str(timeout)]
         if self.verbosity > 0:
             verbosity = "-" + ("v" * self.verbosity)
             command.append(verbosity)
 
         return command
 
-    def run_command(self, command) -> str:
-        """Run the ansible command."""
-        try:
-            output = subprocess.run(
-                command,
-                cwd=self.run_folder,
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+    def get_facts_command(self, gather_subset: str = "!all,network") -> List[str]:
+        """Get the ansible command gathering the facts of the hosts into the fact cache."""
+        command = [
+            "ansible",
+            "all",
+            "-i",
+            self.get_inventory(),
+            "-u",
+            self.user,
+            "-e",
+            f"ansible_ssh_password={self.password}",
+            "-m",
+            "setup",
+            "-a",
+            f"gather_subset={gather_subset}",
+        ]
+        if self.limit != "":
+            command += ["--limit", self.limit]
+        if self.verbosity > 0:
+            verbosity = "-" + ("v" * self.verbosity)
+            command.append(verbosity)
+
+        return command
+
+    async def run_command_async(
+        self,
+        command,
+        on_output: Optional[Callable[[str], None]] = None,
+        events_path: Optional[Path] = None,
+    ) -> str:
+        """
+        Run the ansible command without blocking the event loop.
+
+        Args:
+            command (List[str]): The command to run.
+            on_output (Callable[[str], None]): Called with every line of output as it
+                is produced. When given, the output is not kept in memory.
+            events_path (Path): The file to record the structured results in.
+        Returns:
+            str: The output, or a success message if the output was streamed.
+
+        Ansible runs in its own process group. If the call is cancelled, the whole
+        group, with the ssh sessions ansible started, is terminated. Playbooks are
+        run through ansible-runner instead when that backend is enabled.
+        """
+        if RunnerBackend().can_run(command):
+            return await RunnerBackend().run(
+                command, self.run_folder, self.get_env(), on_output, events_path
             )
-            if output.returncode != 0:
+        if on_output is None:
+            process = await self._start_process(
+                command, events_path, stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                await terminate_process_group(process)
+                raise
+            if process.returncode != 0:
                 error = ""
-                if output.stdout:
-                    error += output.stdout.decode("utf-8")
-                if output.stderr:
-                    error += output.stderr.decode("utf-8")
+                if stdout:
+                    error += stdout.decode("utf-8")
+                if stderr:
+                    error += stderr.decode("utf-8")
                 raise ValueError("Failed to run ansible. " + error)
-            if output.stdout:
-                return output.stdout.decode("utf-8")
-        except subprocess.CalledProcessError as e:
-            error = ""
-            if e.stdout:
-                error += e.stdout.decode("utf-8")
-            if e.stderr:
-                error += e.stderr.decode("utf-8")
-            raise ValueError("Failed to run ansible. " + error) from e
+            if stdout:
+                return stdout.decode("utf-8")
+            return "Ran ansible successfully."
+
+        process = await self._start_process(
+            command, events_path, stderr=asyncio.subprocess.STDOUT
+        )
+        try:
+            if process.stdout is not None:
+                async for line in read_lines(process.stdout):
+                    on_output(line)
+            await process.wait()
+        except asyncio.CancelledError:
+            await terminate_process_group(process)
+            raise
+        if process.returncode != 0:
+            raise ValueError("Failed to run ansible. ")
         return "Ran ansible successfully."
+
+    async def _start_process(
+        self, command: List[str], events_path: Optional[Path], stderr: int
+    ) -> Union[asyncio.subprocess.Process, WarmProcess]:
+        """
+        Start the command in its own session, in a warm worker if it can run there.
+
+        Args:
+            command (List[str]): The command to run.
+            events_path (Path): The file to record the structured results in.
+            stderr (int): Where the errors go when not run in a warm worker.
+        Returns:
+            Union[asyncio.subprocess.Process, WarmProcess]: The running command.
+        """
+        env = self.get_env(events_path)
+        if WarmExecutor().can_run(command):
+            try:
+                return await WarmExecutor().start(command, self.run_folder, env)
+            except OSError:
+                pass
+        return await asyncio.create_subprocess_exec(
+            *command,
+            cwd=self.run_folder,
+            env=env,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=stderr,
+            start_new_session=True,
+        )
+
+
+def check_auth_report(report: Dict[str, str]) -> None:
+    """
+    Check the credentials were verified on all the hosts of a report.
+
+    Args:
+        report (Dict[str, str]): The report of Ansible.verify_auth_report.
+    Raises:
+        ValueError: If the credentials failed on any of the hosts.
+    """
+    failed_hosts = [host for host, status in report.items() if status != "success"]
+    if len(failed_hosts) == 1:
+        raise ValueError(
+            "Failed to verify ansible credentials for host: " + failed_hosts[0]
+        )
+    if len(failed_hosts) > 1:
+        raise ValueError(
+            "Failed to verify ansible credentials for hosts: " + ", ".join(failed_hosts)
+        )
+
+
+async def terminate_process_group(
+    process: Union[asyncio.subprocess.Process, WarmProcess], grace_period: float = 5
+) -> None:
+    """
+    Terminate the process group a process leads, then kill what is left of it.
+
+    Args:
+        process (Union[asyncio.subprocess.Process, WarmProcess]): The process
+            started in its own session.
+        grace_period (float): Seconds to wait for the group to stop before killing it.
+    """
+    if process.returncode is not None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        await asyncio.wait_for(process.wait(), timeout=grace_period)
+    except asyncio.TimeoutError:
+        pass
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    await process.wait()
+
+
+async def read_lines(
+    stream: asyncio.StreamReader, max_line_length: int = 65536
+) -> AsyncIterator[str]:
+    """
+    Read a stream line by line without buffering more than one line.
+
+    Lines longer than max_line_length are split into several lines.
+
+    Args:
+        stream (asyncio.StreamReader): The stream to read from.
+        max_line_length (int): The maximum length of a line.
+    Returns:
+        AsyncIterator[str]: The lines, including their line endings.
+    """
+    pending = b""
+    while True:
+        chunk = await stream.read(max_line_length)
+        if not chunk:
+            break
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield (line + b"\n").decode("utf-8", errors="replace")
+        while len(pending) >= max_line_length:
+            yield pending[:max_line_length].decode("utf-8", errors="replace") + "\n"
+            pending = pending[max_line_length:]
+    if pending:
+        yield pending.decode("utf-8", errors="replace")
@@ -0,0 +1,115 @@
+"""Ansible performance profile applied to every ansible run."""
+
+from pathlib import Path
+from typing import ClassVar, Dict, List
+
+from pydantic import BaseModel, Field, validator
+
+
+class AnsibleProfile(BaseModel):
+    """
+    Class for the ansible settings the toolbox runs every command with.
+
+    The settings are passed to ansible as environment variables, which take
+    precedence over any ansible.cfg found in the run folder.
+
+    Attributes:
+        forks (int): The number of hosts ansible works on in parallel.
+        pipelining (bool): Whether to run modules without copying them to the host first.
+        gathering (str): When to gather facts: implicit, explicit or smart.
+        fact_caching (str): The fact cache plugin: memory or jsonfile.
+        fact_caching_connection (Path): The folder the jsonfile fact cache is kept in.
+        fact_caching_timeout (int): Seconds the cached facts of a host stay valid.
+        stdout_callback (str): The callback plugin printing the output.
+        callbacks_enabled (List[str]): Other callback plugins to enable.
+    """
+
+    current: ClassVar["AnsibleProfile"]
+
+    forks: int = Field(
+        20,
+        description="The number of hosts ansible works on in parallel.",
+    )
+    pipelining: bool = Field(
+        True,
+        description="Whether to run modules without copying them to the host first.",
+    )
+    gathering: str = Field(
+        "smart",
+        description="When to gather facts: implicit, explicit or smart.",
+    )
+    fact_caching: str = Field(
+        "jsonfile",
+        description="The fact cache plugin: memory or jsonfile.",
+    )
+    fact_caching_connection: Path = Field(
+        Path.home() / ".toolbox" / "facts",
+        description="The folder the jsonfile fact cache is kept in.",
+    )
+    fact_caching_timeout: int = Field(
+        86400,
+        description="Seconds the cached facts of a host stay valid.",
+    )
+    stdout_callback: str = Field(
+        "default",
+        description="The callback plugin printing the output.",
+    )
+    callbacks_enabled: List[str] = Field(
+        [],
+        description="Other callback plugins to enable.",
+    )
+
+    @validator("forks")
+    def validate_forks(cls, forks):
+        """Validate the forks."""
+        if forks < 1:
+            raise ValueError("Forks must be at least 1.")
+        return forks
+
+    @validator("gathering")
+    def validate_gathering(cls, gathering):
+        """Validate the gathering."""
+        if gathering not in ("implicit", "explicit", "smart"):
+            raise ValueError("Gathering must be implicit, explicit or smart.")
+        return gathering
+
+    @validator("fact_caching")
+    def validate_fact_caching(cls, fact_caching):
+        """Validate the fact caching plugin."""
+        if fact_caching not in ("memory", "jsonfile"):
+            raise ValueError("Fact caching must be memory or jsonfile.")
+        return fact_caching
+
+    @validator("fact_caching_timeout")
+    def validate_fact_caching_timeout(cls, fact_caching_timeout):
+        """Validate the fact caching timeout."""
+        if fact_caching_timeout < 0:
+            raise ValueError("Fact caching timeout cannot be negative.")
+        return fact_caching_timeout
+
+    @validator("stdout_callback")
+    def validate_stdout_callback(cls, stdout_callback):
+        """Validate the stdout callback."""
+        if stdout_callback == "":
+            raise ValueError("Stdout callback cannot be empty.")
+        return stdout_callback
+
+    def get_env(self) -> Dict[str, str]:
+        """Return the environment variables applying the profile."""
+        env = {
+            "ANSIBLE_FORKS": str(self.forks),
+            "ANSIBLE_PIPELINING": str(self.pipelining),
+            "ANSIBLE_GATHERING": self.gathering,
+            "ANSIBLE_CACHE_PLUGIN": self.fact_caching,
+            "ANSIBLE_CACHE_PLUGIN_TIMEOUT": str(self.fact_caching_timeout),
+            "ANSIBLE_STDOUT_CALLBACK": self.stdout_callback,
+        }
+        if self.fact_caching == "jsonfile":
+            env["ANSIBLE_CACHE_PLUGIN_CONNECTION"] = str(self.fact_caching_connection)
+        if self.callbacks_enabled != []:
+            env["ANSIBLE_CALLBACKS_ENABLED"] = ",".join(self.callbacks_enabled)
+            env["ANSIBLE_LOAD_CALLBACK_PLUGINS"] = "True"
+        return env
+
+
+AnsibleProfile.current = AnsibleProfile()
@@ -0,0 +1,82 @@
+"""Class for inspecting the fact cache of the target machines."""
+
+import json
+from pathlib import Path
+import time
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+from toolbox.core.ansible_profile import AnsibleProfile
+
+
+class FactCache(BaseModel):
+    """
+    Class for the jsonfile fact cache ansible keeps one file per host in.
+
+    Attributes:
+        profile (AnsibleProfile): The profile configuring the fact cache.
+    """
+
+    profile: AnsibleProfile = Field(
+        default_factory=lambda: AnsibleProfile.current,
+        description="The profile configuring the fact cache.",
+    )
+
+    def get_age(self, host: str) -> Optional[float]:
+        """
+        Return how many seconds ago the facts of the host were cached.
+
+        Args:
+            host (str): The host.
+        Returns:
+            Optional[float]: The age of the cached facts, None if there are none.
+        """
+        cache_file = self._get_cache_file(host)
+        if cache_file is None or not cache_file.is_file():
+            return None
+        return time.time() - cache_file.stat().st_mtime
+
+    def get_facts(self, host: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached facts of the host.
+
+        Args:
+            host (str): The host.
+        Returns:
+            Optional[Dict[str, Any]]: The cached facts, None if there are none.
+        """
+        cache_file = self._get_cache_file(host)
+        if cache_file is None or not cache_file.is_file():
+            return None
+        try:
+            with open(cache_file, "r") as f:
+                facts = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return facts if isinstance(facts, dict) else None
+
+    def is_fresh(self, host: str) -> bool:
+        """Return True if the cached facts of the host have not expired yet."""
+        age = self.get_age(host)
+        if age is None:
+            return False
+        timeout = self.profile.fact_caching_timeout
+        return timeout == 0 or age < timeout
+
+    def get_stale_hosts(self, hosts: List[str]) -> List[str]:
+        """Return the hosts that have no fresh facts in the cache."""
+        return [host for host in hosts if not self.is_fresh(host)]
+
+    def clear(self, host: str) -> None:
+        """Remove the cached facts of the host."""
+        cache_file = self._get_cache_file(host)
+        if cache_file is not None:
+            cache_file.unlink(missing_ok=True)
+
+    def _get_cache_file(self, host: str) -> Optional[Path]:
+        """Return the file the facts of the host are cached in."""
+        if self.profile.fact_caching != "jsonfile":
+            return None
+        if host in ("", ".", "..") or "/" in host:
+            return None
+        return self.profile.fact_caching_connection / host
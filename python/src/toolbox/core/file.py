@@ -1,5 +1,6 @@
 """File and Folder classes for handling files and folders."""
 
+import os
 from pathlib import Path
 from typing import Dict, List, Union
 
@@ -31,6 +32,45 @@ def get_items_recursive(path: Path) -> List[Dict[str, Union[bool, str, list]]]:
     return items
 
 
+def touch_file(path: Path) -> bool:
+    """
+    Mark a file as just used by updating its modification time.
+
+    Args:
+        path (Path): The file.
+    Returns:
+        bool: True if the file exists, False otherwise.
+    """
+    try:
+        os.utime(path)
+    except OSError:
+        return False
+    return True
+
+
+def prune_files(folder: Path, pattern: str, max_files: int) -> None:
+    """
+    Remove the least recently modified files of a folder beyond a number of files.
+
+    Args:
+        folder (Path): The folder to prune.
+        pattern (str): The glob pattern of the files to count and remove.
+        max_files (int): The number of files to keep at most.
+    """
+    files = []
+    for path in folder.glob(pattern):
+        try:
+            files.append((path.stat().st_mtime_ns, path))
+        except OSError:
+            continue
+    files.sort(reverse=True)
+    for _, path in files[max_files:]:
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+
+
 class FileBase(BaseModel):
     """Base class for File and Folder."""
 
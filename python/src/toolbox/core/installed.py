@@ -0,0 +1,201 @@
+"""Record of the software installed on every host, to skip installs that change nothing."""
+
+from datetime import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+from typing import Any, Dict, List, Optional
+
+from toolbox.core.ansible import Ansible
+from toolbox.core.facts import FactCache
+from toolbox.core.jobs import Job
+from toolbox.core.playbooks import PlaybookCache
+
+FACTS = (
+    "ansible_distribution",
+    "ansible_distribution_version",
+    "ansible_os_family",
+    "ansible_architecture",
+    "ansible_pkg_mgr",
+)
+
+
+class InstalledState:
+    """
+    Singleton for the tags that were installed successfully on every host.
+
+    Every installed tag is recorded with a fingerprint of the files of the roles
+    owning it and of the facts of the host that decide how it is installed. A
+    tag is only installed again once either of them has changed. The record of
+    every host is kept in its own file in the state folder.
+
+    Attributes:
+        state_dir (Path): The folder the records are written to.
+    """
+
+    state_dir: Path = Path.home() / ".toolbox" / "installed"
+
+    def __new__(cls) -> "InstalledState":
+        """Return the singleton instance."""
+        if not hasattr(cls, "instance"):
+            cls.instance = super().__new__(cls)
+            cls.instance._lock = threading.Lock()
+        return cls.instance
+
+    def get_role_fingerprints(self, ansible: Ansible) -> Dict[str, str]:
+        """
+        Return a fingerprint of the files of the roles owning every tag.
+
+        Args:
+            ansible (Ansible): The ansible instance of the install.
+        Returns:
+            Dict[str, str]: The fingerprint of every tag of the install.
+        """
+        role_tags = PlaybookCache().get_role_tags(ansible.run_folder, ansible.playbook)
+        role_digests: Dict[str, str] = {}
+        fingerprints = {}
+        for tag in ansible.tags:
+            digest = hashlib.sha256()
+            for role, tags in sorted(role_tags.items()):
+                if tags is not None and tag not in tags:
+                    continue
+                if role not in role_digests:
+                    role_digests[role] = self._get_role_digest(
+                        ansible.run_folder / "roles" / role
+                    )
+                digest.update(f"{role}:{role_digests[role]}\n".encode("utf-8"))
+            fingerprints[tag] = digest.hexdigest()
+        return fingerprints
+
+    def get_facts_fingerprint(self, host: str) -> str:
+        """Return a fingerprint of the cached facts deciding how software is installed."""
+        facts = FactCache().get_facts(host) or {}
+        payload = json.dumps({fact: facts.get(fact) for fact in FACTS}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_installed(self, host: str) -> Dict[str, Dict[str, Any]]:
+        """Return the recorded tags of the host."""
+        state_file = self._get_state_file(host)
+        if state_file is None or not state_file.is_file():
+            return {}
+        try:
+            with open(state_file, "r") as f:
+                installed = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return installed if isinstance(installed, dict) else {}
+
+    def get_pending(
+        self, ansible: Ansible, fingerprints: Dict[str, str]
+    ) -> Optional[Ansible]:
+        """
+        Narrow an install down to the hosts and tags that are not installed yet.
+
+        Installs on an inventory file are not narrowed down, as its hosts are
+        not known up front.
+
+        Args:
+            ansible (Ansible): The ansible instance of the install.
+            fingerprints (Dict[str, str]): The role fingerprint of every tag.
+        Returns:
+            Optional[Ansible]: The ansible instance for the hosts still missing
+                any of the tags, with only the tags missing on any of them.
+                None if everything is installed already.
+        """
+        if Path(ansible.inventory).is_file():
+            return ansible
+        hosts = [host.strip() for host in ansible.inventory.split(",")]
+        pending_hosts = []
+        pending_tags = set()
+        for host in [host for host in hosts if host]:
+            installed = self.get_installed(host)
+            facts = self.get_facts_fingerprint(host)
+            tags = [
+                tag
+                for tag in ansible.tags
+                if installed.get(tag, {}).get("role") != fingerprints.get(tag)
+                or installed.get(tag, {}).get("facts") != facts
+            ]
+            if tags != []:
+                pending_hosts.append(host)
+                pending_tags.update(tags)
+        if pending_hosts == []:
+            return None
+        return ansible.copy(
+            update={
+                "inventory": ",".join(pending_hosts),
+                "tags": [tag for tag in ansible.tags if tag in pending_tags],
+            }
+        )
+
+    def record(self, host: str, fingerprints: Dict[str, str]) -> None:
+        """Record the tags as installed on the host."""
+        state_file = self._get_state_file(host)
+        if state_file is None:
+            return
+        facts = self.get_facts_fingerprint(host)
+        installed_at = datetime.now().isoformat()
+        with self._lock:
+            installed = self.get_installed(host)
+            for tag, fingerprint in fingerprints.items():
+                installed[tag] = {
+                    "role": fingerprint,
+                    "facts": facts,
+                    "installed_at": installed_at,
+                }
+            self._write(state_file, installed)
+
+    def forget(self, host: str, tags: List[str]) -> None:
+        """Remove the tags from the record of the host."""
+        state_file = self._get_state_file(host)
+        if state_file is None:
+            return
+        with self._lock:
+            installed = self.get_installed(host)
+            for tag in tags:
+                installed.pop(tag, None)
+            self._write(state_file, installed)
+
+    def track_install(self, job: Job, fingerprints: Dict[str, str]) -> None:
+        """Record the tags on the hosts the install job succeeded on, once it has finished."""
+
+        def record(job: Job) -> None:
+            for host in job.get_succeeded_hosts():
+                self.record(host, fingerprints)
+
+        job.add_done_callback(record)
+
+    def track_uninstall(self, job: Job, tags: List[str]) -> None:
+        """Forget the tags on the hosts the uninstall job succeeded on, once it has finished."""
+
+        def forget(job: Job) -> None:
+            for host in job.get_succeeded_hosts():
+                self.forget(host, tags)
+
+        job.add_done_callback(forget)
+
+    def _get_role_digest(self, role_dir: Path) -> str:
+        """Return a hash of the content of all the files of a role."""
+        digest = hashlib.sha256()
+        if role_dir.is_dir():
+            for path in sorted(role_dir.rglob("*")):
+                if path.is_file():
+                    digest.update(str(path.relative_to(role_dir)).encode("utf-8"))
+                    digest.update(path.read_bytes())
+        return digest.hexdigest()
+
+    def _get_state_file(self, host: str) -> Optional[Path]:
+        """Return the file the record of the host is kept in."""
+        if host in ("", ".", "..") or "/" in host:
+            return None
+        return self.state_dir / f"{host}.json"
+
+    def _write(self, state_file: Path, installed: Dict[str, Dict[str, Any]]) -> None:
+        """Replace the record of a host. The lock must be held."""
+        state_file.parent.mkdir(parents=True, exist_ok=True)
+        temporary = state_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary, "w") as f:
+            json.dump(installed, f)
+        os.replace(temporary, state_file)
@@ -0,0 +1,174 @@
+"""Inventory files for large host lists and the groups of the toolbox inventory."""
+
+import hashlib
+import os
+from pathlib import Path
+import threading
+from typing import Dict, List, Set, Tuple
+
+from toolbox.core.file import prune_files, touch_file
+
+
+def read_groups(inventory_file: Path) -> Dict[str, Set[str]]:
+    """
+    Return the hosts of every group of an ini inventory file.
+
+    The hosts of the children of a group are included in the group.
+
+    Args:
+        inventory_file (Path): The inventory file.
+    Returns:
+        Dict[str, Set[str]]: The hosts of every group, empty if the file cannot
+            be read.
+    """
+    try:
+        lines = inventory_file.read_text().splitlines()
+    except (OSError, UnicodeDecodeError):
+        return {}
+    hosts: Dict[str, Set[str]] = {}
+    children: Dict[str, Set[str]] = {}
+    section = None
+    for line in lines:
+        line = line.strip()
+        if line == "" or line[0] in "#;":
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            section = line[1:-1].strip()
+            group, _, kind = section.partition(":")
+            if kind in ("", "children"):
+                hosts.setdefault(group, set())
+            continue
+        if section is None:
+            continue
+        group, _, kind = section.partition(":")
+        if kind == "":
+            hosts[group].add(line.split()[0])
+        elif kind == "children":
+            children.setdefault(group, set()).add(line.split()[0])
+
+    def resolve(group: str, seen: Set[str]) -> Set[str]:
+        resolved = set(hosts.get(group, set()))
+        for child in children.get(group, set()) - seen:
+            resolved |= resolve(child, seen | {child})
+        return resolved
+
+    return {group: resolve(group, {group}) for group in hosts}
+
+
+class InventoryCache:
+    """
+    Singleton for the inventory files of the host lists too large to pass inline.
+
+    Ansible is given a list of hosts as a single comma separated argument, which
+    it parses again on every run and which long lists of hosts push past the
+    limits of the command line. The lists longer than max_inline_hosts are
+    written to an inventory file instead, once for every set of hosts. Only the
+    max_files most recently used inventory files are kept.
+
+    Attributes:
+        cache_dir (Path): The folder the inventory files are written to.
+        max_inline_hosts (int): The number of hosts passed inline at most.
+        max_files (int): The number of inventory files kept at most.
+    """
+
+    cache_dir: Path = Path.home() / ".toolbox" / "inventories"
+    max_inline_hosts: int = 50
+    max_files: int = 100
+
+    def __new__(cls) -> "InventoryCache":
+        """Return the singleton instance."""
+        if not hasattr(cls, "instance"):
+            cls.instance = super().__new__(cls)
+            cls.instance._lock = threading.Lock()
+        return cls.instance
+
+    def get_inventory(self, inventory: str) -> str:
+        """
+        Return the inventory argument for a list of hosts or an inventory file.
+
+        Args:
+            inventory (str): The comma separated hosts or the inventory file.
+        Returns:
+            str: The inventory file, the one written for the hosts if there are more
+                than max_inline_hosts of them, or else the hosts with a trailing comma.
+        """
+        if Path(inventory).is_file():
+            return inventory
+        hosts = [host.strip() for host in inventory.split(",") if host.strip()]
+        if len(hosts) > self.max_inline_hosts:
+            return str(self.get_inventory_file(hosts))
+        if inventory[-1] != ",":
+            return inventory + ","
+        return inventory
+
+    def get_limit(self, hosts: List[str]) -> str:
+        """
+        Return the --limit argument for a list of hosts.
+
+        Args:
+            hosts (List[str]): The hosts.
+        Returns:
+            str: The hosts comma separated, or the inventory file written for them
+                prefixed by "@" if there are more than max_inline_hosts of them.
+        """
+        if len(hosts) > self.max_inline_hosts:
+            return "@" + str(self.get_inventory_file(hosts))
+        return ",".join(hosts)
+
+    def get_inventory_file(self, hosts: List[str]) -> Path:
+        """
+        Return the inventory file of a set of hosts, writing it if needed.
+
+        The file lists one host per line, so it can also be given to --limit.
+
+        Args:
+            hosts (List[str]): The hosts.
+        Returns:
+            Path: The inventory file, the same for any order of the hosts.
+        """
+        hosts = sorted(set(hosts))
+        content = "".join(f"{host}\n" for host in hosts)
+        key = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+        inventory_file = self.cache_dir / f"hosts-{key}.ini"
+        if touch_file(inventory_file):
+            return inventory_file
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            temporary = inventory_file.with_suffix(f".{os.getpid()}.tmp")
+            temporary.write_text(content)
+            os.replace(temporary, inventory_file)
+            prune_files(self.cache_dir, "hosts-*.ini", self.max_files)
+        return inventory_file
+
+    def resolve_hosts(self, hosts: str, run_folder: Path) -> Tuple[str, str]:
+        """
+        Return the inventory and the limit to run on the given hosts or groups.
+
+        If the hosts name groups of the inventory/hosts file of the run folder,
+        ansible is run on that file, limited to the given patterns. A pattern is
+        a group or host of the file, optionally combined with others by ":",
+        or prefixed by "!" or "&" as ansible allows.
+
+        Args:
+            hosts (str): The comma separated hosts, groups or patterns.
+            run_folder (Path): The folder ansible is run from.
+        Returns:
+            Tuple[str, str]: The inventory and the limit, which is empty for a
+                list of hosts.
+        """
+        inventory_file = run_folder / "inventory" / "hosts"
+        patterns = [pattern.strip() for pattern in hosts.split(",") if pattern.strip()]
+        groups = read_groups(inventory_file) if patterns != [] else {}
+        names = set(groups)
+        for group_hosts in groups.values():
+            names |= group_hosts
+        has_group = False
+        for pattern in patterns:
+            for name in pattern.split(":"):
+                name = name.lstrip("!&")
+                if name not in names:
+                    return hosts, ""
+                has_group = has_group or name in groups
+        if not has_group:
+            return hosts, ""
+        return str(inventory_file), ",".join(patterns)
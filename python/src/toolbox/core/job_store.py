@@ -0,0 +1,424 @@
+"""SQLite store keeping the history of the jobs across restarts."""
+
+from datetime import datetime
+import os
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    playbook TEXT NOT NULL,
+    inventory TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    duration REAL,
+    error TEXT,
+    log_path TEXT NOT NULL,
+    owner INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at, id);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at, id);
+CREATE TABLE IF NOT EXISTS job_hosts (
+    job_id TEXT NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    host TEXT NOT NULL,
+    status TEXT,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (job_id, host)
+);
+CREATE INDEX IF NOT EXISTS job_hosts_host ON job_hosts (host, created_at, job_id);
+CREATE TABLE IF NOT EXISTS job_tags (
+    job_id TEXT NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (job_id, tag)
+);
+CREATE INDEX IF NOT EXISTS job_tags_tag ON job_tags (tag, created_at, job_id);
+CREATE TABLE IF NOT EXISTS job_tasks (
+    job_id TEXT NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    run INTEGER NOT NULL,
+    host TEXT NOT NULL,
+    role TEXT NOT NULL,
+    task TEXT NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_tasks_job_id ON job_tasks (job_id);
+CREATE INDEX IF NOT EXISTS job_tasks_run ON job_tasks (run, role, task, host, duration);
+"""
+
+
+def _to_text(value: Optional[datetime]) -> Optional[str]:
+    """Return the datetime as local ISO text that sorts in time order."""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.isoformat(timespec="microseconds")
+
+
+def _is_running(pid: int) -> bool:
+    """Return True if a process with the pid is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _to_timing(row: sqlite3.Row) -> Dict[str, Any]:
+    """Return an aggregated timing row with its mean, rounded to milliseconds."""
+    total = round(row["total"], 3)
+    return {
+        "role": row["role"],
+        "task": row["task"],
+        "runs": row["runs"],
+        "total": total,
+        "mean": round(total / row["runs"], 3),
+        "max": round(row["max"], 3),
+    }
+
+
+class JobStore:
+    """
+    Class for the job history kept in a SQLite database.
+
+    Every job is recorded once when it is submitted and again when it has
+    finished, along with the pid of the server process that runs it. Jobs that
+    were still pending or running when their server process stopped are marked
+    as failed the next time the store is opened, while the jobs of the other
+    server processes using the same database are left alone.
+
+    The time every task of a playbook run took is kept for the last
+    max_timed_jobs runs, numbered in the order they finished, so the timings
+    are aggregated over a window of recent runs from the index alone.
+
+    Attributes:
+        path (Path): The database file.
+        max_timed_jobs (int): The number of playbook runs whose task timings are
+            kept.
+    """
+
+    max_timed_jobs: int = 1000
+
+    def __init__(self, path: Path):
+        """Open the database, creating it if needed."""
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        with self._lock:
+            self._connection.executescript(SCHEMA)
+            columns = [
+                row["name"]
+                for row in self._connection.execute("PRAGMA table_info(jobs)")
+            ]
+            if "owner" not in columns:
+                self._connection.execute("ALTER TABLE jobs ADD COLUMN owner INTEGER")
+            self._fail_orphaned_jobs()
+
+    def _fail_orphaned_jobs(self) -> None:
+        """
+        Mark the unfinished jobs of the server processes that stopped as failed.
+
+        The jobs recorded under the pid of this process were left by an earlier
+        server process that had the same pid.
+        """
+        owners = [
+            row["owner"]
+            for row in self._connection.execute(
+                "SELECT DISTINCT owner FROM jobs WHERE status IN ('pending', 'running')"
+            )
+        ]
+        stopped = [
+            owner
+            for owner in owners
+            if owner is None or owner == os.getpid() or not _is_running(owner)
+        ]
+        for owner in stopped:
+            self._connection.execute(
+                "UPDATE jobs SET status = 'failed', "
+                "error = 'The server stopped before the job finished.' "
+                "WHERE status IN ('pending', 'running') AND owner IS ?",
+                (owner,),
+            )
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._connection.close()
+
+    def add_job(
+        self,
+        job_id: str,
+        playbook: str,
+        inventory: str,
+        tags: List[str],
+        hosts: List[str],
+        created_at: datetime,
+        log_path: Path,
+    ) -> None:
+        """
+        Record a submitted job.
+
+        Args:
+            job_id (str): The job id.
+            playbook (str): The ansible playbook file.
+            inventory (str): The ansible inventory file/hosts.
+            tags (List[str]): The ansible tags to run.
+            hosts (List[str]): The hosts the job runs on, if known up front.
+            created_at (datetime): When the job was submitted.
+            log_path (Path): The file the output is written to.
+        """
+        created = _to_text(created_at)
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.execute(
+                "INSERT INTO jobs "
+                "(id, playbook, inventory, status, created_at, log_path, owner) "
+                "VALUES (?, ?, ?, 'pending', ?, ?, ?)",
+                (job_id, playbook, inventory, created, str(log_path), os.getpid()),
+            )
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO job_hosts (job_id, host, created_at) VALUES (?, ?, ?)",
+                [(job_id, host, created) for host in hosts],
+            )
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO job_tags (job_id, tag, created_at) VALUES (?, ?, ?)",
+                [(job_id, tag, created) for tag in tags],
+            )
+
+    def finish_job(
+        self,
+        job_id: str,
+        status: str,
+        started_at: Optional[datetime],
+        finished_at: Optional[datetime],
+        error: Optional[str],
+        host_statuses: Dict[str, str],
+        task_timings: Iterable[Tuple[str, str, str, float]] = (),
+    ) -> None:
+        """
+        Record the outcome of a job.
+
+        Args:
+            job_id (str): The job id.
+            status (str): The final status of the job.
+            started_at (datetime): When the ansible process was started.
+            finished_at (datetime): When the ansible process finished.
+            error (str): The error of a failed run.
+            host_statuses (Dict[str, str]): The overall status of every host.
+            task_timings (Iterable[Tuple[str, str, str, float]]): The host, role
+                (empty outside of roles), task and seconds of every task run.
+        """
+        duration = None
+        if started_at is not None and finished_at is not None:
+            duration = (finished_at - started_at).total_seconds()
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, finished_at = ?, "
+                "duration = ?, error = ? WHERE id = ?",
+                (
+                    status,
+                    _to_text(started_at),
+                    _to_text(finished_at),
+                    duration,
+                    error,
+                    job_id,
+                ),
+            )
+            self._connection.executemany(
+                "INSERT INTO job_hosts (job_id, host, status, created_at) "
+                "SELECT ?, ?, ?, created_at FROM jobs WHERE id = ? "
+                "ON CONFLICT (job_id, host) DO UPDATE SET status = excluded.status",
+                [
+                    (job_id, host, host_status, job_id)
+                    for host, host_status in host_statuses.items()
+                ],
+            )
+            run = self._connection.execute(
+                "SELECT COALESCE(MAX(run), 0) + 1 FROM job_tasks"
+            ).fetchone()[0]
+            self._connection.executemany(
+                "INSERT INTO job_tasks (job_id, run, host, role, task, duration) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (job_id, run, host, role, task, seconds)
+                    for host, role, task, seconds in task_timings
+                ),
+            )
+            self._connection.execute(
+                "DELETE FROM job_tasks WHERE run <= ?", (run - self.max_timed_jobs,)
+            )
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        """Return the recorded job with the given id."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Job '{job_id}' does not exist.")
+            return self._with_hosts_and_tags([dict(row)])[0]
+
+    def list_jobs(
+        self,
+        host: Optional[str] = None,
+        tag: Optional[str] = None,
+        status: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        before: Optional[str] = None,
+        limit: int = 50,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Return a page of the recorded jobs, newest first.
+
+        The pages are keyed on the last job of the previous page rather than an
+        offset, so every page costs the same however deep it is.
+
+        Args:
+            host (str): Only return the jobs that ran on this host.
+            tag (str): Only return the jobs that ran this tag.
+            status (str): Only return the jobs with this status.
+            since (datetime): Only return the jobs submitted at or after this time.
+            until (datetime): Only return the jobs submitted before this time.
+            before (str): Only return the jobs older than the job with this id.
+            limit (int): The maximum number of jobs to return.
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[str]]: The jobs and the id to pass as
+                "before" for the next page, None if this is the last page.
+        """
+        if limit < 1:
+            raise ValueError("Limit must be at least 1.")
+        if host is not None:
+            query = "SELECT jobs.* FROM job_hosts AS k JOIN jobs ON jobs.id = k.job_id"
+            conditions, params = ["k.host = ?"], [host]
+        elif tag is not None:
+            query = "SELECT jobs.* FROM job_tags AS k JOIN jobs ON jobs.id = k.job_id"
+            conditions, params = ["k.tag = ?"], [tag]
+        else:
+            query = "SELECT k.* FROM jobs AS k"
+            conditions, params = [], []
+        if host is not None and tag is not None:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM job_tags WHERE job_id = k.job_id AND tag = ?)"
+            )
+            params.append(tag)
+        joined = host is not None or tag is not None
+        if status is not None:
+            conditions.append("jobs.status = ?" if joined else "k.status = ?")
+            params.append(status)
+        if since is not None:
+            conditions.append("k.created_at >= ?")
+            params.append(_to_text(since))
+        if until is not None:
+            conditions.append("k.created_at < ?")
+            params.append(_to_text(until))
+        id_column = "k.job_id" if joined else "k.id"
+        with self._lock:
+            if before is not None:
+                row = self._connection.execute(
+                    "SELECT created_at FROM jobs WHERE id = ?", (before,)
+                ).fetchone()
+                if row is None:
+                    raise ValueError(f"Job '{before}' does not exist.")
+                conditions.append(f"(k.created_at, {id_column}) < (?, ?)")
+                params.extend([row["created_at"], before])
+            if conditions != []:
+                query += " WHERE " + " AND ".join(conditions)
+            query += f" ORDER BY k.created_at DESC, {id_column} DESC LIMIT ?"
+            params.append(limit + 1)
+            rows = [dict(row) for row in self._connection.execute(query, params)]
+            jobs = self._with_hosts_and_tags(rows[:limit])
+        next_before = jobs[-1]["id"] if len(rows) > limit else None
+        return jobs, next_before
+
+    def get_timings(self, top: int, jobs: int = 100) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Return the tasks and roles that took the most time in the last playbook runs.
+
+        The time of a role is the time it took on a single host in a single job.
+
+        Args:
+            top (int): How many tasks and roles to return.
+            jobs (int): How many of the last playbook runs to aggregate.
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: The "tasks" and the "roles", slowest
+                first, with their role, task, runs, total, mean and max seconds.
+        Raises:
+            ValueError: If top or jobs is less than 1.
+        """
+        if top < 1:
+            raise ValueError("Top must be at least 1.")
+        if jobs < 1:
+            raise ValueError("Jobs must be at least 1.")
+        with self._lock:
+            first_run = (
+                self._connection.execute(
+                    "SELECT COALESCE(MAX(run), 0) FROM job_tasks"
+                ).fetchone()[0]
+                - jobs
+            )
+            tasks = self._connection.execute(
+                "SELECT role, task, COUNT(*) AS runs, SUM(duration) AS total, "
+                "MAX(duration) AS max FROM job_tasks WHERE run > ? "
+                "GROUP BY role, task ORDER BY total DESC LIMIT ?",
+                (first_run, top),
+            ).fetchall()
+            roles = self._connection.execute(
+                "SELECT role, '' AS task, COUNT(*) AS runs, SUM(duration) AS total, "
+                "MAX(duration) AS max FROM ("
+                "SELECT role, SUM(duration) AS duration FROM job_tasks WHERE run > ? "
+                "GROUP BY run, host, role"
+                ") GROUP BY role ORDER BY total DESC LIMIT ?",
+                (first_run, top),
+            ).fetchall()
+        return {
+            "tasks": [_to_timing(row) for row in tasks],
+            "roles": [_to_timing(row) for row in roles],
+        }
+
+    def _with_hosts_and_tags(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Add the hosts and the tags to the jobs, leaving out their owner.
+
+        The lock must be held.
+        """
+        if jobs == []:
+            return jobs
+        ids = [job["id"] for job in jobs]
+        placeholders = ",".join("?" * len(ids))
+        by_id = {
+            job["id"]: {
+                **{key: value for key, value in job.items() if key != "owner"},
+                "hosts": {},
+                "tags": [],
+            }
+            for job in jobs
+        }
+        for row in self._connection.execute(
+            f"SELECT job_id, host, status FROM job_hosts WHERE job_id IN ({placeholders}) "
+            "ORDER BY rowid",
+            ids,
+        ):
+            by_id[row["job_id"]]["hosts"][row["host"]] = row["status"]
+        for row in self._connection.execute(
+            f"SELECT job_id, tag FROM job_tags WHERE job_id IN ({placeholders}) "
+            "ORDER BY rowid",
+            ids,
+        ):
+            by_id[row["job_id"]]["tags"].append(row["tag"])
+        return [by_id[job_id] for job_id in ids]
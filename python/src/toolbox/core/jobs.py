@@ -0,0 +1,690 @@
+"""Job classes for running ansible commands in the background."""
+
+import asyncio
+from collections import OrderedDict, deque
+from datetime import datetime
+from enum import Enum
+import json
+from pathlib import Path
+import threading
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+)
+import uuid
+
+from pydantic import BaseModel, Field, PrivateAttr, validator
+from toolbox.core.ansible import Ansible
+from toolbox.core.inventory import InventoryCache
+from toolbox.core.job_store import JobStore
+from toolbox.core.results import RunResults, TaskResult, read_task_results
+from toolbox.core.rolling import Rollout
+
+
+class JobStatus(str, Enum):
+    """The states a job can be in."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class Job(BaseModel):
+    """
+    Class for a single ansible run.
+
+    Attributes:
+        id (str): The job id.
+        playbook (str): The ansible playbook file.
+        inventory (str): The ansible inventory file/hosts.
+        tags (List[str]): The ansible tags to run.
+        status (JobStatus): The current status of the job.
+        created_at (datetime): When the job was submitted.
+        started_at (datetime): When the ansible process was started.
+        finished_at (datetime): When the ansible process finished.
+        result (str): The outcome of a successful run.
+        error (str): The error of a failed run, with the last lines of output.
+        batches (int): The number of batches the hosts are run in.
+        finished_batches (int): The number of batches that have finished.
+        attached (int): The number of identical submissions attached to this job.
+        timeout (float): Seconds the job may run before it is stopped and failed.
+        failed_hosts (List[str]): The hosts that failed or could not be reached.
+        delay (float): Seconds the job waits before it starts.
+        retries (int): How many more times the failed hosts are retried automatically.
+        retry_delay (float): Seconds to wait before the next automatic retry,
+            doubled after every retry.
+        retry_of (str): The id of the job this job retries the failed hosts of.
+        retried_by (str): The id of the job retrying the failed hosts of this job.
+    """
+
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex, description="The job id.")
+    playbook: str = Field("", description="The ansible playbook file.")
+    inventory: str = Field("", description="The ansible inventory file/hosts.")
+    tags: List[str] = Field([], description="The ansible tags to run.")
+    status: JobStatus = Field(
+        JobStatus.PENDING, description="The current status of the job."
+    )
+    created_at: datetime = Field(
+        default_factory=datetime.now, description="When the job was submitted."
+    )
+    started_at: Optional[datetime] = Field(
+        None, description="When the ansible process was started."
+    )
+    finished_at: Optional[datetime] = Field(
+        None, description="When the ansible process finished."
+    )
+    result: Optional[str] = Field(None, description="The outcome of a successful run.")
+    error: Optional[str] = Field(
+        None, description="The error of a failed run, with the last lines of output."
+    )
+    batches: int = Field(1, description="The number of batches the hosts are run in.")
+    finished_batches: int = Field(
+        0, description="The number of batches that have finished."
+    )
+    attached: int = Field(
+        0, description="The number of identical submissions attached to this job."
+    )
+    timeout: Optional[float] = Field(
+        None, description="Seconds the job may run before it is stopped and failed."
+    )
+    failed_hosts: List[str] = Field(
+        [], description="The hosts that failed or could not be reached."
+    )
+    delay: float = Field(0, description="Seconds the job waits before it starts.")
+    retries: int = Field(
+        0, description="How many more times the failed hosts are retried automatically."
+    )
+    retry_delay: float = Field(
+        30, description="Seconds to wait before the next automatic retry."
+    )
+    retry_of: Optional[str] = Field(
+        None, description="The id of the job this job retries the failed hosts of."
+    )
+    retried_by: Optional[str] = Field(
+        None, description="The id of the job retrying the failed hosts of this job."
+    )
+
+    _ansible: Ansible = PrivateAttr()
+    _command: List[str] = PrivateAttr()
+    _rollout: Optional[Rollout] = PrivateAttr(None)
+    _fingerprint: str = PrivateAttr("")
+    _done: asyncio.Event = PrivateAttr()
+    _task: Optional[asyncio.Task] = PrivateAttr(None)
+    _log_path: Path = PrivateAttr()
+    _log_file: Optional[TextIO] = PrivateAttr(None)
+    _tail: Deque[str] = PrivateAttr()
+    _output_changed: asyncio.Event = PrivateAttr()
+    _events_path: Path = PrivateAttr()
+    _events_position: int = PrivateAttr(0)
+    _results: RunResults = PrivateAttr()
+    _results_lock: threading.Lock = PrivateAttr()
+    _done_callbacks: List[Callable[["Job"], None]] = PrivateAttr(default_factory=list)
+
+    def __init__(
+        self,
+        ansible: Ansible,
+        command: List[str],
+        log_dir: Path,
+        max_tail_lines: int = 100,
+        rollout: Optional[Rollout] = None,
+        **data,
+    ):
+        """
+        Initialize the job.
+
+        Args:
+            ansible (Ansible): The ansible instance the command was built from.
+            command (List[str]): The ansible command to run.
+            log_dir (Path): The folder to write the output to.
+            max_tail_lines (int): How many lines of output to keep in memory.
+            rollout (Rollout): Run the playbook over the hosts in batches instead.
+        """
+        super().__init__(
+            playbook=ansible.playbook,
+            inventory=ansible.inventory,
+            tags=list(ansible.tags),
+            **data,
+        )
+        self._ansible = ansible
+        self._command = command
+        self._rollout = rollout
+        self._done = asyncio.Event()
+        self._log_path = log_dir / f"{self.id}.log"
+        self._tail = deque(maxlen=max_tail_lines)
+        self._output_changed = asyncio.Event()
+        self._events_path = log_dir / f"{self.id}.events.jsonl"
+        self._results = RunResults()
+        self._results_lock = threading.Lock()
+
+    @validator("timeout")
+    def validate_timeout(cls, timeout):
+        """Validate the timeout."""
+        if timeout is not None and timeout <= 0:
+            raise ValueError("Timeout must be a positive number of seconds.")
+        return timeout
+
+    @validator("delay", "retries", "retry_delay")
+    def validate_not_negative(cls, value, field):
+        """Validate the delays and the number of retries."""
+        if value < 0:
+            raise ValueError(f"{field.name.capitalize()} cannot be negative.")
+        return value
+
+    def is_finished(self) -> bool:
+        """Return True if the job has finished running."""
+        return self.status in (
+            JobStatus.SUCCEEDED,
+            JobStatus.FAILED,
+            JobStatus.CANCELLED,
+        )
+
+    def is_playbook_run(self) -> bool:
+        """Return True if the job runs a playbook rather than a single module."""
+        return self._command[:1] == ["ansible-playbook"]
+
+    def get_succeeded_hosts(self) -> List[str]:
+        """
+        Return the hosts the job ran on successfully.
+
+        The hosts of a failed job only count once ansible has reported the final
+        stats of its run, and none of the hosts of a cancelled job count.
+        """
+        results = self.get_results()
+        if self.status == JobStatus.SUCCEEDED:
+            if Path(self.inventory).is_file():
+                return list(results.hosts)
+            hosts = [host.strip() for host in self.inventory.split(",")]
+            return [host for host in hosts if host]
+        if self.status == JobStatus.FAILED and results.complete:
+            return [
+                host
+                for host, summary in results.get_hosts().items()
+                if summary["status"] in ("ok", "changed")
+                and host not in self.failed_hosts
+            ]
+        return []
+
+    def add_done_callback(self, callback: Callable[["Job"], None]) -> None:
+        """Call the callback with the job once the job manager has finished it."""
+        self._done_callbacks.append(callback)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Return the status of the job without its output."""
+        return self.dict(exclude={"result", "error"})
+
+    def get_log_path(self) -> Path:
+        """Return the path of the file the output is written to."""
+        return self._log_path
+
+    def get_output_tail(self) -> str:
+        """Return the last lines of the output."""
+        return "".join(self._tail)
+
+    def get_results(self) -> RunResults:
+        """
+        Return the structured results ansible has recorded so far.
+
+        Only the events written since the last call are read from the events file.
+        """
+        with self._results_lock:
+            if self._events_path.is_file():
+                with open(self._events_path, "r") as f:
+                    f.seek(self._events_position)
+                    for line in iter(f.readline, ""):
+                        if not line.endswith("\n"):
+                            break
+                        self._events_position = f.tell()
+                        try:
+                            self._results.add_event(json.loads(line))
+                        except ValueError:
+                            continue
+            return self._results
+
+    def iter_task_results(self) -> Iterator[TaskResult]:
+        """Yield the result of every task on every host so far, read from the events file."""
+        return read_task_results(self._events_path)
+
+    def write_output(self, line: str) -> None:
+        """Append a line to the output and wake up the readers following it."""
+        if self._log_file is None:
+            self._log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._log_file = open(self._log_path, "a")
+        self._log_file.write(line)
+        self._log_file.flush()
+        self._tail.append(line)
+        self._notify_output_changed()
+
+    def iter_output(self, chunk_size: int = 65536) -> Iterator[str]:
+        """Yield the whole output of the job in chunks, never holding all of it."""
+        if not self._log_path.is_file():
+            return
+        with open(self._log_path, "r") as f:
+            for chunk in iter(lambda: f.read(chunk_size), ""):
+                yield chunk
+
+    async def follow_output(self) -> AsyncIterator[str]:
+        """
+        Yield the output line by line, waiting for new lines until the job has finished.
+
+        The lines are read back from the log file so that slow readers never make
+        the server buffer output for them.
+        """
+        position = 0
+        while True:
+            finished = self.is_finished()
+            if self._log_path.is_file():
+                with open(self._log_path, "r") as f:
+                    f.seek(position)
+                    for line in iter(f.readline, ""):
+                        if not line.endswith("\n") and not finished:
+                            break
+                        position = f.tell()
+                        yield line
+            if finished:
+                return
+            try:
+                await asyncio.wait_for(self._output_changed.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+
+    def _notify_output_changed(self) -> None:
+        """Wake up everyone waiting for new output."""
+        output_changed, self._output_changed = self._output_changed, asyncio.Event()
+        output_changed.set()
+
+    async def run(self) -> None:
+        """Run the ansible command and record the outcome."""
+        self.status = JobStatus.RUNNING
+        self.started_at = datetime.now()
+        try:
+            self._events_path.parent.mkdir(parents=True, exist_ok=True)
+            self.result = await asyncio.wait_for(self._execute(), self.timeout)
+            self.status = JobStatus.SUCCEEDED
+        except asyncio.TimeoutError:
+            self.error = (
+                f"Job timed out after {self.timeout:g} seconds. "
+                + self.get_output_tail()
+            )
+            self.status = JobStatus.FAILED
+        except asyncio.CancelledError:
+            self.error = "Job was cancelled. " + self.get_output_tail()
+            self.status = JobStatus.CANCELLED
+        except Exception as e:
+            self.error = (str(e) or type(e).__name__) + self.get_output_tail()
+            self.status = JobStatus.FAILED
+        finally:
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+            self._record_failed_hosts()
+            self._set_finished()
+
+    def _record_failed_hosts(self) -> None:
+        """Add the hosts ansible reported as failed or unreachable to the failed hosts."""
+        for host, summary in self.get_results().get_hosts().items():
+            if summary["status"] in ("failed", "unreachable"):
+                if host not in self.failed_hosts:
+                    self.failed_hosts.append(host)
+
+    async def _execute(self) -> str:
+        """Run the ansible command, or the batches of the rollout."""
+        if self._rollout is None:
+            return await self._ansible.run_command_async(
+                self._command,
+                on_output=self.write_output,
+                events_path=self._events_path,
+            )
+        return await self._run_rollout(self._rollout)
+
+    def cancel(self) -> None:
+        """
+        Cancel the job, stopping ansible if it is running.
+
+        Raises:
+            ValueError: If the job has already finished.
+        """
+        if self.is_finished():
+            raise ValueError("Job has already finished.")
+        if self._task is not None:
+            self._task.cancel()
+
+    def set_cancelled(self) -> None:
+        """Mark a job that was cancelled before it started as cancelled."""
+        self.error = "Job was cancelled before it started."
+        self.status = JobStatus.CANCELLED
+        self._set_finished()
+
+    def _set_finished(self) -> None:
+        """Record the finish time and wake up everyone waiting for the job."""
+        self.finished_at = datetime.now()
+        self._done.set()
+        self._notify_output_changed()
+
+    async def _run_rollout(self, rollout: Rollout) -> str:
+        """
+        Run the playbook over the hosts one batch at a time.
+
+        Returns:
+            str: The outcome of the rollout.
+        Raises:
+            ValueError: If any host failed, or too many hosts failed to go on.
+        """
+        hosts = [host.strip() for host in self._ansible.inventory.split(",")]
+        hosts = [host for host in hosts if host]
+        batches = rollout.get_batches(hosts)
+        max_failures = rollout.get_max_failures(len(hosts))
+        self.batches = len(batches)
+        hosts_run = 0
+        for index, batch in enumerate(batches):
+            if index > 0 and rollout.pause > 0:
+                await asyncio.sleep(rollout.pause)
+            self.write_output(f"Batch {index + 1}/{len(batches)}: {', '.join(batch)}\n")
+            ansible = self._ansible.copy(update={"inventory": ",".join(batch)})
+            try:
+                await ansible.run_command_async(
+                    ansible.get_command(),
+                    on_output=self.write_output,
+                    events_path=self._events_path,
+                )
+            except ValueError:
+                statuses = self.get_results().get_hosts()
+                self.failed_hosts += [
+                    host
+                    for host in batch
+                    if statuses.get(host, {}).get("status") in ("failed", "unreachable")
+                ] or batch
+            self.finished_batches += 1
+            hosts_run += len(batch)
+            failed = len(self.failed_hosts)
+            if failed > max_failures and hosts_run < len(hosts):
+                skipped = len(hosts) - hosts_run
+                raise ValueError(
+                    f"Stopped the rollout after {failed} of {len(hosts)} "
+                    f"hosts failed, {skipped} hosts were not run on. "
+                    "Failed hosts: " + ", ".join(self.failed_hosts) + ". "
+                )
+        if self.failed_hosts != []:
+            raise ValueError(
+                "Failed to run ansible on hosts: " + ", ".join(self.failed_hosts) + ". "
+            )
+        return "Ran ansible successfully."
+
+    async def wait_finished(self) -> None:
+        """Wait for the job to finish, however it ends."""
+        await self._done.wait()
+
+    async def wait(self) -> str:
+        """
+        Wait for the job to finish.
+
+        The output is not returned, since it can be of any size; it is read
+        with iter_output.
+
+        Returns:
+            str: The outcome of the job.
+        Raises:
+            ValueError: If the job failed or was cancelled.
+        """
+        await self._done.wait()
+        if self.status in (JobStatus.FAILED, JobStatus.CANCELLED):
+            raise ValueError(self.error)
+        return str(self.result)
+
+
+class JobManager:
+    """
+    Singleton for submitting and keeping track of jobs.
+
+    Attributes:
+        jobs (OrderedDict[str, Job]): The known jobs, oldest first.
+        max_finished_jobs (int): How many finished jobs to remember in memory.
+            All the jobs are recorded in the job store in the log folder.
+        log_dir (Path): The folder the output and the history of the jobs are
+            written to.
+        max_concurrent_jobs (int): How many jobs may run at the same time.
+            Jobs submitted beyond that stay pending until a slot frees up.
+    """
+
+    max_finished_jobs: int = 1000
+    log_dir: Path = Path.home() / ".toolbox" / "jobs"
+    max_concurrent_jobs: int = 4
+
+    def __new__(cls) -> "JobManager":
+        """Return the singleton instance."""
+        if not hasattr(cls, "instance"):
+            cls.instance = super().__new__(cls)
+            cls.instance.jobs = OrderedDict()
+            cls.instance._slots = None
+            cls.instance._slots_loop = None
+            cls.instance._store = None
+            cls.instance._in_flight = {}
+        return cls.instance
+
+    def configure(self, max_concurrent_jobs: int) -> None:
+        """
+        Configure the job pool.
+
+        Args:
+            max_concurrent_jobs (int): How many jobs may run at the same time.
+        """
+        if max_concurrent_jobs < 1:
+            raise ValueError("At least one job must be allowed to run at a time.")
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self._slots = None
+
+    def submit(
+        self,
+        ansible: Ansible,
+        command: List[str],
+        rollout: Optional[Rollout] = None,
+        timeout: Optional[float] = None,
+        retries: int = 0,
+        retry_delay: float = 30,
+        delay: float = 0,
+        retry_of: Optional[str] = None,
+    ) -> Job:
+        """
+        Start running the command in the background.
+
+        Must be called from within a running event loop. If an identical command
+        is already pending or running, no new run is started and the job of that
+        run is returned instead, so the caller follows the same output and result.
+
+        Args:
+            ansible (Ansible): The ansible instance the command was built from.
+            command (List[str]): The ansible command to run.
+            rollout (Rollout): Run the playbook over the hosts in batches instead.
+            timeout (float): Seconds the job may run before it is stopped.
+            retries (int): How many times to retry the failed hosts automatically.
+            retry_delay (float): Seconds to wait before the first automatic retry.
+            delay (float): Seconds to wait before the job starts.
+            retry_of (str): The id of the job whose failed hosts the job retries.
+        Returns:
+            Job: The submitted job.
+        """
+        hosts = []
+        if not Path(ansible.inventory).is_file():
+            hosts = [host.strip() for host in ansible.inventory.split(",")]
+        elif rollout is not None:
+            raise ValueError(
+                "Rolling runs need a list of hosts, not an inventory file."
+            )
+        fingerprint = ansible.get_fingerprint(command)
+        if rollout is not None:
+            fingerprint += rollout.json()
+        in_flight = self._in_flight.get(fingerprint)
+        if in_flight is not None and self._is_in_flight(in_flight):
+            in_flight.attached += 1
+            return in_flight
+        job = Job(
+            ansible,
+            command,
+            self.log_dir,
+            rollout=rollout,
+            timeout=timeout,
+            retries=retries,
+            retry_delay=retry_delay,
+            delay=delay,
+            retry_of=retry_of,
+        )
+        job._fingerprint = fingerprint
+        self.jobs[job.id] = job
+        self._in_flight[fingerprint] = job
+        self.get_store().add_job(
+            job.id,
+            playbook=job.playbook,
+            inventory=job.inventory,
+            tags=job.tags,
+            hosts=[host for host in hosts if host],
+            created_at=job.created_at,
+            log_path=job.get_log_path(),
+        )
+        job._task = asyncio.get_running_loop().create_task(self._run(job))
+        self._forget_old_jobs()
+        return job
+
+    def get_job(self, job_id: str) -> Job:
+        """Return the job with the given id."""
+        if job_id not in self.jobs:
+            raise ValueError(f"Job '{job_id}' does not exist.")
+        return self.jobs[job_id]
+
+    def retry(self, job_id: str, retries: int = 0, retry_delay: float = 30) -> Job:
+        """
+        Run the command of a finished job again, only on the hosts that failed.
+
+        Must be called from within a running event loop.
+
+        Args:
+            job_id (str): The id of the job to retry.
+            retries (int): How many times to retry the hosts failing again.
+            retry_delay (float): Seconds to wait before the first automatic retry.
+        Returns:
+            Job: The job retrying the failed hosts.
+        Raises:
+            ValueError: If the job does not exist, has not finished or has no
+                failed hosts.
+        """
+        job = self.get_job(job_id)
+        return self._retry(job, retries=retries, retry_delay=retry_delay)
+
+    def _retry(
+        self, job: Job, retries: int, retry_delay: float, delay: float = 0
+    ) -> Job:
+        """
+        Submit a job running the command of the job on its failed hosts.
+
+        A list of hosts is narrowed down to the failed hosts, so the retry only
+        reports and records those. An inventory file is kept and limited to them.
+        """
+        if not job.is_finished():
+            raise ValueError("Job has not finished yet.")
+        if job.failed_hosts == []:
+            raise ValueError("Job has no failed hosts to retry.")
+        hosts = ",".join(job.failed_hosts)
+        ansible, command = job._ansible, list(job._command)
+        if not Path(ansible.inventory).is_file():
+            ansible = ansible.copy(update={"inventory": hosts})
+        if job._rollout is not None:
+            command = ansible.get_command()
+        else:
+            if "-i" in command and ansible is not job._ansible:
+                command[command.index("-i") + 1] = ansible.get_inventory()
+            if "--limit" in command:
+                index = command.index("--limit")
+                command.pop(index)
+                command.pop(index)
+            command += ["--limit", InventoryCache().get_limit(job.failed_hosts)]
+        retry = self.submit(
+            ansible,
+            command,
+            rollout=job._rollout,
+            timeout=job.timeout,
+            retries=retries,
+            retry_delay=retry_delay,
+            delay=delay,
+            retry_of=job.id,
+        )
+        job.retried_by = retry.id
+        retry._done_callbacks.extend(job._done_callbacks)
+        return retry
+
+    def get_store(self) -> JobStore:
+        """Return the store recording the history of the jobs."""
+        path = self.log_dir / "jobs.db"
+        if self._store is None or self._store.path != path:
+            if self._store is not None:
+                self._store.close()
+            self._store = JobStore(path)
+        return self._store
+
+    async def _run(self, job: Job) -> None:
+        """Run the job once a slot in the pool is free, and record the outcome."""
+        try:
+            if job.delay > 0:
+                await asyncio.sleep(job.delay)
+            async with self._get_slots():
+                await job.run()
+        except asyncio.CancelledError:
+            job.set_cancelled()
+        finally:
+            if self._in_flight.get(job._fingerprint) is job:
+                del self._in_flight[job._fingerprint]
+        self.get_store().finish_job(
+            job.id,
+            status=job.status.value,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            error=job.error,
+            host_statuses={
+                host: summary["status"]
+                for host, summary in job.get_results().get_hosts().items()
+            },
+            task_timings=(
+                (task.host, task.role or "", task.task, task.duration)
+                for task in (job.iter_task_results() if job.is_playbook_run() else ())
+            ),
+        )
+        for callback in job._done_callbacks:
+            try:
+                callback(job)
+            except OSError:
+                continue
+        if job.status == JobStatus.FAILED and job.retries > 0 and job.failed_hosts:
+            self._retry(
+                job,
+                retries=job.retries - 1,
+                retry_delay=job.retry_delay * 2,
+                delay=job.retry_delay,
+            )
+
+    def _is_in_flight(self, job: Job) -> bool:
+        """Return True if the job is pending or running in the current event loop."""
+        return (
+            job._task is not None
+            and not job._task.done()
+            and job._task.get_loop() is asyncio.get_running_loop()
+        )
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        """Return the semaphore limiting the running jobs of the current event loop."""
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_concurrent_jobs)
+            self._slots_loop = loop
+        return self._slots
+
+    def _forget_old_jobs(self) -> None:
+        """Drop the oldest finished jobs once there are too many."""
+        finished = [job_id for job_id, job in self.jobs.items() if job.is_finished()]
+        for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
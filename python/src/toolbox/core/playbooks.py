@@ -0,0 +1,198 @@
+"""Minimal playbooks containing only the roles the selected tags need."""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from toolbox.core.file import prune_files, touch_file
+import yaml
+
+
+def _get_task_tags(tasks: Any) -> Set[str]:
+    """Return the tags of the tasks, including those of the tasks inside blocks."""
+    tags: Set[str] = set()
+    if not isinstance(tasks, list):
+        return tags
+    for task in tasks:
+        if not isinstance(task, dict):
+            continue
+        task_tags = task.get("tags", [])
+        if isinstance(task_tags, str):
+            task_tags = [tag.strip() for tag in task_tags.split(",")]
+        if isinstance(task_tags, list):
+            tags.update(str(tag) for tag in task_tags)
+        for section in ("block", "rescue", "always"):
+            tags.update(_get_task_tags(task.get(section)))
+    return tags
+
+
+def _get_role_name(role: Any) -> Optional[str]:
+    """Return the name of a role entry of a play."""
+    if isinstance(role, str):
+        return role
+    if isinstance(role, dict):
+        name = role.get("role", role.get("name"))
+        return str(name) if name is not None else None
+    return None
+
+
+class PlaybookCache:
+    """
+    Singleton for the minimal playbooks of the selections of tags.
+
+    A minimal playbook has the plays of the original playbook, but only with the
+    roles owning one of the selected tags and the roles with tasks tagged
+    always, which the other roles depend on. Ansible then neither parses nor
+    skips through the tasks of the other roles. The playbooks are written to
+    the cache folder once per selection, keyed on the tags and on the files
+    they are generated from. Only the max_files most recently used playbooks
+    are kept.
+
+    Attributes:
+        cache_dir (Path): The folder the minimal playbooks are written to.
+        max_files (int): The number of minimal playbooks kept at most.
+    """
+
+    cache_dir: Path = Path.home() / ".toolbox" / "playbooks"
+    max_files: int = 100
+
+    def __new__(cls) -> "PlaybookCache":
+        """Return the singleton instance."""
+        if not hasattr(cls, "instance"):
+            cls.instance = super().__new__(cls)
+            cls.instance._lock = threading.Lock()
+        return cls.instance
+
+    def get_playbook(self, run_folder: Path, playbook: str, tags: List[str]) -> str:
+        """
+        Return the playbook to run for the selected tags.
+
+        Args:
+            run_folder (Path): The folder with the playbook and its roles.
+            playbook (str): The playbook file, relative to the run folder.
+            tags (List[str]): The selected tags.
+        Returns:
+            str: The minimal playbook file, or the original playbook if no tags
+                are selected or the playbook cannot be narrowed down.
+        """
+        if tags == []:
+            return playbook
+        playbook_path = run_folder / playbook
+        try:
+            playbook_text = playbook_path.read_text()
+            plays = yaml.safe_load(playbook_text)
+        except (OSError, yaml.YAMLError):
+            return playbook
+        if not isinstance(plays, list):
+            return playbook
+        roles = self._get_roles(plays)
+        tasks_files = {
+            role: run_folder / "roles" / role / "tasks" / "main.yml" for role in roles
+        }
+        key = self._get_key(playbook_text, tags, tasks_files.values())
+        cached = self.cache_dir / f"{playbook_path.stem}-{key}.yml"
+        if touch_file(cached):
+            return str(cached)
+        role_tags = {
+            role: self._read_role_tags(path) for role, path in tasks_files.items()
+        }
+        selected = set(tags)
+        minimal_plays = []
+        for play in plays:
+            if isinstance(play, dict) and isinstance(play.get("roles"), list):
+                play = {
+                    **play,
+                    "roles": [
+                        role
+                        for role in play["roles"]
+                        if self._is_needed(role, role_tags, selected)
+                    ],
+                }
+            minimal_plays.append(play)
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            temporary = cached.with_suffix(f".{os.getpid()}.tmp")
+            with open(temporary, "w") as f:
+                yaml.safe_dump(minimal_plays, f, sort_keys=False)
+            os.replace(temporary, cached)
+            prune_files(self.cache_dir, "*.yml", self.max_files)
+        return str(cached)
+
+    def get_role_tags(
+        self, run_folder: Path, playbook: str
+    ) -> Dict[str, Optional[Set[str]]]:
+        """
+        Return the tags of the tasks of every role of the playbook.
+
+        Args:
+            run_folder (Path): The folder with the playbook and its roles.
+            playbook (str): The playbook file, relative to the run folder.
+        Returns:
+            Dict[str, Optional[Set[str]]]: The tags of every role, None for the
+                roles whose tasks cannot be read.
+        """
+        try:
+            with open(run_folder / playbook, "r") as f:
+                plays = yaml.safe_load(f)
+        except (OSError, yaml.YAMLError):
+            return {}
+        if not isinstance(plays, list):
+            return {}
+        return {
+            role: self._read_role_tags(
+                run_folder / "roles" / role / "tasks" / "main.yml"
+            )
+            for role in self._get_roles(plays)
+        }
+
+    def _get_roles(self, plays: List[Any]) -> List[str]:
+        """Return the names of the roles of the plays."""
+        roles = []
+        for play in plays:
+            if not isinstance(play, dict) or not isinstance(play.get("roles"), list):
+                continue
+            for role in play["roles"]:
+                name = _get_role_name(role)
+                if name is not None and name not in roles:
+                    roles.append(name)
+        return roles
+
+    def _get_key(
+        self, playbook_text: str, tags: List[str], tasks_files: Iterable[Path]
+    ) -> str:
+        """Return a hash of the selection and of the files the playbook depends on."""
+        files = []
+        for path in tasks_files:
+            try:
+                stat = path.stat()
+                files.append([str(path), stat.st_mtime_ns, stat.st_size])
+            except OSError:
+                files.append([str(path), None, None])
+        payload = json.dumps(
+            {"playbook": playbook_text, "tags": sorted(set(tags)), "files": files}
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def _read_role_tags(self, tasks_file: Path) -> Optional[Set[str]]:
+        """Return the tags of the tasks of a role, None if they cannot be read."""
+        try:
+            with open(tasks_file, "r") as f:
+                return _get_task_tags(yaml.safe_load(f))
+        except (OSError, yaml.YAMLError):
+            return None
+
+    def _is_needed(
+        self, role: Any, role_tags: Dict[str, Optional[Set[str]]], selected: Set[str]
+    ) -> bool:
+        """Return True if the role has to stay in the playbook for the selected tags."""
+        name = _get_role_name(role)
+        role_task_tags = role_tags.get(name) if name is not None else None
+        if role_task_tags is None:
+            return True
+        tags = set(role_task_tags)
+        if isinstance(role, dict) and isinstance(role.get("tags"), list):
+            tags.update(str(tag) for tag in role["tags"])
+        return "always" in tags or not tags.isdisjoint(selected)
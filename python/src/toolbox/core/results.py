@@ -0,0 +1,265 @@
+"""Structured results of ansible runs, recorded by the toolbox_events callback."""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+EVENTS_CALLBACK = "toolbox_events"
+EVENTS_CALLBACK_DIR = Path(__file__).parent.parent / "ansible" / "callback_plugins"
+
+
+def get_events_env(events_path: Path, callbacks_enabled: List[str]) -> Dict[str, str]:
+    """
+    Return the environment variables making ansible record its results.
+
+    Args:
+        events_path (Path): The file the results are written to.
+        callbacks_enabled (List[str]): The other callback plugins to enable.
+    Returns:
+        Dict[str, str]: The environment variables.
+    """
+    return {
+        "ANSIBLE_CALLBACK_PLUGINS": str(EVENTS_CALLBACK_DIR),
+        "ANSIBLE_CALLBACKS_ENABLED": ",".join([*callbacks_enabled, EVENTS_CALLBACK]),
+        "ANSIBLE_LOAD_CALLBACK_PLUGINS": "True",
+        "TOOLBOX_EVENTS_FILE": str(events_path),
+    }
+
+
+class TaskResult(BaseModel):
+    """
+    Class for the result of a single task on a single host.
+
+    Attributes:
+        host (str): The host the task ran on.
+        task (str): The name of the task.
+        role (str): The role the task belongs to.
+        action (str): The module the task ran.
+        status (str): ok, failed, skipped or unreachable.
+        changed (bool): Whether the task changed the host.
+        ignored (bool): Whether the failure of the task was ignored.
+        started (float): When the task started, as a unix timestamp.
+        duration (float): How many seconds the task took.
+        message (str): The message the task returned.
+    """
+
+    host: str = Field(..., description="The host the task ran on.")
+    task: str = Field("", description="The name of the task.")
+    role: Optional[str] = Field(None, description="The role the task belongs to.")
+    action: str = Field("", description="The module the task ran.")
+    status: str = Field(..., description="ok, failed, skipped or unreachable.")
+    changed: bool = Field(False, description="Whether the task changed the host.")
+    ignored: bool = Field(
+        False, description="Whether the failure of the task was ignored."
+    )
+    started: float = Field(0, description="When the task started.")
+    duration: float = Field(0, description="How many seconds the task took.")
+    message: str = Field("", description="The message the task returned.")
+
+
+COUNTS = ("ok", "changed", "failures", "skipped", "unreachable", "rescued", "ignored")
+
+
+class HostSummary(BaseModel):
+    """
+    Class for the task counts of a single host.
+
+    Attributes:
+        host (str): The host.
+        ok (int): The number of tasks that succeeded.
+        changed (int): The number of tasks that changed the host.
+        failures (int): The number of tasks that failed.
+        skipped (int): The number of tasks that were skipped.
+        unreachable (int): The number of times the host could not be reached.
+        rescued (int): The number of failures that were rescued.
+        ignored (int): The number of failures that were ignored.
+    """
+
+    host: str = Field(..., description="The host.")
+    ok: int = Field(0, description="The number of tasks that succeeded.")
+    changed: int = Field(0, description="The number of tasks that changed the host.")
+    failures: int = Field(0, description="The number of tasks that failed.")
+    skipped: int = Field(0, description="The number of tasks that were skipped.")
+    unreachable: int = Field(
+        0, description="The number of times the host could not be reached."
+    )
+    rescued: int = Field(0, description="The number of failures that were rescued.")
+    ignored: int = Field(0, description="The number of failures that were ignored.")
+
+    def get_status(self) -> str:
+        """Return the overall status of the host: unreachable, failed, changed or ok."""
+        if self.unreachable > 0:
+            return "unreachable"
+        if self.failures > 0:
+            return "failed"
+        if self.changed > 0:
+            return "changed"
+        return "ok"
+
+    def add_counts(self, other: "HostSummary", sign: int = 1) -> None:
+        """Add, or with a sign of -1 subtract, the counts of another summary."""
+        for count in COUNTS:
+            setattr(self, count, getattr(self, count) + sign * getattr(other, count))
+
+    def add_task_result(self, task_result: TaskResult) -> None:
+        """Count a task result, the way ansible counts it in the play recap."""
+        if task_result.status == "unreachable":
+            self.unreachable += 1
+        elif task_result.status == "skipped":
+            self.skipped += 1
+        elif task_result.status == "failed" and task_result.ignored:
+            self.ignored += 1
+            self.ok += 1
+        elif task_result.status == "failed":
+            self.failures += 1
+        else:
+            self.ok += 1
+            if task_result.changed:
+                self.changed += 1
+
+
+class HostReachability(BaseModel):
+    """
+    Class for whether a host answered a ping.
+
+    Attributes:
+        reachable (bool): Whether the host answered.
+        message (str): The answer of the host, or why it could not be reached.
+    """
+
+    reachable: bool = Field(False, description="Whether the host answered.")
+    message: str = Field("", description="The answer, or why it did not answer.")
+
+
+class RunResults(BaseModel):
+    """
+    Class for the structured results of one or more ansible runs of a job.
+
+    The counts of a host are derived from its task results until ansible reports
+    the final stats of the run, which then replace the counts of that run. The
+    task results themselves are not kept, so the memory used only grows with the
+    number of hosts; they are read back from the events file with
+    read_task_results.
+
+    Attributes:
+        hosts (Dict[str, HostSummary]): The task counts of every host.
+        complete (bool): Whether ansible reported the final stats of its last run.
+    """
+
+    hosts: Dict[str, HostSummary] = Field({}, description="The counts of every host.")
+    complete: bool = Field(
+        False, description="Whether ansible reported the final stats of its last run."
+    )
+
+    _run_counts: Dict[str, HostSummary] = PrivateAttr({})
+
+    def add_event(self, event: Dict[str, Any]) -> None:
+        """
+        Add an event written by the toolbox_events callback.
+
+        Args:
+            event (Dict[str, Any]): The event.
+        """
+        if event.get("event") == "task_result":
+            task_result = TaskResult(**event)
+            host = task_result.host
+            if host not in self.hosts:
+                self.hosts[host] = HostSummary(host=host)
+            if host not in self._run_counts:
+                self._run_counts[host] = HostSummary(host=host)
+            self.hosts[host].add_task_result(task_result)
+            self._run_counts[host].add_task_result(task_result)
+            self.complete = False
+        elif event.get("event") == "stats":
+            for host, counts in event.get("hosts", {}).items():
+                if host not in self.hosts:
+                    self.hosts[host] = HostSummary(host=host)
+                if host in self._run_counts:
+                    self.hosts[host].add_counts(self._run_counts[host], sign=-1)
+                self.hosts[host].add_counts(HostSummary(host=host, **counts))
+            self._run_counts = {}
+            self.complete = True
+
+    def get_hosts(self) -> Dict[str, Dict[str, Any]]:
+        """Return the task counts and the overall status of every host."""
+        return {
+            host: {**summary.dict(), "status": summary.get_status()}
+            for host, summary in self.hosts.items()
+        }
+
+
+def read_task_results(events_path: Path) -> Iterator[TaskResult]:
+    """
+    Yield the task results recorded in an events file, in order.
+
+    The file is read line by line, and a last line still being written is skipped.
+
+    Args:
+        events_path (Path): The file the toolbox_events callback writes to.
+    Yields:
+        TaskResult: The result of a task on a host.
+    """
+    if not events_path.is_file():
+        return
+    with open(events_path, "r") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                return
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict) and event.get("event") == "task_result":
+                yield TaskResult(**event)
+
+
+def filter_tasks(
+    tasks: Iterable[TaskResult],
+    host: Optional[str] = None,
+    status: Optional[str] = None,
+) -> List[TaskResult]:
+    """
+    Return the task results, optionally only those of a host or with a status.
+
+    Args:
+        tasks (Iterable[TaskResult]): The task results.
+        host (str): Only return the results of this host.
+        status (str): Only return the results with this status.
+            "changed" returns the successful tasks that changed their host.
+    Returns:
+        List[TaskResult]: The task results.
+    """
+    filtered = []
+    for task in tasks:
+        if host is not None and task.host != host:
+            continue
+        if status == "changed":
+            if task.status != "ok" or not task.changed:
+                continue
+        elif status is not None and task.status != status:
+            continue
+        filtered.append(task)
+    return filtered
+
+
+def get_reachability(
+    hosts: List[str], tasks: Iterable[TaskResult]
+) -> Dict[str, HostReachability]:
+    """
+    Return whether every host answered, from the results of an ad-hoc ping.
+
+    Args:
+        hosts (List[str]): The pinged hosts, also reported if they did not answer.
+        tasks (Iterable[TaskResult]): The task results of the ping.
+    Returns:
+        Dict[str, HostReachability]: The reachability of every host.
+    """
+    reachability = {host: HostReachability(message="No response.") for host in hosts}
+    for task in tasks:
+        reachability[task.host] = HostReachability(
+            reachable=task.status == "ok",
+            message=task.message or ("pong" if task.status == "ok" else ""),
+        )
+    return reachability
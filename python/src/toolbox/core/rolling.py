@@ -0,0 +1,92 @@
+"""Rolling execution of a playbook over the hosts in batches."""
+
+import math
+from typing import List
+
+from pydantic import BaseModel, Field, validator
+
+
+def _resolve(value: str, total: int) -> int:
+    """Return the number of hosts a count or a percentage of the total stands for."""
+    if value.endswith("%"):
+        return math.ceil(total * float(value[:-1]) / 100)
+    return int(value)
+
+
+def _validate_amount(value: str, minimum: float) -> str:
+    """Validate a count of hosts or a percentage of the hosts."""
+    value = value.strip()
+    try:
+        if value.endswith("%"):
+            amount = float(value[:-1])
+            valid = minimum <= amount <= 100
+        else:
+            amount = int(value)
+            valid = amount >= minimum
+    except ValueError:
+        valid = False
+    if not valid:
+        raise ValueError(f"{value} is not a number of hosts or a percentage.")
+    return value
+
+
+class Rollout(BaseModel):
+    """
+    Class for running a playbook over the hosts one batch at a time.
+
+    Every batch is a separate ansible-playbook run. Once more hosts have failed
+    than max_failures allows, the remaining batches are not started.
+
+    Attributes:
+        batch_size (str): The number of hosts per batch, or a percentage of the hosts.
+        max_failures (str): The number of hosts, or the percentage of the hosts,
+            that may fail before the rollout stops.
+        pause (float): Seconds to wait between batches.
+    """
+
+    batch_size: str = Field(
+        "100%",
+        description="The number of hosts per batch, or a percentage of the hosts.",
+    )
+    max_failures: str = Field(
+        "0",
+        description="The hosts that may fail before the rollout stops.",
+    )
+    pause: float = Field(0, description="Seconds to wait between batches.")
+
+    @validator("batch_size")
+    def validate_batch_size(cls, batch_size):
+        """Validate the batch size."""
+        return _validate_amount(batch_size, minimum=1)
+
+    @validator("max_failures")
+    def validate_max_failures(cls, max_failures):
+        """Validate the maximum number of failures."""
+        return _validate_amount(max_failures, minimum=0)
+
+    @validator("pause")
+    def validate_pause(cls, pause):
+        """Validate the pause."""
+        if pause < 0:
+            raise ValueError("Pause cannot be negative.")
+        return pause
+
+    def get_batches(self, hosts: List[str]) -> List[List[str]]:
+        """
+        Split the hosts into batches.
+
+        Args:
+            hosts (List[str]): The hosts.
+        Returns:
+            List[List[str]]: The batches, in the order of the hosts.
+        """
+        size = max(1, _resolve(self.batch_size, len(hosts)))
+        batches = []
+        for start in range(0, len(hosts), size):
+            end = start + size
+            batches.append(hosts[start:end])
+        return batches
+
+    def get_max_failures(self, total: int) -> int:
+        """Return how many of the total hosts may fail before the rollout stops."""
+        return _resolve(self.max_failures, total)
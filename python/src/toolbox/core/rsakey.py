@@ -1,44 +1,126 @@
 """RSA key class for secure communication with frontend."""
 
 import base64
+import fcntl
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import padding
 import cryptography.hazmat.primitives.asymmetric.rsa as rsa
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from pydantic import BaseModel
+from toolbox.core.sessions import SessionCache
 
+ENVELOPE_KEY_SIZES = (16, 24, 32)
+ENVELOPE_NONCE_SIZE = 12
+KEYSTORE_FILE = "keystore.json"
+KEYSTORE_LOCK_FILE = "keystore.lock"
+OAEP_PADDING = padding.OAEP(
+    mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None
+)
+PUBLIC_KEY_MAX_AGE = 86400
 
-class RSAKey(BaseModel):
+
+class PublicKey(BaseModel):
     """
-    Base class for handling the rsa keys secure communication with frontend.
+    The public key, as served to the clients.
 
     Attributes:
-        __private_key (rsa.RSAPrivateKey): The private key.
-        __public_key (rsa.RSAPublicKey): The public key.
+        pem (str): The public key, in PEM format.
+        etag (str): The strong ETag of the public key.
+        max_age (int): Seconds the clients may use the public key without
+            checking it is still current. 0 if they always have to.
     """
 
+    pem: str
+    etag: str
+    max_age: int
+
+
+class RSAKey:
+    """
+    Singleton holding the rsa key for secure communication with frontend.
+
+    The key is not generated when the module is imported but on first use, and
+    it is kept in a keystore file only the user can read, so the server
+    processes share it and it survives restarts. Once the key is older than
+    rotate_after seconds it is replaced by a new one; the previous key still
+    decrypts the packages encrypted before the clients fetched the new one.
+
+    Format of the keystore:
+    {
+        "created": 1700000000.0,
+        "keys": ["PEM of the current key", "PEM of the previous key"]
+    }
+
+    Attributes:
+        key_dir (Optional[Path]): The folder of the keystore. None keeps the
+            key in memory only.
+        rotate_after (float): Seconds after which the key is replaced. 0 never
+            replaces it.
+    """
+
+    key_dir: Optional[Path] = Path.home() / ".toolbox" / "keys"
+    rotate_after: float = 0
+
     def __new__(cls) -> "RSAKey":
         """Return the singleton instance."""
         if not hasattr(cls, "instance"):
             cls.instance = super().__new__(cls)
+            cls.instance._lock = threading.Lock()
+            cls.instance._keys = None
+            cls.instance._created = 0.0
+            cls.instance._file_id = None
         return cls.instance
 
-    def __init__(self) -> None:
-        """Initialize the rsa keys."""
-        super().__init__()
+    def configure(self, rotate_after: float) -> None:
+        """
+        Configure the key rotation.
 
-    __private_key: rsa.RSAPrivateKey = rsa.generate_private_key(
-        public_exponent=65537, key_size=2048
-    )
+        Args:
+            rotate_after (float): Seconds after which the key is replaced. 0 never
+                replaces it.
+        """
+        if rotate_after < 0:
+            raise ValueError("The key rotation time cannot be negative.")
+        self.rotate_after = rotate_after
 
-    __public_key: rsa.RSAPublicKey = __private_key.public_key()
+    def get_keystore_path(self) -> Optional[Path]:
+        """Return the path of the keystore, or None if the key is kept in memory."""
+        if self.key_dir is None:
+            return None
+        return self.key_dir / KEYSTORE_FILE
 
     def get_public_key(self) -> str:
         """Return the public key."""
-        return self.__public_key.public_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo,
-        ).decode("utf-8")
+        return self.get_published_key().pem
+
+    def get_published_key(self) -> PublicKey:
+        """
+        Return the public key with what the clients need to cache it.
+
+        The PEM and the ETag are computed once per key, when it is loaded.
+
+        Returns:
+            PublicKey: The public key.
+        """
+        self._get_keys()
+        pem, etag = self._published
+        if self.rotate_after:
+            max_age = max(0, int(self._created + self.rotate_after - time.time()))
+        elif self.key_dir is not None:
+            max_age = PUBLIC_KEY_MAX_AGE
+        else:
+            max_age = 0
+        return PublicKey(pem=pem, etag=etag, max_age=max_age)
 
     def decrypt(self, package: str) -> str:
         """
@@ -49,16 +131,264 @@ class RSAKey(BaseModel):
         Returns:
             str: The decrypted package.
         """
-        package_decoded = base64.b64decode(package)
-        decrypted_message = self.__private_key.decrypt(
-            package_decoded,
-            padding=padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None,
-            ),
+        return self._decrypt(base64.b64decode(package)).decode("utf-8")
+
+    def open_envelope(self, envelope: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Decrypt the fields sealed in an envelope.
+
+        The envelope carries an AES-GCM key encrypted with the public key, and
+        the fields as a json object encrypted with that key, so all the fields
+        cost one private key operation however many and however long they are.
+
+        Format:
+        {
+            "key": "base64 of the AES key encrypted with RSA-OAEP",
+            "iv": "base64 of the 12 byte nonce",
+            "data": "base64 of the AES-GCM encrypted json object and its tag"
+        }
+
+        Args:
+            envelope (Dict[str, str]): The envelope.
+        Returns:
+            Dict[str, Any]: The fields.
+        Raises:
+            ValueError: If the envelope is malformed or cannot be decrypted.
+        """
+        try:
+            key = self.decrypt_key(envelope["key"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError("Malformed envelope.") from e
+        return open_sealed(key, envelope)
+
+    def decrypt_key(self, package: str) -> bytes:
+        """
+        Decrypt an AES key encrypted with the public key.
+
+        Args:
+            package (str): The base64 of the encrypted key.
+        Returns:
+            bytes: The key.
+        Raises:
+            ValueError: If the key cannot be decrypted or has an invalid size.
+        """
+        key = self._decrypt(base64.b64decode(package))
+        if len(key) not in ENVELOPE_KEY_SIZES:
+            raise ValueError("Invalid key size.")
+        return key
+
+    def rotate(self) -> None:
+        """Replace the key by a new one, keeping the current key as the previous one."""
+        with self._lock:
+            self._update(force_rotate=True)
+
+    def reload(self) -> None:
+        """Forget the loaded keys, so they are read from the keystore on next use."""
+        with self._lock:
+            self._keys = None
+
+    def _decrypt(self, package: bytes) -> bytes:
+        """Decrypt the package with the current key, or else the previous one."""
+        keys = self._get_keys()
+        for key in keys[:-1]:
+            try:
+                return key.decrypt(package, padding=OAEP_PADDING)
+            except ValueError:
+                pass
+        return keys[-1].decrypt(package, padding=OAEP_PADDING)
+
+    def _get_keys(self) -> List[rsa.RSAPrivateKey]:
+        """
+        Return the keys, newest first, loading or rotating them if needed.
+
+        The keys are read again whenever the keystore was replaced, so a key
+        rotated by another server process is used from its next request on.
+        """
+        with self._lock:
+            path = self.get_keystore_path()
+            if (
+                self._keys is None
+                or (path is not None and get_file_id(path) != self._file_id)
+                or self._is_expired(self._created)
+            ):
+                self._update()
+            return self._keys
+
+    def _is_expired(self, created: float) -> bool:
+        """Return True if a key created at the given time has to be rotated."""
+        return bool(self.rotate_after) and time.time() >= created + self.rotate_after
+
+    def _update(self, force_rotate: bool = False) -> None:
+        """
+        Load the keys, creating or rotating them if needed.
+
+        The keystore is locked meanwhile, so the server processes never replace
+        the key at the same time, and a process finding the key already rotated
+        by another one takes that key instead of rotating it again.
+
+        Args:
+            force_rotate (bool): Whether to rotate the key even if it has not expired.
+        """
+        path = self.get_keystore_path()
+        if path is None:
+            keys, created = self._keys or [], self._created
+            if not keys or force_rotate or self._is_expired(created):
+                keys, created = [generate_key()] + keys[:1], time.time()
+            self._set_keys(keys, created)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        with open(path.parent / KEYSTORE_LOCK_FILE, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            keys, created = read_keystore(path) if path.is_file() else ([], 0.0)
+            if not keys or force_rotate or self._is_expired(created):
+                keys, created = [generate_key()] + keys[:1], time.time()
+                write_keystore(path, keys, created)
+            self._set_keys(keys, created)
+            self._file_id = get_file_id(path)
+
+    def _set_keys(self, keys: List[rsa.RSAPrivateKey], created: float) -> None:
+        """Set the keys, and the PEM and ETag of the public key."""
+        pem = (
+            keys[0]
+            .public_key()
+            .public_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PublicFormat.SubjectPublicKeyInfo,
+            )
+            .decode("utf-8")
         )
-        return decrypted_message.decode("utf-8")
+        etag = f'"{hashlib.sha256(pem.encode("utf-8")).hexdigest()}"'
+        self._keys, self._created, self._published = keys, created, (pem, etag)
+
+
+def get_file_id(path: Path) -> Optional[Tuple[int, int]]:
+    """Return what changes when a file is replaced, or None if it does not exist."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def read_keystore(path: Path) -> Tuple[List[rsa.RSAPrivateKey], float]:
+    """
+    Read a keystore.
+
+    Args:
+        path (Path): The path of the keystore.
+    Returns:
+        Tuple[List[rsa.RSAPrivateKey], float]: The keys, newest first, and when
+            the newest one was created.
+    """
+    keystore = json.loads(path.read_text())
+    keys = [
+        serialization.load_pem_private_key(pem.encode("utf-8"), password=None)
+        for pem in keystore["keys"]
+    ]
+    return keys, keystore["created"]
+
+
+def write_keystore(path: Path, keys: List[rsa.RSAPrivateKey], created: float) -> None:
+    """
+    Replace a keystore atomically, readable by the user only.
+
+    Args:
+        path (Path): The path of the keystore.
+        keys (List[rsa.RSAPrivateKey]): The keys, newest first.
+        created (float): When the newest key was created.
+    """
+    keystore = {
+        "created": created,
+        "keys": [
+            key.private_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PrivateFormat.PKCS8,
+                encryption_algorithm=serialization.NoEncryption(),
+            ).decode("utf-8")
+            for key in keys
+        ],
+    }
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".keystore-")
+    try:
+        with os.fdopen(fd, "w") as temp_file:
+            json.dump(keystore, temp_file)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+
+def open_sealed(key: bytes, envelope: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Decrypt the json object sealed with an AES-GCM key.
+
+    Args:
+        key (bytes): The AES key.
+        envelope (Dict[str, str]): The envelope, with the "iv" and the "data".
+    Returns:
+        Dict[str, Any]: The json object.
+    Raises:
+        ValueError: If the envelope is malformed or cannot be decrypted.
+    """
+    try:
+        if len(key) not in ENVELOPE_KEY_SIZES:
+            raise ValueError("Invalid key size.")
+        nonce = base64.b64decode(envelope["iv"])
+        if len(nonce) != ENVELOPE_NONCE_SIZE:
+            raise ValueError("Invalid nonce size.")
+        plaintext = AESGCM(key).decrypt(nonce, base64.b64decode(envelope["data"]), None)
+        fields = json.loads(plaintext)
+    except (KeyError, TypeError, ValueError, InvalidTag) as e:
+        raise ValueError("Malformed envelope.") from e
+    if not isinstance(fields, dict):
+        raise ValueError("Malformed envelope.")
+    return fields
+
+
+def read_plain(value: Any) -> str:
+    """Return a field of an opened envelope, which is not encrypted on its own."""
+    if not isinstance(value, str):
+        raise ValueError("Fields must be strings.")
+    return value
+
+
+def open_request(data: Dict[str, Any]) -> Tuple[Dict[str, Any], Callable[[Any], str]]:
+    """
+    Open the envelope of the data of a request, if it has one.
+
+    The fields of a request are either each encrypted with the public key, or
+    sealed together in an "envelope" (see RSAKey.open_envelope). The envelope
+    of a request of a session has the id of the session instead of the key,
+    {"session": "session id", "iv": ..., "data": ...}, and is sealed with the key
+    of the session. The fields of the envelope take the place of the envelope
+    in the data.
+
+    Args:
+        data (Dict[str, Any]): The data of the request.
+    Returns:
+        Tuple[Dict[str, Any], Callable[[Any], str]]: The data, and the function
+            returning the plain value of one of its encrypted fields.
+    Raises:
+        ValueError: If the envelope is malformed or cannot be decrypted.
+    """
+    if not isinstance(data, dict) or "envelope" not in data:
+        return data, RSAKey().decrypt
+    envelope = data["envelope"]
+    if not isinstance(envelope, dict):
+        raise ValueError("Malformed envelope.")
+    if "session" in envelope:
+        if not isinstance(envelope["session"], str):
+            raise ValueError("Malformed envelope.")
+        fields = open_sealed(SessionCache().get_key(envelope["session"]), envelope)
+    else:
+        fields = RSAKey().open_envelope(envelope)
+    data = {key: value for key, value in data.items() if key != "envelope"}
+    return {**data, **fields}, read_plain
+
+
+def generate_key() -> rsa.RSAPrivateKey:
+    """Generate a new rsa private key."""
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
 
 
 def encrypt(message: str, encryption_key: bytes) -> str:
@@ -81,3 +411,44 @@ def encrypt(message: str, encryption_key: bytes) -> str:
         ),
     )
     return base64.b64encode(encrypted_message).decode("utf-8")
+
+
+def encrypt_envelope(fields: Dict[str, Any], encryption_key: bytes) -> Dict[str, str]:
+    """
+    Seal the fields in an envelope, the way the frontend does.
+
+    Args:
+        fields (Dict[str, Any]): The fields to seal.
+        encryption_key (bytes): The public key, in PEM format.
+    Returns:
+        Dict[str, str]: The envelope.
+    """
+    key = AESGCM.generate_key(bit_length=256)
+    public_key = serialization.load_pem_public_key(encryption_key)
+    encrypted_key = public_key.encrypt(
+        key,
+        padding=padding.OAEP(
+            mgf=padding.MGF1(algorithm=hashes.SHA256()),
+            algorithm=hashes.SHA256(),
+            label=None,
+        ),
+    )
+    return {"key": base64.b64encode(encrypted_key).decode("utf-8"), **seal(key, fields)}
+
+
+def seal(key: bytes, fields: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Encrypt the fields as a json object with an AES-GCM key.
+
+    Args:
+        key (bytes): The AES key.
+        fields (Dict[str, Any]): The fields to encrypt.
+    Returns:
+        Dict[str, str]: The "iv" and the "data" of the envelope.
+    """
+    nonce = os.urandom(ENVELOPE_NONCE_SIZE)
+    data = AESGCM(key).encrypt(nonce, json.dumps(fields).encode("utf-8"), None)
+    return {
+        "iv": base64.b64encode(nonce).decode("utf-8"),
+        "data": base64.b64encode(data).decode("utf-8"),
+    }
@@ -0,0 +1,264 @@
+"""Backend running the ansible playbooks through the ansible-runner python API."""
+
+import asyncio
+from datetime import datetime, timezone
+import json
+import os
+from pathlib import Path
+import shlex
+import shutil
+import signal
+import tempfile
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+try:
+    import ansible_runner
+except ImportError:
+    ansible_runner = None
+
+FINISHED = "toolbox_finished"
+TASK_STATUSES = {
+    "runner_on_ok": "ok",
+    "runner_on_failed": "failed",
+    "runner_on_skipped": "skipped",
+    "runner_on_unreachable": "unreachable",
+}
+STATS_COUNTS = {
+    "ok": "ok",
+    "changed": "changed",
+    "failures": "failures",
+    "skipped": "skipped",
+    "dark": "unreachable",
+    "rescued": "rescued",
+    "ignored": "ignored",
+}
+MAX_MESSAGE_LENGTH = 1000
+
+
+def _to_timestamp(value: Any) -> float:
+    """Return the unix timestamp of a time ansible-runner reported in UTC."""
+    if not isinstance(value, str):
+        return 0
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return 0
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def to_toolbox_event(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Convert an ansible-runner event to the event the toolbox_events callback writes.
+
+    Args:
+        event (Dict[str, Any]): The ansible-runner event.
+    Returns:
+        Optional[Dict[str, Any]]: The task result or the stats, None for the
+            events the toolbox does not record.
+    """
+    data = event.get("event_data", {})
+    if event.get("event") in TASK_STATUSES:
+        result = data.get("res", {})
+        if not isinstance(result, dict):
+            result = {}
+        message = result.get("msg", "")
+        if not isinstance(message, str):
+            message = json.dumps(message)
+        return {
+            "event": "task_result",
+            "host": data.get("host", ""),
+            "task": data.get("task", ""),
+            "role": data.get("role") or None,
+            "action": data.get("task_action", ""),
+            "status": TASK_STATUSES[event["event"]],
+            "changed": bool(result.get("changed", False)),
+            "ignored": bool(data.get("ignore_errors") or False),
+            "started": _to_timestamp(data.get("start")),
+            "duration": round(float(data.get("duration") or 0), 3),
+            "message": message[:MAX_MESSAGE_LENGTH],
+        }
+    if event.get("event") == "playbook_on_stats":
+        hosts: Dict[str, Dict[str, int]] = {}
+        for key, count in STATS_COUNTS.items():
+            for host, value in (data.get(key) or {}).items():
+                hosts.setdefault(host, {count: 0 for count in STATS_COUNTS.values()})
+                hosts[host][count] = value
+        return {"event": "stats", "hosts": dict(sorted(hosts.items()))}
+    return None
+
+
+def _signal_process_group(process_group: int, signal_number: int) -> None:
+    """Send a signal to a process group, unless it has already stopped."""
+    try:
+        os.killpg(process_group, signal_number)
+    except ProcessLookupError:
+        pass
+
+
+class RunnerBackend:
+    """
+    Singleton running the ansible playbooks through ansible-runner.
+
+    Every run gets its own private data folder, removed once the run has
+    finished. ansible-runner reports the run as a stream of events, which are
+    passed on as they arrive instead of being parsed from the output afterwards.
+    ansible-runner is an optional dependency, only needed once the backend is
+    enabled.
+
+    ansible-runner starts ansible-playbook in its own session, whose process group
+    is terminated when a run is cancelled or times out, so that no ansible worker
+    or ssh connection outlives the run.
+
+    Attributes:
+        enabled (bool): Whether the playbooks are run through ansible-runner.
+        grace_period (float): Seconds a cancelled run gets to stop before its
+            process group is killed.
+    """
+
+    enabled: bool = False
+    grace_period: float = 5
+
+    def __new__(cls) -> "RunnerBackend":
+        """Return the singleton instance."""
+        if not hasattr(cls, "instance"):
+            cls.instance = super().__new__(cls)
+        return cls.instance
+
+    def configure(self, enabled: bool) -> None:
+        """
+        Configure the backend.
+
+        Args:
+            enabled (bool): Whether the playbooks are run through ansible-runner.
+        Raises:
+            ValueError: If the backend is enabled without ansible-runner installed.
+        """
+        if enabled and ansible_runner is None:
+            raise ValueError(
+                "The runner backend needs ansible-runner, install toolbox[runner]."
+            )
+        self.enabled = enabled
+
+    def can_run(self, command: List[str]) -> bool:
+        """Return True if the command is run through ansible-runner."""
+        return self.enabled and command[:1] == ["ansible-playbook"]
+
+    async def stream_events(
+        self, command: List[str], cwd: Path, env: Dict[str, str]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run an ansible-playbook command and yield its events as they arrive.
+
+        The last event is {"event": "toolbox_finished", "status": ..., "rc": ...}.
+        If the iteration is stopped early, the playbook run is cancelled and the
+        process group of ansible-playbook, taken from the pid of its events, is
+        terminated.
+
+        Args:
+            command (List[str]): The ansible-playbook command to run.
+            cwd (Path): The folder with the playbook.
+            env (Dict[str, str]): The environment to run ansible in.
+        Returns:
+            AsyncIterator[Dict[str, Any]]: The ansible-runner events.
+        """
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        process_groups: List[int] = []
+        finished = False
+        private_data_dir = tempfile.mkdtemp(prefix="toolbox-runner-")
+
+        def on_event(event: Dict[str, Any]) -> bool:
+            if not process_groups and "pid" in event:
+                try:
+                    process_group = os.getpgid(event["pid"])
+                except ProcessLookupError:
+                    pass
+                else:
+                    if process_group != os.getpgrp():
+                        process_groups.append(process_group)
+            loop.call_soon_threadsafe(events.put_nowait, event)
+            return False
+
+        def on_finished(runner: Any) -> None:
+            event = {"event": FINISHED, "status": runner.status, "rc": runner.rc}
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        thread, _ = ansible_runner.run_async(
+            private_data_dir=private_data_dir,
+            project_dir=str(cwd),
+            playbook=command[1],
+            cmdline=" ".join(shlex.quote(argument) for argument in command[2:]),
+            envvars=env,
+            suppress_env_files=True,
+            quiet=True,
+            event_handler=on_event,
+            cancel_callback=cancelled.is_set,
+            finished_callback=on_finished,
+        )
+        try:
+            while True:
+                event = await events.get()
+                yield event
+                if event["event"] == FINISHED:
+                    finished = True
+                    break
+        finally:
+            cancelled.set()
+            if not finished and process_groups:
+                _signal_process_group(process_groups[0], signal.SIGTERM)
+                await loop.run_in_executor(None, thread.join, self.grace_period)
+                _signal_process_group(process_groups[0], signal.SIGKILL)
+            await loop.run_in_executor(None, thread.join)
+            shutil.rmtree(private_data_dir, ignore_errors=True)
+
+    async def run(
+        self,
+        command: List[str],
+        cwd: Path,
+        env: Dict[str, str],
+        on_output: Optional[Callable[[str], None]] = None,
+        events_path: Optional[Path] = None,
+    ) -> str:
+        """
+        Run an ansible-playbook command, the way Ansible.run_command_async does.
+
+        Args:
+            command (List[str]): The ansible-playbook command to run.
+            cwd (Path): The folder with the playbook.
+            env (Dict[str, str]): The environment to run ansible in.
+            on_output (Callable[[str], None]): Called with every line of output as it
+                is produced. When given, the output is not kept in memory.
+            events_path (Path): The file to record the structured results in.
+        Returns:
+            str: The output, or a success message if the output was streamed.
+        Raises:
+            ValueError: If the playbook run failed.
+        """
+        output: List[str] = []
+        finished: Dict[str, Any] = {}
+        events_file = open(events_path, "a") if events_path is not None else None
+        try:
+            async for event in self.stream_events(command, cwd, env):
+                if event["event"] == FINISHED:
+                    finished = event
+                    continue
+                if event.get("stdout"):
+                    line = event["stdout"] + "\n"
+                    if on_output is not None:
+                        on_output(line)
+                    else:
+                        output.append(line)
+                toolbox_event = to_toolbox_event(event)
+                if events_file is not None and toolbox_event is not None:
+                    events_file.write(json.dumps(toolbox_event) + "\n")
+                    events_file.flush()
+        finally:
+            if events_file is not None:
+                events_file.close()
+        if finished.get("rc") != 0:
+            raise ValueError("Failed to run ansible. " + "".join(output))
+        return "".join(output) or "Ran ansible successfully."
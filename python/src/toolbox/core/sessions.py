@@ -0,0 +1,95 @@
+"""Sessions whose requests are sealed with a symmetric key agreed on once."""
+
+from collections import OrderedDict
+import secrets
+import threading
+import time
+from typing import Optional, Tuple
+
+
+class SessionCache:
+    """
+    Singleton for the symmetric keys of the open sessions.
+
+    A session is opened with an AES key the client encrypted with the public
+    key, so the requests of the session are sealed with that key and opening
+    them needs no private key operation. A session expires ttl seconds after it
+    was opened. Once there are more than max_sessions sessions, those used the
+    longest ago are closed.
+
+    Attributes:
+        ttl (float): Seconds a session stays open.
+        max_sessions (int): How many sessions to keep open at most.
+    """
+
+    ttl: float = 3600
+    max_sessions: int = 1000
+
+    def __new__(cls) -> "SessionCache":
+        """Return the singleton instance."""
+        if not hasattr(cls, "instance"):
+            cls.instance = super().__new__(cls)
+            cls.instance._sessions = OrderedDict()
+            cls.instance._lock = threading.Lock()
+        return cls.instance
+
+    def open(self, key: bytes) -> str:
+        """
+        Open a session.
+
+        Args:
+            key (bytes): The AES key the requests of the session are sealed with.
+        Returns:
+            str: The id of the session.
+        """
+        session_id = secrets.token_urlsafe(32)
+        with self._lock:
+            now = time.monotonic()
+            self._sessions[session_id] = (key, now + self.ttl)
+            self._evict(now)
+        return session_id
+
+    def get_key(self, session_id: str) -> bytes:
+        """
+        Return the key of an open session.
+
+        Args:
+            session_id (str): The id of the session.
+        Returns:
+            bytes: The AES key of the session.
+        Raises:
+            ValueError: If the session is not open or has expired.
+        """
+        with self._lock:
+            session: Optional[Tuple[bytes, float]] = self._sessions.get(session_id)
+            if session is None or session[1] <= time.monotonic():
+                self._sessions.pop(session_id, None)
+                raise ValueError("Unknown or expired session.")
+            self._sessions.move_to_end(session_id)
+            return session[0]
+
+    def close(self, session_id: str) -> None:
+        """
+        Close a session.
+
+        Args:
+            session_id (str): The id of the session.
+        Raises:
+            ValueError: If the session is not open.
+        """
+        with self._lock:
+            if self._sessions.pop(session_id, None) is None:
+                raise ValueError("Unknown or expired session.")
+
+    def clear(self) -> None:
+        """Close all the sessions."""
+        with self._lock:
+            self._sessions.clear()
+
+    def _evict(self, now: float) -> None:
+        """Close the expired sessions, and the least recently used ones over the limit."""
+        for session_id, (_, expires) in list(self._sessions.items()):
+            if expires <= now:
+                del self._sessions[session_id]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
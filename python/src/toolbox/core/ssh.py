@@ -0,0 +1,144 @@
+"""SSH connection multiplexing shared by the credential checks and ansible."""
+
+import hashlib
+import hmac
+from pathlib import Path
+import secrets
+import shlex
+import subprocess
+from typing import Dict, List
+
+
+class SSHMultiplexer:
+    """
+    Singleton managing the ssh ControlMaster connections to the target machines.
+
+    The first ssh session to a host opens a master connection that later sessions
+    to the same host as the same user reuse, so the key exchange and the password
+    authentication happen only once. A master connection closes itself once it has
+    been idle for control_persist seconds. The control path of a master connection
+    depends on the credentials it was opened with, so sessions with other
+    credentials, such as a wrong password, never skip authentication by reusing it.
+
+    Attributes:
+        control_dir (Path): The folder holding the control sockets and the ssh config.
+        control_persist (int): Seconds an idle master connection is kept open.
+            0 disables multiplexing.
+    """
+
+    control_dir: Path = Path.home() / ".toolbox" / "ssh"
+    control_persist: int = 600
+
+    def __new__(cls) -> "SSHMultiplexer":
+        """Return the singleton instance."""
+        if not hasattr(cls, "instance"):
+            cls.instance = super().__new__(cls)
+            cls.instance._secret = secrets.token_bytes(32)
+        return cls.instance
+
+    def configure(self, control_persist: int) -> None:
+        """
+        Configure the multiplexing.
+
+        Args:
+            control_persist (int): Seconds an idle master connection is kept open.
+                0 disables multiplexing.
+        """
+        if control_persist < 0:
+            raise ValueError("The ssh persist time cannot be negative.")
+        self.control_persist = control_persist
+
+    def is_enabled(self) -> bool:
+        """Return True if the connections are multiplexed."""
+        return self.control_persist > 0
+
+    def get_config_path(self) -> Path:
+        """Return the path of the generated ssh config, writing it if needed."""
+        config_path = self.control_dir / "config"
+        config = self.get_config()
+        if not config_path.is_file() or config_path.read_text() != config:
+            self.control_dir.mkdir(parents=True, exist_ok=True, mode=0o700)
+            config_path.write_text(config)
+            config_path.chmod(0o600)
+        return config_path
+
+    def get_config(self) -> str:
+        """Return the contents of the generated ssh config."""
+        config = (
+            "# Generated by the toolbox webapp. Changes will be overwritten.\n"
+            "Host *\n"
+            "    ControlMaster auto\n"
+            f"    ControlPath {self.control_dir}/%C\n"
+            f"    ControlPersist {self.control_persist}\n"
+        )
+        if (Path.home() / ".ssh" / "config").is_file():
+            config += "\nMatch all\n    Include ~/.ssh/config\n"
+        return config
+
+    def get_control_path(self, user: str, password: str) -> str:
+        """
+        Return the control path of the master connections opened with the credentials.
+
+        The credentials are hashed with a secret of the process, so the path of
+        the socket gives nothing away about them.
+
+        Args:
+            user (str): The user the connections log in as.
+            password (str): The password the connections log in with.
+        Returns:
+            str: The control path, with the %C of ssh for the host.
+        """
+        credentials = f"{user}\0{password}".encode("utf-8")
+        digest = hmac.new(self._secret, credentials, hashlib.sha256).hexdigest()
+        return f"{self.control_dir}/{digest[:16]}-%C"
+
+    def get_ssh_args(self, user: str, password: str) -> List[str]:
+        """
+        Return the arguments making ssh use the shared connections.
+
+        Args:
+            user (str): The user ssh logs in as.
+            password (str): The password ssh logs in with.
+        Returns:
+            List[str]: The arguments.
+        """
+        if not self.is_enabled():
+            return []
+        return [
+            "-F",
+            str(self.get_config_path()),
+            "-o",
+            f"ControlPath={self.get_control_path(user, password)}",
+        ]
+
+    def get_ansible_env(self, user: str, password: str) -> Dict[str, str]:
+        """
+        Return the environment variables making ansible use the shared connections.
+
+        Args:
+            user (str): The user ansible logs in as.
+            password (str): The password ansible logs in with.
+        Returns:
+            Dict[str, str]: The environment variables.
+        """
+        if not self.is_enabled():
+            return {}
+        return {
+            "ANSIBLE_SSH_ARGS": "-C " + shlex.join(self.get_ssh_args(user, password)),
+        }
+
+    def get_sockets(self) -> List[Path]:
+        """Return the control sockets of the open master connections."""
+        if not self.control_dir.is_dir():
+            return []
+        return [path for path in self.control_dir.iterdir() if path.is_socket()]
+
+    def close_all(self) -> None:
+        """Close all the master connections."""
+        for socket in self.get_sockets():
+            subprocess.run(
+                ["ssh", "-o", f"ControlPath={socket}", "-O", "exit", "toolbox"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            socket.unlink(missing_ok=True)
@@ -0,0 +1,73 @@
+"""Timing reports of the tasks and roles of ansible runs."""
+
+import heapq
+from typing import Dict, Iterable, List, Tuple
+
+from pydantic import BaseModel, Field
+from toolbox.core.results import TaskResult
+
+
+class Timing(BaseModel):
+    """
+    Class for the durations of a task or a role aggregated across the jobs.
+
+    Attributes:
+        role (str): The role, empty for tasks outside of roles.
+        task (str): The task, empty when timing a whole role.
+        runs (int): How many times it ran, counting every host separately.
+        total (float): The total seconds it took.
+        mean (float): The mean seconds it took.
+        max (float): The most seconds it took.
+    """
+
+    role: str = Field("", description="The role, empty for tasks outside of roles.")
+    task: str = Field("", description="The task, empty when timing a whole role.")
+    runs: int = Field(0, description="How many times it ran.")
+    total: float = Field(0, description="The total seconds it took.")
+    mean: float = Field(0, description="The mean seconds it took.")
+    max: float = Field(0, description="The most seconds it took.")
+
+
+def get_slowest_tasks(
+    tasks: Iterable[TaskResult], top: int
+) -> Dict[str, List[TaskResult]]:
+    """
+    Return the slowest tasks of every host of a run.
+
+    Only the top tasks of every host are kept while the results are read.
+
+    Args:
+        tasks (Iterable[TaskResult]): The task results of the run.
+        top (int): How many tasks to return per host.
+    Returns:
+        Dict[str, List[TaskResult]]: The slowest tasks of every host, slowest first.
+    """
+    slowest: Dict[str, List[Tuple[float, int, TaskResult]]] = {}
+    for index, task in enumerate(tasks):
+        heap = slowest.setdefault(task.host, [])
+        if len(heap) < top:
+            heapq.heappush(heap, (task.duration, -index, task))
+        elif task.duration > heap[0][0]:
+            heapq.heapreplace(heap, (task.duration, -index, task))
+    return {
+        host: [task for _, _, task in sorted(heap, reverse=True)]
+        for host, heap in slowest.items()
+    }
+
+
+def get_role_durations(tasks: Iterable[TaskResult]) -> Dict[str, Dict[str, float]]:
+    """
+    Return how many seconds every role took on every host of a run.
+
+    Args:
+        tasks (Iterable[TaskResult]): The task results of the run.
+    Returns:
+        Dict[str, Dict[str, float]]: The seconds per role, empty for tasks outside
+            of roles, of every host.
+    """
+    durations: Dict[str, Dict[str, float]] = {}
+    for task in tasks:
+        roles = durations.setdefault(task.host, {})
+        role = task.role or ""
+        roles[role] = round(roles.get(role, 0) + task.duration, 3)
+    return durations
@@ -0,0 +1,361 @@
+"""Warm worker process running ansible without paying its startup cost on every run."""
+
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+from pathlib import Path
+import select
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+WARM_COMMANDS = {
+    "ansible-playbook": "ansible.cli.playbook:PlaybookCLI",
+    "ansible": "ansible.cli.adhoc:AdHocCLI",
+}
+PER_RUN_ENV = ("TOOLBOX_EVENTS_FILE",)
+
+PID_FRAME = b"p"
+OUTPUT_FRAME = b"o"
+EXIT_FRAME = b"x"
+HEADER = struct.Struct("!cI")
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[bytes, bytes]:
+    """Read a frame sent by the warm worker."""
+    kind, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return kind, await reader.readexactly(length)
+
+
+def send_frame(connection: socket.socket, kind: bytes, payload: bytes) -> None:
+    """Send a frame to the client of the warm worker."""
+    connection.sendall(HEADER.pack(kind, len(payload)) + payload)
+
+
+class WarmProcess:
+    """
+    Class for a command run by the warm worker, used like an asyncio subprocess.
+
+    The command runs in its own session, so its process group can be signalled
+    through the pid like that of a subprocess started with start_new_session.
+    Its output and errors are both written to stdout.
+
+    Attributes:
+        pid (int): The pid of the process running the command.
+        returncode (int): The exit code, None while the command is running.
+        stdout (asyncio.StreamReader): The output of the command.
+    """
+
+    def __init__(
+        self, pid: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """Start forwarding the output the worker sends for the command."""
+        self.pid = pid
+        self.returncode: Optional[int] = None
+        self.stdout = asyncio.StreamReader()
+        self.stderr = None
+        self._reader = reader
+        self._writer = writer
+        self._forwarding = asyncio.get_running_loop().create_task(self._forward())
+
+    async def _forward(self) -> None:
+        """Feed the output frames to stdout until the exit frame arrives."""
+        try:
+            while True:
+                kind, payload = await read_frame(self._reader)
+                if kind == OUTPUT_FRAME:
+                    self.stdout.feed_data(payload)
+                elif kind == EXIT_FRAME:
+                    self.returncode = int(payload)
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.returncode = 255
+        finally:
+            self.stdout.feed_eof()
+            self._writer.close()
+
+    async def wait(self) -> int:
+        """Wait for the command to exit and return its exit code."""
+        await asyncio.shield(self._forwarding)
+        return self.returncode if self.returncode is not None else 255
+
+    async def communicate(self) -> Tuple[bytes, bytes]:
+        """Wait for the command to exit and return its output."""
+        stdout = await self.stdout.read()
+        await self.wait()
+        return stdout, b""
+
+
+class WarmExecutor:
+    """
+    Singleton for the warm worker processes running the ansible commands.
+
+    A worker imports ansible once and then forks for every command, so a run
+    starts without importing ansible and loading its plugins again. Ansible
+    reads its configuration when it is imported, so there is a worker for every
+    run folder and environment the commands run with. Commands that are not
+    ansible, and ansible modules that cannot be imported, are run by the forked
+    worker process the usual way.
+
+    Attributes:
+        enabled (bool): Whether the ansible commands are run by a warm worker.
+        commands (Dict[str, str]): The commands a worker runs in process, with the
+            class or function running them as "module:attribute".
+        max_workers (int): How many workers to keep running.
+    """
+
+    enabled: bool = False
+    commands: Dict[str, str] = WARM_COMMANDS
+    max_workers: int = 4
+
+    def __new__(cls) -> "WarmExecutor":
+        """Return the singleton instance."""
+        if not hasattr(cls, "instance"):
+            cls.instance = super().__new__(cls)
+            cls.instance._workers = {}
+            cls.instance._lock = threading.Lock()
+        return cls.instance
+
+    def configure(self, enabled: bool) -> None:
+        """
+        Configure the warm workers.
+
+        Args:
+            enabled (bool): Whether the ansible commands are run by a warm worker.
+        """
+        self.enabled = enabled
+        if not enabled:
+            self.close_all()
+
+    def can_run(self, command: List[str]) -> bool:
+        """Return True if the command is run by a warm worker."""
+        return (
+            self.enabled
+            and hasattr(os, "fork")
+            and command != []
+            and command[0] in self.commands
+        )
+
+    async def start(
+        self, command: List[str], cwd: Path, env: Dict[str, str]
+    ) -> WarmProcess:
+        """
+        Start running a command in a warm worker.
+
+        Args:
+            command (List[str]): The command to run.
+            cwd (Path): The folder to run the command in.
+            env (Dict[str, str]): The environment to run the command in.
+        Returns:
+            WarmProcess: The running command.
+        Raises:
+            OSError: If the worker cannot be started or reached.
+        """
+        socket_path = await asyncio.get_running_loop().run_in_executor(
+            None, self._get_worker, cwd, env
+        )
+        reader, writer = await asyncio.open_unix_connection(str(socket_path))
+        request = {"argv": command, "cwd": str(cwd), "env": env}
+        writer.write(json.dumps(request).encode("utf-8") + b"\n")
+        try:
+            await writer.drain()
+            kind, payload = await read_frame(reader)
+        except asyncio.IncompleteReadError as e:
+            writer.close()
+            raise OSError("The warm worker closed the connection.") from e
+        if kind != PID_FRAME:
+            writer.close()
+            raise OSError("The warm worker sent an unexpected response.")
+        return WarmProcess(int(payload), reader, writer)
+
+    def close_all(self) -> None:
+        """Stop all the workers."""
+        with self._lock:
+            for key in list(self._workers):
+                self._stop_worker(key)
+
+    def _get_worker(self, cwd: Path, env: Dict[str, str]) -> Path:
+        """Return the socket of the worker for the folder and environment, starting it if needed."""
+        worker_env = {
+            key: value for key, value in env.items() if key not in PER_RUN_ENV
+        }
+        payload = json.dumps([str(cwd), sorted(worker_env.items())])
+        key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        with self._lock:
+            worker = self._workers.get(key)
+            if worker is not None and worker[0].poll() is None:
+                return worker[1]
+            if worker is not None:
+                self._stop_worker(key)
+            while len(self._workers) >= self.max_workers:
+                self._stop_worker(next(iter(self._workers)))
+            folder = Path(tempfile.mkdtemp(prefix="toolbox-warm-"))
+            socket_path = folder / "worker.sock"
+            process = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "toolbox.core.warm",
+                    str(socket_path),
+                    *[f"{name}={target}" for name, target in self.commands.items()],
+                ],
+                cwd=cwd,
+                env=worker_env,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+            )
+            self._workers[key] = (process, socket_path)
+            if process.stdout is None or process.stdout.readline() != b"ready\n":
+                self._stop_worker(key)
+                raise OSError("The warm worker failed to start.")
+            return socket_path
+
+    def _stop_worker(self, key: str) -> None:
+        """Stop a worker and remove its socket. The lock must be held."""
+        process, socket_path = self._workers.pop(key)
+        if process.stdin is not None:
+            process.stdin.close()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        if process.stdout is not None:
+            process.stdout.close()
+        shutil.rmtree(socket_path.parent, ignore_errors=True)
+
+
+def serve(socket_path: str, commands: Dict[str, str]) -> None:
+    """
+    Run the warm worker until its stdin is closed.
+
+    Args:
+        socket_path (str): The unix socket to accept the commands on.
+        commands (Dict[str, str]): The commands to run in process, with the class
+            or function running them as "module:attribute".
+    """
+    targets: Dict[str, Any] = {}
+    for name, target in commands.items():
+        module_name, _, attribute = target.partition(":")
+        try:
+            targets[name] = getattr(importlib.import_module(module_name), attribute)
+        except (ImportError, AttributeError):
+            continue
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    listener.listen(64)
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    sys.stdout.write("ready\n")
+    sys.stdout.flush()
+    stdin = sys.stdin.fileno()
+    while True:
+        readable, _, _ = select.select([listener, stdin], [], [])
+        if stdin in readable and os.read(stdin, 1024) == b"":
+            break
+        if listener in readable:
+            connection, _ = listener.accept()
+            if os.fork() == 0:
+                listener.close()
+                try:
+                    _supervise(connection, targets)
+                finally:
+                    os._exit(0)
+            connection.close()
+    listener.close()
+    os.unlink(socket_path)
+
+
+def _supervise(connection: socket.socket, targets: Dict[str, Any]) -> None:
+    """Run the requested command in a child process and forward its output."""
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    with connection.makefile("rb") as f:
+        request = json.loads(f.readline())
+    read_fd, write_fd = os.pipe()
+    session_fd, started_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        connection.close()
+        os.close(read_fd)
+        os.close(session_fd)
+        _run(request, targets, write_fd, started_fd)
+    os.close(write_fd)
+    os.close(started_fd)
+    os.read(session_fd, 1)
+    os.close(session_fd)
+    try:
+        send_frame(connection, PID_FRAME, str(pid).encode("utf-8"))
+        with os.fdopen(read_fd, "rb", buffering=0) as output:
+            for chunk in iter(lambda: output.read(65536), b""):
+                send_frame(connection, OUTPUT_FRAME, chunk)
+        _, status = os.waitpid(pid, 0)
+        code = os.waitstatus_to_exitcode(status)
+        send_frame(connection, EXIT_FRAME, str(code).encode("utf-8"))
+    except OSError:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    finally:
+        connection.close()
+
+
+def _run(
+    request: Dict[str, Any], targets: Dict[str, Any], output_fd: int, started_fd: int
+) -> None:
+    """
+    Run the command in the current process, and exit with its exit code.
+
+    started_fd is closed once the process leads its own session, so that the pid
+    sent to the client can be used to signal the process group.
+    """
+    code = 1
+    try:
+        os.setsid()
+        os.close(started_fd)
+        os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+        os.dup2(output_fd, 1)
+        os.dup2(output_fd, 2)
+        os.close(output_fd)
+        signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        argv = request["argv"]
+        target: Optional[Callable] = targets.get(argv[0])
+        if target is None:
+            os.execvpe(argv[0], argv, request["env"])
+        sys.argv = list(argv)
+        try:
+            if hasattr(target, "cli_executor"):
+                target.cli_executor(argv)
+            else:
+                target(argv)
+            code = 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                code = e.code or 0
+            else:
+                sys.stderr.write(f"{e.code}\n")
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+if __name__ == "__main__":
+    serve(
+        sys.argv[1],
+        dict(argument.split("=", 1) for argument in sys.argv[2:]),
+    )
@@ -2,9 +2,16 @@
 import argparse
 import multiprocessing
 from pathlib import Path
+from typing import Optional
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from toolbox.core.ansible_profile import AnsibleProfile
+from toolbox.core.jobs import JobManager
+from toolbox.core.rsakey import RSAKey
+from toolbox.core.runner import RunnerBackend
+from toolbox.core.ssh import SSHMultiplexer
+from toolbox.core.warm import WarmExecutor
 from toolbox.server.main import run_server
 from toolbox.server.mount_api import mount_api
 from toolbox.server.mount_frontend import mount_frontend
@@ -12,8 +19,24 @@ from toolbox.server.terminal import run_terminal
 import webview
 
 
-def build_app(terminal_host: str = "localhost", terminal_port: int = 8765) -> FastAPI:
+def build_app(
+    terminal_host: str = "localhost",
+    terminal_port: int = 8765,
+    max_jobs: int = 4,
+    ssh_persist: int = 600,
+    profile: Optional[AnsibleProfile] = None,
+    warm_ansible: bool = False,
+    ansible_runner: bool = False,
+    key_rotation: int = 0,
+) -> FastAPI:
     """Build the FastAPI app."""
+    if profile is not None:
+        AnsibleProfile.current = profile
+    JobManager().configure(max_concurrent_jobs=max_jobs)
+    SSHMultiplexer().configure(control_persist=ssh_persist)
+    WarmExecutor().configure(enabled=warm_ansible)
+    RunnerBackend().configure(enabled=ansible_runner)
+    RSAKey().configure(rotate_after=key_rotation)
     app = FastAPI(title="Toolbox Webapp")
     app.add_middleware(
         CORSMiddleware,
@@ -53,10 +76,82 @@ def arg_parser():
         default=8765,
         help="Port to run the terminal on.",
     )
+    parser.add_argument(
+        "--max_jobs",
+        type=int,
+        default=4,
+        help="Maximum number of ansible runs to execute at the same time.",
+    )
+    parser.add_argument(
+        "--ssh_persist",
+        type=int,
+        default=600,
+        help="Seconds to keep idle ssh connections to the targets open. 0 disables reuse.",
+    )
+    parser.add_argument(
+        "--forks",
+        type=int,
+        default=20,
+        help="Number of hosts ansible works on in parallel.",
+    )
+    parser.add_argument(
+        "--no_pipelining",
+        action="store_true",
+        help="Copy modules to the hosts before running them instead of pipelining.",
+    )
+    parser.add_argument(
+        "--fact_cache_timeout",
+        type=int,
+        default=86400,
+        help="Seconds the cached facts of a host stay valid.",
+    )
+    parser.add_argument(
+        "--stdout_callback",
+        type=str,
+        default="default",
+        help="Ansible callback plugin printing the output.",
+    )
+    parser.add_argument(
+        "--callbacks",
+        type=str,
+        default="",
+        help="Comma separated list of other ansible callback plugins to enable.",
+    )
+    parser.add_argument(
+        "--warm_ansible",
+        action="store_true",
+        help="Run ansible from a worker process that has ansible loaded already.",
+    )
+    parser.add_argument(
+        "--ansible_runner",
+        action="store_true",
+        help="Run the playbooks through ansible-runner, installed by toolbox[runner].",
+    )
+    parser.add_argument(
+        "--key_rotation",
+        type=int,
+        default=0,
+        help="Seconds after which the server key is replaced by a new one. 0 keeps it.",
+    )
     args = parser.parse_args()
     return args
 
 
+def get_ansible_profile(args) -> AnsibleProfile:
+    """Build the ansible profile from the arguments."""
+    return AnsibleProfile(
+        forks=args.forks,
+        pipelining=not args.no_pipelining,
+        fact_caching_timeout=args.fact_cache_timeout,
+        stdout_callback=args.stdout_callback,
+        callbacks_enabled=[
+            callback.strip()
+            for callback in args.callbacks.split(",")
+            if callback.strip()
+        ],
+    )
+
+
 def run_server_app(app, host, port):
     """Run the FastAPI server."""
     run_server(app, host, port)
@@ -69,7 +164,16 @@ def run_terminal_app(terminal_host, terminal_port):
 
 def run_webapp(args):
     """Run the webapp."""
-    app = build_app(args.terminal_host, args.terminal_port)
+    app = build_app(
+        args.terminal_host,
+        args.terminal_port,
+        args.max_jobs,
+        args.ssh_persist,
+        get_ansible_profile(args),
+        args.warm_ansible,
+        args.ansible_runner,
+        args.key_rotation,
+    )
     server_process = multiprocessing.Process(
         target=run_server_app, args=(app, args.host, args.port)
     )
@@ -98,6 +202,7 @@ def run_webapp(args):
         for process in processes:
             process.terminate()
             process.join()
+        SSHMultiplexer().close_all()
 
 
 if __name__ == "__main__":
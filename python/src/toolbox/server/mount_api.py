@@ -1,10 +1,12 @@
 """API endpoints for the toolbox server."""
-from typing import Dict
+from typing import Dict, Union
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from toolbox.api.custom import custom_endpoints
 from toolbox.api.editor import editor_endpoints
 from toolbox.api.install import install_endpoints
+from toolbox.api.jobs import jobs_endpoints
+from toolbox.api.session import session_endpoints
 from toolbox.api.target import target_endpoints
 from toolbox.api.uninstall import uninstall_endpoints
 from toolbox.core.rsakey import RSAKey
@@ -33,10 +35,31 @@ def mount_api(
         return "OK"
 
     @app.get("/api/public_key", response_model=Dict[str, str])
-    def get_public_key() -> Dict[str, str]:
-        """Return the public key."""
-        public_key = RSAKey().get_public_key()
-        return {"public_key": public_key}
+    def get_public_key(
+        request: Request, response: Response
+    ) -> Union[Dict[str, str], Response]:
+        """
+        Return the public key.
+
+        The response has the ETag of the key, and a Cache-Control letting the
+        clients keep it until it is rotated. A request whose If-None-Match has
+        the ETag of the current key gets a 304 without the key.
+        """
+        public_key = RSAKey().get_published_key()
+        headers = {
+            "ETag": public_key.etag,
+            "Cache-Control": (
+                f"public, max-age={public_key.max_age}"
+                if public_key.max_age
+                else "no-cache"
+            ),
+        }
+        if_none_match = request.headers.get("if-none-match", "")
+        etags = [etag.strip().removeprefix("W/") for etag in if_none_match.split(",")]
+        if "*" in etags or public_key.etag in etags:
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return {"public_key": public_key.pem}
 
     @app.get("/api/terminal/url", response_model=Dict[str, str])
     def get_terminal_url() -> Dict[str, str]:
@@ -58,4 +81,10 @@ def mount_api(
     custom_endpoint = custom_endpoints(app)
     app.mount("/api/custom", custom_endpoint, name="custom")
 
+    jobs_endpoint = jobs_endpoints(app)
+    app.mount("/api/jobs", jobs_endpoint, name="jobs")
+
+    session_endpoint = session_endpoints(app)
+    app.mount("/api/session", session_endpoint, name="session")
+
     return app
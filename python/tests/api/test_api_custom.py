@@ -1,7 +1,8 @@
+import json
 from unittest.mock import patch
 
 from fastapi.testclient import TestClient
-from toolbox.core.rsakey import encrypt
+from toolbox.core.rsakey import encrypt, encrypt_envelope
 from toolbox.main import build_app
 
 client = TestClient(build_app())
@@ -123,7 +124,7 @@ def test_run_custom_with_correct_encryption_mocked():
     }
     with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
         with patch(
-            "toolbox.core.ansible.Ansible.run_command",
+            "toolbox.core.ansible.Ansible.run_command_async",
             return_value="Ran Ansible successfully",
         ):
             response = client.put("/api/custom/run", json=data)
@@ -143,7 +144,7 @@ def test_run_custom_with_non_integer_verbosity():
     }
     with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
         with patch(
-            "toolbox.core.ansible.Ansible.run_command",
+            "toolbox.core.ansible.Ansible.run_command_async",
             return_value="Ran Ansible successfully",
         ):
             response = client.put("/api/custom/run", json=data)
@@ -168,9 +169,68 @@ def test_run_custom_with_all_data():
     }
     with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
         with patch(
-            "toolbox.core.ansible.Ansible.run_command",
+            "toolbox.core.ansible.Ansible.run_command_async",
             return_value="Ran Ansible successfully",
         ):
             response = client.put("/api/custom/run", json=data)
             assert response.status_code == 200
             assert response.json() == "Ran Ansible successfully"
+
+
+def test_run_custom_with_envelope():
+    """Test the /api/custom/run endpoint with the fields sealed in an envelope."""
+    encryption_key: str = client.get("/api/public_key").json()["public_key"]
+    extra_vars = [{"key": f"key{index}", "value": "value"} for index in range(50)]
+    fields = {
+        "hosts": "hosts",
+        "user": "user",
+        "password": "password",
+        "playbook": "playbook",
+        "extra_vars": json.dumps(extra_vars),
+        "tags": "tags",
+        "extra_args": "extra_args",
+    }
+    data = {"envelope": encrypt_envelope(fields, encryption_key.encode())}
+    with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async",
+            return_value="Ran Ansible successfully",
+        ) as run_command_async:
+            response = client.put("/api/custom/run", json=data)
+    assert response.status_code == 200
+    assert response.json() == "Ran Ansible successfully"
+    command = run_command_async.call_args.args[0]
+    assert "key49=value" in command
+
+
+def test_run_custom_with_malformed_envelope():
+    """Test the /api/custom/run endpoint with a malformed envelope."""
+    response = client.put(
+        "/api/custom/run", json={"envelope": {"key": "key", "iv": "iv", "data": ""}}
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Malformed envelope."}
+
+
+def test_run_custom_streams_output():
+    """Test the /api/custom/run endpoint returns the output as one JSON string."""
+    encryption_key: str = client.get("/api/public_key").json()["public_key"]
+    data = {
+        "hosts": encrypt("hosts", encryption_key.encode()),
+        "user": encrypt("user", encryption_key.encode()),
+        "password": encrypt("password", encryption_key.encode()),
+        "playbook": encrypt("playbook", encryption_key.encode()),
+    }
+    lines = [f'TASK [step {index}] "quoted" \\ ✓\n' for index in range(5000)]
+
+    async def run(command, on_output, events_path=None):
+        for line in lines:
+            on_output(line)
+        return "Ran Ansible successfully"
+
+    with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            response = client.put("/api/custom/run", json=data)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == "".join(lines)
@@ -0,0 +1,428 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from toolbox.core.jobs import JobManager
+from toolbox.core.rsakey import encrypt
+from toolbox.main import build_app
+
+
+def wait_for_job(client: TestClient, job_id: str) -> dict:
+    """Poll the /api/jobs/{job_id} endpoint until the job has finished."""
+    for _ in range(100):
+        status = client.get(f"/api/jobs/{job_id}").json()
+        if status["status"] in ("succeeded", "failed"):
+            return status
+        time.sleep(0.05)
+    raise TimeoutError(f"Job {job_id} did not finish.")
+
+
+def install_data(client: TestClient) -> dict:
+    """Return encrypted data for the /api/target/install endpoint."""
+    encryption_key: str = client.get("/api/public_key").json()["public_key"]
+    return {
+        "hosts": encrypt("hosts", encryption_key.encode()),
+        "user": encrypt("user", encryption_key.encode()),
+        "password": encrypt("password", encryption_key.encode()),
+        "tags": ["tag1", "tag2"],
+        "background": True,
+    }
+
+
+def test_get_missing_job():
+    """Test the /api/jobs/{job_id} endpoint with an unknown job id."""
+    with TestClient(build_app()) as client:
+        response = client.get("/api/jobs/missing")
+        assert response.status_code == 404
+        assert response.json() == {"detail": "Job 'missing' does not exist."}
+
+
+def test_get_missing_job_result():
+    """Test the /api/jobs/{job_id}/result endpoint with an unknown job id."""
+    with TestClient(build_app()) as client:
+        response = client.get("/api/jobs/missing/result")
+        assert response.status_code == 404
+
+
+def test_install_in_background():
+    """Test the /api/target/install endpoint returns a job id right away."""
+    with TestClient(build_app()) as client:
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async",
+                return_value="Installation successful",
+            ):
+                response = client.put("/api/target/install", json=install_data(client))
+                assert response.status_code == 200
+                job_id = response.json()["job_id"]
+                status = wait_for_job(client, job_id)
+        assert status["id"] == job_id
+        assert status["status"] == "succeeded"
+        assert status["playbook"] == "install.yml"
+        assert status["tags"] == ["tag1", "tag2"]
+        response = client.get(f"/api/jobs/{job_id}/result")
+        assert response.status_code == 200
+        assert response.json()["result"] == "Installation successful"
+        assert response.json()["error"] is None
+
+
+def test_failed_job_result():
+    """Test the /api/jobs/{job_id}/result endpoint for a failed job."""
+    with TestClient(build_app()) as client:
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async",
+                side_effect=ValueError("Failed to run ansible. error"),
+            ):
+                response = client.put("/api/target/install", json=install_data(client))
+                job_id = response.json()["job_id"]
+                wait_for_job(client, job_id)
+        response = client.get(f"/api/jobs/{job_id}/result")
+        assert response.status_code == 200
+        assert response.json()["status"] == "failed"
+        assert response.json()["error"] == "Failed to run ansible. error"
+
+
+def test_unfinished_job_result():
+    """Test the /api/jobs/{job_id}/result endpoint for a running job."""
+    release = []
+
+    async def slow_run(command, on_output, events_path=None):
+        while not release:
+            await asyncio.sleep(0.01)
+        return "done"
+
+    with TestClient(build_app()) as client:
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async", side_effect=slow_run
+            ):
+                response = client.put("/api/target/install", json=install_data(client))
+                job_id = response.json()["job_id"]
+                response = client.get(f"/api/jobs/{job_id}/result")
+                assert response.status_code == 409
+                assert response.json() == {"detail": "Job has not finished yet."}
+                response = client.get("/api/health")
+                assert response.status_code == 200
+                release.append(True)
+                wait_for_job(client, job_id)
+
+
+def test_stream_job_output():
+    """Test the /api/jobs/{job_id}/stream endpoint streams the output of a job."""
+
+    async def run(command, on_output, events_path=None):
+        for i in range(3):
+            await asyncio.sleep(0.05)
+            on_output(f"line {i}\n")
+        return "Ran ansible successfully."
+
+    with TestClient(build_app()) as client:
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async", side_effect=run
+            ):
+                response = client.put("/api/target/install", json=install_data(client))
+                job_id = response.json()["job_id"]
+                response = client.get(f"/api/jobs/{job_id}/stream")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text == (
+            "data: line 0\n\n"
+            "data: line 1\n\n"
+            "data: line 2\n\n"
+            "event: end\ndata: succeeded\n\n"
+        )
+        response = client.get(f"/api/jobs/{job_id}/log")
+        assert response.status_code == 200
+        assert response.text == "line 0\nline 1\nline 2\n"
+        response = client.get(f"/api/jobs/{job_id}/result")
+        assert response.json()["output"] == "line 0\nline 1\nline 2\n"
+
+
+def test_stream_missing_job():
+    """Test the /api/jobs/{job_id}/stream endpoint with an unknown job id."""
+    with TestClient(build_app()) as client:
+        response = client.get("/api/jobs/missing/stream")
+        assert response.status_code == 404
+        response = client.get("/api/jobs/missing/log")
+        assert response.status_code == 404
+
+
+def test_install_returns_streamed_output():
+    """Test the /api/target/install endpoint returns the output when waiting."""
+
+    async def run(command, on_output, events_path=None):
+        on_output("PLAY RECAP\n")
+        return "Ran ansible successfully."
+
+    with TestClient(build_app()) as client:
+        data = install_data(client)
+        data["background"] = False
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async", side_effect=run
+            ):
+                response = client.put("/api/target/install", json=data)
+        assert response.status_code == 200
+        assert response.json() == "PLAY RECAP\n"
+
+
+def test_job_hosts_and_tasks():
+    """Test the /api/jobs/{job_id}/hosts and /tasks endpoints."""
+
+    async def run(command, on_output, events_path=None):
+        with open(events_path, "a") as f:
+            for host, status in (("host1", "ok"), ("host2", "failed")):
+                event = {
+                    "event": "task_result",
+                    "host": host,
+                    "task": "Install",
+                    "role": "role1",
+                    "status": status,
+                    "duration": 1.5,
+                }
+                f.write(json.dumps(event) + "\n")
+        raise ValueError("Failed to run ansible. ")
+
+    with TestClient(build_app()) as client:
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async", side_effect=run
+            ):
+                response = client.put("/api/target/install", json=install_data(client))
+                job_id = response.json()["job_id"]
+                wait_for_job(client, job_id)
+        response = client.get(f"/api/jobs/{job_id}/hosts")
+        assert response.status_code == 200
+        assert response.json()["host1"]["status"] == "ok"
+        assert response.json()["host2"]["status"] == "failed"
+        assert response.json()["host2"]["failures"] == 1
+        response = client.get(f"/api/jobs/{job_id}/tasks")
+        assert response.status_code == 200
+        assert [task["host"] for task in response.json()] == ["host1", "host2"]
+        assert response.json()[0]["duration"] == 1.5
+        response = client.get(f"/api/jobs/{job_id}/tasks?status=failed")
+        assert [task["host"] for task in response.json()] == ["host2"]
+        response = client.get(f"/api/jobs/{job_id}/tasks?host=host1&status=failed")
+        assert response.json() == []
+
+
+def test_missing_job_hosts_and_tasks():
+    """Test the /api/jobs/{job_id}/hosts and /tasks endpoints with an unknown job."""
+    with TestClient(build_app()) as client:
+        assert client.get("/api/jobs/missing/hosts").status_code == 404
+        assert client.get("/api/jobs/missing/tasks").status_code == 404
+
+
+def test_job_timings():
+    """Test the /api/jobs/{job_id}/timings and /api/jobs/timings endpoints."""
+
+    async def run(command, on_output, events_path=None):
+        with open(events_path, "a") as f:
+            for role, task, duration in (
+                ("docker", "Install docker", 30),
+                ("docker", "Add repository", 5),
+                ("k3s", "Install k3s", 12),
+            ):
+                event = {
+                    "event": "task_result",
+                    "host": "host1",
+                    "task": task,
+                    "role": role,
+                    "status": "ok",
+                    "duration": duration,
+                }
+                f.write(json.dumps(event) + "\n")
+        return "Ran ansible successfully."
+
+    with TestClient(build_app()) as client:
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async", side_effect=run
+            ):
+                response = client.put("/api/target/install", json=install_data(client))
+                job_id = response.json()["job_id"]
+                wait_for_job(client, job_id)
+        response = client.get(f"/api/jobs/{job_id}/timings?top=2")
+        assert response.status_code == 200
+        assert [task["task"] for task in response.json()["tasks"]["host1"]] == [
+            "Install docker",
+            "Install k3s",
+        ]
+        assert response.json()["roles"] == {"host1": {"docker": 35, "k3s": 12}}
+        response = client.get("/api/jobs/timings?top=1")
+        assert response.status_code == 200
+        assert response.json()["tasks"][0]["task"] == "Install docker"
+        assert response.json()["roles"][0]["role"] == "docker"
+        assert client.get("/api/jobs/timings?top=0").status_code == 400
+        assert client.get("/api/jobs/timings?jobs=0").status_code == 400
+        assert client.get(f"/api/jobs/{job_id}/timings?top=0").status_code == 400
+        assert client.get("/api/jobs/missing/timings").status_code == 404
+
+
+def test_job_history():
+    """Test the /api/jobs endpoint lists the finished jobs with their hosts."""
+    with TestClient(build_app()) as client:
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async",
+                return_value="Installation successful",
+            ):
+                job_ids = []
+                for _ in range(3):
+                    data = {**install_data(client), "force": True}
+                    response = client.put("/api/target/install", json=data)
+                    job_ids.append(response.json()["job_id"])
+                    wait_for_job(client, job_ids[-1])
+        response = client.get("/api/jobs?limit=2&tag=tag1&host=hosts")
+        assert response.status_code == 200
+        page = response.json()
+        assert [job["id"] for job in page["jobs"]] == job_ids[:0:-1]
+        assert page["jobs"][0]["status"] == "succeeded"
+        assert page["jobs"][0]["tags"] == ["tag1", "tag2"]
+        assert page["jobs"][0]["hosts"] == {"hosts": None}
+        assert page["jobs"][0]["duration"] is not None
+        response = client.get(f"/api/jobs?limit=2&before={page['next']}")
+        assert [job["id"] for job in response.json()["jobs"]] == job_ids[:1]
+        assert response.json()["next"] is None
+        assert client.get("/api/jobs?status=failed").json()["jobs"] == []
+
+
+def test_job_history_invalid_page():
+    """Test the /api/jobs endpoint with an invalid page."""
+    with TestClient(build_app()) as client:
+        assert client.get("/api/jobs?limit=0").status_code == 400
+        assert client.get("/api/jobs?limit=501").status_code == 400
+        response = client.get("/api/jobs?before=missing")
+        assert response.status_code == 400
+        assert response.json() == {"detail": "Job 'missing' does not exist."}
+
+
+def test_forgotten_job_from_history():
+    """Test the /api/jobs/{job_id} endpoint falls back to the job history."""
+    with TestClient(build_app()) as client:
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async",
+                return_value="Installation successful",
+            ):
+                response = client.put("/api/target/install", json=install_data(client))
+                job_id = response.json()["job_id"]
+                wait_for_job(client, job_id)
+        del JobManager().jobs[job_id]
+        response = client.get(f"/api/jobs/{job_id}")
+        assert response.status_code == 200
+        assert response.json()["status"] == "succeeded"
+        assert response.json()["tags"] == ["tag1", "tag2"]
+        assert "log_path" not in response.json()
+        response = client.get(f"/api/jobs/{job_id}/log")
+        assert response.status_code == 200
+
+
+def test_identical_installs_share_a_job():
+    """Test identical installs submitted while one is running share the same job."""
+    release = []
+
+    async def slow_run(command, on_output, events_path=None):
+        while not release:
+            await asyncio.sleep(0.01)
+        return "done"
+
+    with TestClient(build_app()) as client:
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async", side_effect=slow_run
+            ) as run_command_async:
+                first = client.put("/api/target/install", json=install_data(client))
+                second = client.put("/api/target/install", json=install_data(client))
+                release.append(True)
+                status = wait_for_job(client, first.json()["job_id"])
+        assert second.json()["job_id"] == first.json()["job_id"]
+        assert status["attached"] == 1
+        assert run_command_async.call_count == 1
+
+
+def test_cancel_job():
+    """Test the /api/jobs/{job_id}/cancel endpoint stops a running job."""
+
+    async def slow_run(command, on_output, events_path=None):
+        await asyncio.sleep(30)
+
+    with TestClient(build_app()) as client:
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async", side_effect=slow_run
+            ):
+                response = client.put("/api/target/install", json=install_data(client))
+                job_id = response.json()["job_id"]
+                response = client.put(f"/api/jobs/{job_id}/cancel")
+        assert response.status_code == 200
+        assert response.json()["status"] == "cancelled"
+        response = client.get(f"/api/jobs/{job_id}/result")
+        assert response.json()["error"].startswith("Job was cancelled.")
+        response = client.put(f"/api/jobs/{job_id}/cancel")
+        assert response.status_code == 409
+        assert response.json() == {"detail": "Job has already finished."}
+        assert client.put("/api/jobs/missing/cancel").status_code == 404
+
+
+def test_install_with_invalid_timeout():
+    """Test the /api/target/install endpoint with an invalid timeout."""
+    with TestClient(build_app()) as client:
+        data = install_data(client)
+        data["timeout"] = -1
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            response = client.put("/api/target/install", json=data)
+        assert response.status_code == 400
+        assert "Timeout must be a positive number" in response.json()["detail"]
+
+
+def test_retry_job():
+    """Test the /api/jobs/{job_id}/retry endpoint reruns the failed hosts only."""
+    commands = []
+
+    async def failing_run(command, on_output, events_path=None):
+        commands.append(command)
+        with open(events_path, "a") as f:
+            event = {"event": "task_result", "host": "hosts", "status": "unreachable"}
+            f.write(json.dumps(event) + "\n")
+        raise ValueError("Failed to run ansible. ")
+
+    with TestClient(build_app()) as client:
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async",
+                side_effect=failing_run,
+            ):
+                response = client.put("/api/target/install", json=install_data(client))
+                job_id = response.json()["job_id"]
+                status = wait_for_job(client, job_id)
+                assert status["failed_hosts"] == ["hosts"]
+                response = client.put(f"/api/jobs/{job_id}/retry")
+                assert response.status_code == 200
+                retry_id = response.json()["job_id"]
+                status = wait_for_job(client, retry_id)
+        assert status["retry_of"] == job_id
+        assert client.get(f"/api/jobs/{job_id}").json()["retried_by"] == retry_id
+        assert commands[1][-2:] == ["--limit", "hosts"]
+        response = client.put(f"/api/jobs/{job_id}/retry", json={"retries": -1})
+        assert response.status_code == 400
+        assert client.put("/api/jobs/missing/retry").status_code == 404
+
+
+def test_retry_job_without_failed_hosts():
+    """Test the /api/jobs/{job_id}/retry endpoint with a job that succeeded."""
+    with TestClient(build_app()) as client:
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async", return_value="done"
+            ):
+                response = client.put("/api/target/install", json=install_data(client))
+                job_id = response.json()["job_id"]
+                wait_for_job(client, job_id)
+        response = client.put(f"/api/jobs/{job_id}/retry")
+        assert response.status_code == 409
+        assert response.json() == {"detail": "Job has no failed hosts to retry."}
@@ -1,4 +1,7 @@
+from unittest.mock import patch
+
 from fastapi.testclient import TestClient
+from toolbox.core.rsakey import RSAKey
 from toolbox.main import build_app
 
 client = TestClient(build_app())
@@ -36,6 +39,29 @@ def test_RSA_public_key():
     assert "-----END PUBLIC KEY-----" in response.json()["public_key"]
 
 
+def test_RSA_public_key_cached(tmp_path):
+    """Test the public key is revalidated with its ETag until it is rotated."""
+    with patch.object(RSAKey, "key_dir", tmp_path):
+        RSAKey().reload()
+        response = client.get("/api/public_key")
+        etag = response.headers["etag"]
+        assert response.headers["cache-control"] == "public, max-age=86400"
+        response = client.get("/api/public_key", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        response = client.get("/api/public_key", headers={"If-None-Match": f"W/{etag}"})
+        assert response.status_code == 304
+        response = client.get("/api/public_key", headers={"If-None-Match": '"old", *'})
+        assert response.status_code == 304
+        RSAKey().rotate()
+        response = client.get("/api/public_key", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert "-----BEGIN PUBLIC KEY-----" in response.json()["public_key"]
+    RSAKey().reload()
+
+
 def test_terminal_url():
     """Test the /api/terminal/url endpoint."""
     response = client.get("/api/terminal/url")
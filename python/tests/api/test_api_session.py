@@ -0,0 +1,124 @@
+import base64
+from pathlib import Path
+from typing import Any, Dict, Tuple
+from unittest.mock import patch
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from fastapi.testclient import TestClient
+import pytest
+from toolbox.core.jobs import JobManager
+from toolbox.core.rsakey import seal
+from toolbox.core.sessions import SessionCache
+from toolbox.main import build_app
+
+client = TestClient(build_app())
+
+
+@pytest.fixture(autouse=True)
+def sessions(tmp_path: Path):
+    """Start every test without sessions, writing the logs of the jobs to a temporary folder."""
+    SessionCache().clear()
+    with patch.object(JobManager, "log_dir", tmp_path / "jobs"):
+        yield SessionCache()
+    SessionCache().clear()
+
+
+def open_session() -> Tuple[str, bytes]:
+    """Open a session the way the frontend does, and return its id and key."""
+    public_key = client.get("/api/public_key").json()["public_key"]
+    key = AESGCM.generate_key(bit_length=256)
+    encrypted_key = serialization.load_pem_public_key(public_key.encode()).encrypt(
+        key,
+        padding=padding.OAEP(
+            mgf=padding.MGF1(algorithm=hashes.SHA256()),
+            algorithm=hashes.SHA256(),
+            label=None,
+        ),
+    )
+    response = client.put(
+        "/api/session", json={"key": base64.b64encode(encrypted_key).decode()}
+    )
+    assert response.status_code == 200
+    assert response.json()["expires_in"] == SessionCache().ttl
+    return response.json()["session"], key
+
+
+def sealed(session_id: str, key: bytes, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the data of a request of the session."""
+    return {"envelope": {"session": session_id, **seal(key, fields)}}
+
+
+def test_open_session_with_malformed_key():
+    """Test the /api/session endpoint with a key not encrypted with the public key."""
+    response = client.put("/api/session", json={"key": "a2V5"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Malformed key."}
+    response = client.put("/api/session", json={})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Missing key."}
+
+
+def test_ping_in_session():
+    """Test the /api/target/ping endpoint with the fields sealed with the session key."""
+    session_id, key = open_session()
+    fields = {"hosts": "host1", "user": "user", "password": "password"}
+    with patch(
+        "toolbox.core.ansible.Ansible.verify_auth_report",
+        return_value={"host1": "success"},
+    ):
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async",
+            return_value="Ran ansible successfully.",
+        ):
+            with patch("toolbox.core.rsakey.RSAKey.decrypt") as decrypt:
+                response = client.put(
+                    "/api/target/ping",
+                    json={**sealed(session_id, key, fields), "background": True},
+                )
+    assert response.status_code == 200
+    assert list(response.json()) == ["job_id"]
+    decrypt.assert_not_called()
+
+
+def test_editor_in_session(tmp_path: Path):
+    """Test the /api/editor/file/write endpoint with the data sealed with the session key."""
+    session_id, key = open_session()
+    path = tmp_path / "ansible" / "test.txt"
+    path.parent.mkdir()
+    path.write_text("test")
+    fields = {"path": path.as_posix(), "content": "sealed"}
+    response = client.post(
+        "/api/editor/file/write", json=sealed(session_id, key, fields)
+    )
+    assert response.status_code == 200
+    assert path.read_text() == "sealed"
+
+
+def test_closed_session():
+    """Test the requests of a closed session are rejected."""
+    session_id, key = open_session()
+    response = client.delete(f"/api/session/{session_id}")
+    assert response.status_code == 200
+    assert response.json() == {"closed": "true"}
+    response = client.put(
+        "/api/target/ping",
+        json=sealed(session_id, key, {"hosts": "host1"}),
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Unknown or expired session."}
+    response = client.delete(f"/api/session/{session_id}")
+    assert response.status_code == 404
+
+
+def test_session_with_other_key():
+    """Test the requests sealed with another key than the key of the session."""
+    session_id, _ = open_session()
+    other_key = AESGCM.generate_key(bit_length=256)
+    response = client.put(
+        "/api/target/ping",
+        json=sealed(session_id, other_key, {"hosts": "host1"}),
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Malformed envelope."}
@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from toolbox.core.rsakey import encrypt
+from toolbox.main import build_app
+
+client = TestClient(build_app())
+
+
+def encrypted_data(hosts: str) -> dict:
+    """Return the encrypted hosts, user and password."""
+    encryption_key: str = client.get("/api/public_key").json()["public_key"]
+    return {
+        "hosts": encrypt(hosts, encryption_key.encode()),
+        "user": encrypt("user", encryption_key.encode()),
+        "password": encrypt("password", encryption_key.encode()),
+    }
+
+
+def test_target_facts_warm_with_no_data():
+    """Test the /api/target/facts/warm endpoint with no data."""
+    response = client.put("/api/target/facts/warm")
+    assert response.status_code == 400
+    assert response.json() == {"detail": "No data provided or malformed data."}
+
+
+def test_target_facts_warm_with_missing_password():
+    """Test the /api/target/facts/warm endpoint with a missing password."""
+    response = client.put(
+        "/api/target/facts/warm", json={"hosts": "hosts", "user": "user"}
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Missing hosts, user or password."}
+
+
+def test_target_facts_warm_with_cached_facts():
+    """Test the /api/target/facts/warm endpoint when all facts are cached."""
+    with patch("toolbox.core.facts.FactCache.is_fresh", return_value=True):
+        with patch("toolbox.core.ansible.Ansible.verify_auth") as verify_auth:
+            response = client.put(
+                "/api/target/facts/warm", json=encrypted_data("host1, host2")
+            )
+    assert response.status_code == 200
+    assert response.json() == "Facts of all hosts are already cached."
+    verify_auth.assert_not_called()
+
+
+def test_target_facts_warm_with_stale_facts():
+    """Test the /api/target/facts/warm endpoint gathers only the stale hosts."""
+    with patch(
+        "toolbox.core.facts.FactCache.is_fresh",
+        side_effect=lambda host: host == "host1",
+    ):
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async",
+                return_value="Ran Ansible successfully",
+            ) as run_command_async:
+                response = client.put(
+                    "/api/target/facts/warm", json=encrypted_data("host1, host2")
+                )
+    assert response.status_code == 200
+    assert response.json() == "Ran Ansible successfully"
+    command = run_command_async.call_args.args[0]
+    assert command[:4] == ["ansible", "all", "-i", "host2,"]
+    assert "setup" in command
+
+
+def test_target_facts_warm_with_force():
+    """Test the /api/target/facts/warm endpoint gathers cached hosts when forced."""
+    data = encrypted_data("host1")
+    data["force"] = True
+    with patch("toolbox.core.facts.FactCache.is_fresh", return_value=True):
+        with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+            with patch(
+                "toolbox.core.ansible.Ansible.run_command_async",
+                return_value="Ran Ansible successfully",
+            ) as run_command_async:
+                response = client.put("/api/target/facts/warm", json=data)
+    assert response.status_code == 200
+    assert run_command_async.call_args.args[0][3] == "host1,"
@@ -1,12 +1,26 @@
+from pathlib import Path
 from unittest.mock import patch
 
 from fastapi.testclient import TestClient
+import pytest
+from toolbox.api.target import ALREADY_INSTALLED
+from toolbox.core.installed import InstalledState
+from toolbox.core.jobs import JobManager
+from toolbox.core.playbooks import PlaybookCache
 from toolbox.core.rsakey import encrypt
 from toolbox.main import build_app
 
 client = TestClient(build_app())
 
 
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path: Path):
+    with patch.object(PlaybookCache, "cache_dir", tmp_path):
+        with patch.object(InstalledState, "state_dir", tmp_path / "installed"):
+            with patch.object(JobManager, "log_dir", tmp_path / "jobs"):
+                yield tmp_path
+
+
 def test_install_target_with_no_data():
     """Test the /api/target/install endpoint with no data."""
     response = client.put("/api/target/install")
@@ -123,7 +137,7 @@ def test_install_target_with_correct_encrypted_data():
     }
     with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
         with patch(
-            "toolbox.core.ansible.Ansible.run_command",
+            "toolbox.core.ansible.Ansible.run_command_async",
             return_value="Installation successful",
         ):
             response = client.put("/api/target/install", json=data)
@@ -247,9 +261,129 @@ def test_uninstall_target_with_correct_encrypted_data():
     }
     with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
         with patch(
-            "toolbox.core.ansible.Ansible.run_command",
+            "toolbox.core.ansible.Ansible.run_command_async",
             return_value="Uninstallation successful",
         ):
             response = client.put("/api/target/uninstall", json=data)
             assert response.status_code == 200
             assert response.json() == "Uninstallation successful"
+
+
+def test_install_target_with_invalid_rolling():
+    """Test the /api/target/install endpoint with invalid rolling settings."""
+    encryption_key: str = client.get("/api/public_key").json()["public_key"]
+    data = {
+        "hosts": encrypt("host1,host2", encryption_key.encode()),
+        "user": encrypt("user", encryption_key.encode()),
+        "password": encrypt("password", encryption_key.encode()),
+        "tags": ["tag1", "tag2"],
+        "rolling": {"batch_size": "0%"},
+    }
+    with patch("toolbox.core.ansible.Ansible.verify_auth") as verify_auth:
+        response = client.put("/api/target/install", json=data)
+    assert response.status_code == 400
+    assert "batch_size" in response.json()["detail"]
+    verify_auth.assert_not_called()
+    data["rolling"] = "10%"
+    response = client.put("/api/target/install", json=data)
+    assert response.status_code == 400
+
+
+def test_uninstall_target_rolling():
+    """Test the /api/target/uninstall endpoint runs the hosts in batches."""
+    encryption_key: str = client.get("/api/public_key").json()["public_key"]
+    data = {
+        "hosts": encrypt("host1,host2,host3", encryption_key.encode()),
+        "user": encrypt("user", encryption_key.encode()),
+        "password": encrypt("password", encryption_key.encode()),
+        "tags": ["tag1", "tag2"],
+        "rolling": {"batch_size": 2, "max_failures": "10%", "pause": 0},
+    }
+    with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async",
+            return_value="Uninstallation successful",
+        ) as run_command_async:
+            response = client.put("/api/target/uninstall", json=data)
+    assert response.status_code == 200
+    assert response.json() == "Batch 1/2: host1, host2\nBatch 2/2: host3\n"
+    commands = [call.args[0] for call in run_command_async.call_args_list]
+    assert [command[3] for command in commands] == ["host1,host2,", "host3,"]
+    assert all(Path(command[1]).name.startswith("uninstall-") for command in commands)
+
+
+def test_install_target_runs_minimal_playbook(cache_dir: Path):
+    """Test the /api/target/install endpoint runs only the roles of the tags."""
+    encryption_key: str = client.get("/api/public_key").json()["public_key"]
+    data = {
+        "hosts": encrypt("host1", encryption_key.encode()),
+        "user": encrypt("user", encryption_key.encode()),
+        "password": encrypt("password", encryption_key.encode()),
+        "tags": ["firefox"],
+    }
+    with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async",
+            return_value="Installation successful",
+        ) as run_command_async:
+            response = client.put("/api/target/install", json=data)
+    assert response.status_code == 200
+    playbook = Path(run_command_async.call_args.args[0][1])
+    assert playbook.parent == cache_dir
+    assert "browsers/install" in playbook.read_text()
+    assert "editors/install" not in playbook.read_text()
+
+
+def test_install_target_skips_installed_software():
+    """Test the /api/target/install endpoint skips the tags installed already."""
+    encryption_key: str = client.get("/api/public_key").json()["public_key"]
+    data = {
+        "hosts": encrypt("host1,host2", encryption_key.encode()),
+        "user": encrypt("user", encryption_key.encode()),
+        "password": encrypt("password", encryption_key.encode()),
+        "tags": ["firefox", "vim"],
+    }
+    with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async",
+            return_value="Installation successful",
+        ) as run_command_async:
+            response = client.put("/api/target/install", json=data)
+            assert response.status_code == 200
+            InstalledState().forget("host2", ["vim"])
+            response = client.put("/api/target/install", json=data)
+            assert response.status_code == 200
+            command = run_command_async.call_args.args[0]
+            assert command[command.index("-i") + 1] == "host2,"
+            assert command[command.index("--tags") + 1] == "vim"
+            response = client.put("/api/target/install", json=data)
+            assert response.json() == ALREADY_INSTALLED
+            data["background"] = True
+            response = client.put("/api/target/install", json=data)
+            assert response.json() == {"result": ALREADY_INSTALLED}
+            data["force"] = True
+            response = client.put("/api/target/install", json=data)
+            assert "job_id" in response.json()
+            command = run_command_async.call_args.args[0]
+            assert command[command.index("-i") + 1] == "host1,host2,"
+    assert run_command_async.call_count == 3
+
+
+def test_uninstall_target_forgets_installed_software():
+    """Test the /api/target/uninstall endpoint forgets the uninstalled tags."""
+    InstalledState().record("host1", {"firefox": "fingerprint", "vim": "fingerprint"})
+    encryption_key: str = client.get("/api/public_key").json()["public_key"]
+    data = {
+        "hosts": encrypt("host1", encryption_key.encode()),
+        "user": encrypt("user", encryption_key.encode()),
+        "password": encrypt("password", encryption_key.encode()),
+        "tags": ["firefox"],
+    }
+    with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async",
+            return_value="Uninstallation successful",
+        ):
+            response = client.put("/api/target/uninstall", json=data)
+    assert response.status_code == 200
+    assert list(InstalledState().get_installed("host1")) == ["vim"]
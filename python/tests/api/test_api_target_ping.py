@@ -1,3 +1,5 @@
+import json
+from typing import Dict, List
 from unittest.mock import patch
 
 from fastapi.testclient import TestClient
@@ -130,20 +132,125 @@ def test_target_ping_with_encrypted_empty_data():
     assert response.json() == {"detail": "Missing hosts, user or password."}
 
 
+def fake_ping(statuses: Dict[str, str], commands: List[List[str]]):
+    """Return a run_command_async recording ping results of the given statuses."""
+
+    async def run_command_async(self, command, on_output=None, events_path=None):
+        commands.append(command)
+        with open(events_path, "a") as f:
+            for host, status in statuses.items():
+                message = "" if status == "ok" else "Connection refused."
+                event = {"event": "task_result", "host": host, "status": status}
+                f.write(json.dumps({**event, "message": message}) + "\n")
+        if "unreachable" in statuses.values():
+            raise ValueError("Failed to run ansible. ")
+        return "Ran ansible successfully."
+
+    return run_command_async
+
+
+def encrypt_login(hosts: str) -> Dict[str, str]:
+    """Encrypt the hosts and the login for the ping endpoint."""
+    encryption_key: str = client.get("/api/public_key").json()["public_key"]
+    return {
+        "hosts": encrypt(hosts, encryption_key.encode()),
+        "user": encrypt("user", encryption_key.encode()),
+        "password": encrypt("password", encryption_key.encode()),
+    }
+
+
 def test_target_ping_with_correct_data():
     """Test the /api/target/ping endpoint with correct data."""
-    encryption_key: str = client.get("/api/public_key").json()["public_key"]
-    hosts = encrypt("user_machine", encryption_key.encode())
-    user = encrypt("user", encryption_key.encode())
-    password = encrypt("password", encryption_key.encode())
-    with patch("toolbox.core.ansible.Ansible.verify_auth", return_value=None):
+    commands: List[List[str]] = []
+    with patch(
+        "toolbox.core.ansible.Ansible.verify_auth_report",
+        return_value={"user_machine": "success"},
+    ):
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async",
+            fake_ping({"user_machine": "ok"}, commands),
+        ):
+            response = client.put(
+                "/api/target/ping", json=encrypt_login("user_machine")
+            )
+    assert response.status_code == 200
+    assert response.json() == {"user_machine": {"reachable": True, "message": "pong"}}
+    assert commands[0][:2] == ["ansible", "all"]
+    assert commands[0][-4:] == ["-f", "100", "-T", "10"]
+
+
+def test_target_ping_reports_every_host():
+    """Test the /api/target/ping endpoint reports the hosts that did not answer."""
+    commands: List[List[str]] = []
+    report = {"host1": "success", "host2": "success", "host3": "Permission denied."}
+    with patch(
+        "toolbox.core.ansible.Ansible.verify_auth_report",
+        autospec=True,
+        return_value=report,
+    ) as verify_auth_report:
         with patch(
-            "toolbox.core.ansible.Ansible.run_command",
-            return_value="Ran Ansible successfully",
+            "toolbox.core.ansible.Ansible.run_command_async",
+            fake_ping({"host1": "ok", "host2": "unreachable"}, commands),
         ):
             response = client.put(
                 "/api/target/ping",
-                json={"hosts": hosts, "user": user, "password": password},
+                json={**encrypt_login("host1,host2,host3"), "forks": 5, "timeout": 3},
             )
-        assert response.status_code == 200
-        assert response.json() == "Ran Ansible successfully"
+    ansible = verify_auth_report.call_args.args[0]
+    assert ansible.verify_concurrency == 5
+    assert ansible.connect_timeout == 3
+    assert response.status_code == 200
+    assert response.json() == {
+        "host1": {"reachable": True, "message": "pong"},
+        "host2": {"reachable": False, "message": "Connection refused."},
+        "host3": {"reachable": False, "message": "Permission denied."},
+    }
+    assert commands[0][commands[0].index("-i") + 1] == "host1,host2,"
+    assert commands[0][-4:] == ["-f", "5", "-T", "3"]
+
+
+def test_target_ping_in_background():
+    """Test the /api/target/ping endpoint returns the job in the background."""
+    with patch(
+        "toolbox.core.ansible.Ansible.verify_auth_report",
+        return_value={"host1": "success"},
+    ):
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async",
+            fake_ping({"host1": "ok"}, []),
+        ):
+            response = client.put(
+                "/api/target/ping",
+                json={**encrypt_login("host1"), "background": True},
+            )
+    assert response.status_code == 200
+    assert list(response.json()) == ["job_id"]
+
+
+def test_target_ping_with_invalid_forks():
+    """Test the /api/target/ping endpoint with invalid forks and timeout."""
+    for options in ({"forks": 0}, {"timeout": "10"}, {"forks": True}):
+        response = client.put(
+            "/api/target/ping", json={**encrypt_login("host1"), **options}
+        )
+        assert response.status_code == 400
+        assert response.json() == {
+            "detail": "Forks and timeout must be positive integers."
+        }
+
+
+def test_target_ping_inventory_group():
+    """Test the /api/target/ping endpoint with a group of the inventory file."""
+    commands: List[List[str]] = []
+    with patch(
+        "toolbox.core.ansible.Ansible.run_command_async",
+        fake_ping({"cloud-01": "ok", "local-01": "unreachable"}, commands),
+    ):
+        response = client.put("/api/target/ping", json=encrypt_login("VMs"))
+    assert response.status_code == 200
+    assert response.json() == {
+        "cloud-01": {"reachable": True, "message": "pong"},
+        "local-01": {"reachable": False, "message": "Connection refused."},
+    }
+    assert commands[0][commands[0].index("-i") + 1].endswith("inventory/hosts")
+    assert commands[0][commands[0].index("--limit") + 1] == "VMs"
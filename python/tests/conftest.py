@@ -0,0 +1,49 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from toolbox.core.installed import InstalledState
+from toolbox.core.inventory import InventoryCache
+from toolbox.core.jobs import JobManager
+from toolbox.core.playbooks import PlaybookCache
+from toolbox.core.rsakey import RSAKey
+from toolbox.core.ssh import SSHMultiplexer
+
+
+@pytest.fixture(scope="session", autouse=True)
+def key_dir(tmp_path_factory: pytest.TempPathFactory):
+    """Keep the server key of the tests in a temporary folder instead of the home
+    folder, shared by all the tests so that it is only generated once."""
+    key_dir = tmp_path_factory.mktemp("keys")
+    with patch.object(RSAKey, "key_dir", key_dir):
+        RSAKey().reload()
+        yield key_dir
+    RSAKey().reload()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def control_dir(tmp_path_factory: pytest.TempPathFactory):
+    """Keep the ssh config and control sockets of the tests in a temporary folder
+    instead of the home folder, shared by all the tests to keep the socket paths
+    short enough for ssh."""
+    control_dir = tmp_path_factory.mktemp("ssh")
+    with patch.object(SSHMultiplexer, "control_dir", control_dir):
+        yield control_dir
+
+
+@pytest.fixture(autouse=True)
+def log_dir(tmp_path: Path):
+    """Write the logs, the history and the installed state of the jobs to a
+    temporary folder instead of the home folder."""
+    with patch.object(JobManager, "log_dir", tmp_path / "jobs"):
+        with patch.object(InstalledState, "state_dir", tmp_path / "installed"):
+            yield tmp_path / "jobs"
+
+
+@pytest.fixture(autouse=True)
+def cache_dirs(tmp_path: Path):
+    """Write the minimal playbooks and the inventory files to a temporary folder
+    instead of the home folder."""
+    with patch.object(PlaybookCache, "cache_dir", tmp_path / "playbooks"):
+        with patch.object(InventoryCache, "cache_dir", tmp_path / "inventories"):
+            yield tmp_path
@@ -1,8 +1,8 @@
+import asyncio
 from pathlib import Path
-from unittest.mock import Mock
 
 import pytest
-from toolbox.core.ansible import Ansible
+from toolbox.core.ansible import Ansible, read_lines
 
 
 @pytest.fixture
@@ -24,26 +24,109 @@ def ansible_instance(mocker):
     )
 
 
-def test_run_command(ansible_instance: Ansible, mocker):
-    # Mock subprocess.run to return a successful result
-    mocker.patch(
-        "subprocess.run",
-        return_value=Mock(returncode=0, stdout=b"success\n", stderr=b""),
-    )
+def test_run_command_async(ansible_instance: Ansible, tmp_path: Path):
+    ansible_instance.run_folder = tmp_path
+
+    result = asyncio.run(ansible_instance.run_command_async(["echo", "success"]))
+
+    assert result == "success\n"
 
-    command_to_run = ansible_instance.get_command()
 
-    assert ansible_instance.run_command(command_to_run) == "success\n"
+def test_run_command_async_failure(ansible_instance: Ansible, tmp_path: Path):
+    ansible_instance.run_folder = tmp_path
+
+    with pytest.raises(ValueError, match="Failed to run ansible. failure\n"):
+        asyncio.run(
+            ansible_instance.run_command_async(["sh", "-c", "echo failure; exit 1"])
+        )
+
 
+def test_run_command_async_streams_output(ansible_instance: Ansible, tmp_path: Path):
+    ansible_instance.run_folder = tmp_path
+    lines = []
 
-def test_run_command_failure(ansible_instance: Ansible, mocker):
-    # Mock subprocess.run to return a non-zero return code for localhost
-    mocker.patch(
-        "subprocess.run",
-        return_value=Mock(returncode=1, stdout=b"failure\n", stderr=b""),
+    result = asyncio.run(
+        ansible_instance.run_command_async(
+            ["sh", "-c", "echo one; echo two >&2; echo three"], on_output=lines.append
+        )
     )
 
-    command_to_run = ansible_instance.get_command()
+    assert result == "Ran ansible successfully."
+    assert lines == ["one\n", "two\n", "three\n"]
 
-    with pytest.raises(ValueError, match="Failed to run ansible. failure\n"):
-        ansible_instance.run_command(command_to_run)
+
+def test_run_command_async_streams_failure(ansible_instance: Ansible, tmp_path: Path):
+    ansible_instance.run_folder = tmp_path
+    lines = []
+
+    with pytest.raises(ValueError, match="Failed to run ansible."):
+        asyncio.run(
+            ansible_instance.run_command_async(
+                ["sh", "-c", "echo failure; exit 1"], on_output=lines.append
+            )
+        )
+    assert lines == ["failure\n"]
+
+
+def test_read_lines_splits_long_lines():
+    async def read():
+        stream = asyncio.StreamReader()
+        stream.feed_data(b"short\n" + b"x" * 10 + b"\nend")
+        stream.feed_eof()
+        return [line async for line in read_lines(stream, max_line_length=4)]
+
+    assert asyncio.run(read()) == ["shor\n", "t\n", "xxxx\n", "xxxx\n", "xx\n", "end"]
+
+
+def is_running(pid: int) -> bool:
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except FileNotFoundError:
+        return False
+    return stat.rsplit(")", 1)[1].split()[0] != "Z"
+
+
+def test_run_command_async_cancel_kills_process_group(
+    ansible_instance: Ansible, tmp_path: Path
+):
+    ansible_instance.run_folder = tmp_path
+    lines = []
+
+    async def run():
+        task = asyncio.create_task(
+            ansible_instance.run_command_async(
+                ["sh", "-c", "sleep 30 & echo $!; wait"], on_output=lines.append
+            )
+        )
+        while lines == []:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+    assert not is_running(int(lines[0]))
+
+
+def test_run_command_async_cancel_without_streaming(
+    ansible_instance: Ansible, tmp_path: Path
+):
+    ansible_instance.run_folder = tmp_path
+    pid_file = tmp_path / "pid"
+
+    async def run():
+        task = asyncio.create_task(
+            ansible_instance.run_command_async(
+                ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"]
+            )
+        )
+        while not pid_file.is_file() or pid_file.read_text() == "":
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+    assert not is_running(int(pid_file.read_text()))
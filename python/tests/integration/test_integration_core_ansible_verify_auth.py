@@ -1,4 +1,6 @@
 from pathlib import Path
+import subprocess
+import time
 from unittest.mock import Mock
 
 import pytest
@@ -64,3 +66,67 @@ def test_verify_auth_local_host_failure(ansible_instance: Ansible, mocker):
     ):
         ansible_instance.inventory = "localhost"
         ansible_instance.verify_auth()
+
+
+def test_verify_auth_report(ansible_instance: Ansible, mocker):
+    def run(command, **kwargs):
+        if command[-3] == "test_user@remote_host2":
+            raise subprocess.CalledProcessError(
+                255, command, stderr=b"Permission denied, please try again.\n"
+            )
+        return Mock(returncode=0, stdout=b"success\n", stderr=b"")
+
+    mocker.patch("subprocess.run", side_effect=run)
+
+    assert ansible_instance.verify_auth_report() == {
+        "remote_host1": "success",
+        "remote_host2": "Permission denied, please try again.",
+    }
+
+
+def test_verify_auth_reports_all_failed_hosts(ansible_instance: Ansible, mocker):
+    mocker.patch(
+        "subprocess.run",
+        side_effect=subprocess.TimeoutExpired(cmd="ssh", timeout=30),
+    )
+
+    with pytest.raises(
+        ValueError,
+        match="Failed to verify ansible credentials for hosts: remote_host1, remote_host2",
+    ):
+        ansible_instance.verify_auth()
+    assert ansible_instance.verify_auth_report() == {
+        "remote_host1": "Timed out.",
+        "remote_host2": "Timed out.",
+    }
+
+
+def test_verify_auth_uses_connect_timeout(ansible_instance: Ansible, mocker):
+    run = mocker.patch(
+        "subprocess.run",
+        return_value=Mock(returncode=0, stdout=b"success\n", stderr=b""),
+    )
+    ansible_instance.connect_timeout = 5
+
+    ansible_instance.verify_auth()
+
+    command = run.call_args.args[0]
+    assert "ConnectTimeout=5" in command
+    assert run.call_args.kwargs["timeout"] == 15
+
+
+def test_verify_auth_runs_in_parallel(ansible_instance: Ansible, mocker):
+    def run(command, **kwargs):
+        time.sleep(0.2)
+        return Mock(returncode=0, stdout=b"success\n", stderr=b"")
+
+    mocker.patch("subprocess.run", side_effect=run)
+    ansible_instance.inventory = ",".join(f"host{i}" for i in range(10))
+    ansible_instance.verify_concurrency = 10
+
+    start = time.monotonic()
+    report = ansible_instance.verify_auth_report()
+
+    assert time.monotonic() - start < 1
+    assert len(report) == 10
+    assert set(report.values()) == {"success"}
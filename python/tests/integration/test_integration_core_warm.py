@@ -0,0 +1,83 @@
+import asyncio
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+import toolbox
+from toolbox.core.ansible import Ansible, terminate_process_group
+from toolbox.core.warm import WarmExecutor
+
+COMMANDS = {"warm-print": "pprint:pprint", "warm-exit": "sys:exit"}
+
+
+@pytest.fixture(autouse=True)
+def warm_executor(monkeypatch):
+    monkeypatch.setenv("PYTHONPATH", str(Path(toolbox.__file__).parent.parent))
+    with patch.object(WarmExecutor, "commands", COMMANDS):
+        WarmExecutor().configure(enabled=True)
+        yield WarmExecutor()
+        WarmExecutor().configure(enabled=False)
+
+
+def run(command, cwd: Path, env=None):
+    async def start():
+        process = await WarmExecutor().start(command, cwd, env or dict(os.environ))
+        stdout, _ = await process.communicate()
+        return process.returncode, stdout.decode("utf-8")
+
+    return asyncio.run(start())
+
+
+def test_run_preloaded_command(tmp_path: Path):
+    assert run(["warm-print", "a"], tmp_path) == (0, "['warm-print', 'a']\n")
+
+
+def test_run_failing_preloaded_command(tmp_path: Path):
+    assert run(["warm-exit", "a"], tmp_path) == (1, "['warm-exit', 'a']\n")
+
+
+def test_run_other_command(tmp_path: Path, warm_executor: WarmExecutor):
+    env = dict(os.environ, TOOLBOX_EVENTS_FILE="events.jsonl")
+
+    assert run(["sh", "-c", "echo $TOOLBOX_EVENTS_FILE; pwd"], tmp_path, env) == (
+        0,
+        f"events.jsonl\n{tmp_path}\n",
+    )
+    assert run(["sh", "-c", "exit 3"], tmp_path) == (3, "")
+    assert len(warm_executor._workers) == 1
+
+
+def test_terminate_warm_command(tmp_path: Path):
+    async def start():
+        process = await WarmExecutor().start(
+            ["sleep", "30"], tmp_path, dict(os.environ)
+        )
+        await asyncio.wait_for(terminate_process_group(process), timeout=10)
+        return process.returncode
+
+    assert asyncio.run(start()) == -15
+
+
+def test_ansible_runs_in_warm_worker(tmp_path: Path):
+    ansible = Ansible(
+        inventory="host1", user="user", password="password", run_folder=tmp_path
+    )
+    lines = []
+
+    output = asyncio.run(
+        ansible.run_command_async(["warm-print", "x"], on_output=lines.append)
+    )
+
+    assert output == "Ran ansible successfully."
+    assert lines == ["['warm-print', 'x']\n"]
+    with pytest.raises(ValueError, match="Failed to run ansible."):
+        asyncio.run(ansible.run_command_async(["warm-exit", "x"]))
+
+
+def test_disabled_warm_executor(warm_executor: WarmExecutor):
+    assert warm_executor.can_run(["warm-print"]) is True
+    assert warm_executor.can_run(["echo"]) is False
+    warm_executor.configure(enabled=False)
+    assert warm_executor.can_run(["warm-print"]) is False
+    assert warm_executor._workers == {}
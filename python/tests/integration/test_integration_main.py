@@ -48,6 +48,16 @@ def test_arg_parser():
         assert args.port == 8000
         assert args.terminal_host == "localhost"
         assert args.terminal_port == 8765
+        assert args.max_jobs == 4
+        assert args.ssh_persist == 600
+        assert args.forks == 20
+        assert args.no_pipelining is False
+        assert args.fact_cache_timeout == 86400
+        assert args.stdout_callback == "default"
+        assert args.callbacks == ""
+        assert args.warm_ansible is False
+        assert args.ansible_runner is False
+        assert args.key_rotation == 0
 
 
 def test_arg_parser_with_all_parameters():
@@ -79,6 +89,16 @@ def test_arg_parser_with_all_parameters():
 @patch("webview.create_window")
 def test_run_webapp(mock_create_window, mock_Process):
     args = MagicMock()
+    args.max_jobs = 4
+    args.ssh_persist = 600
+    args.forks = 20
+    args.no_pipelining = False
+    args.fact_cache_timeout = 86400
+    args.stdout_callback = "default"
+    args.callbacks = ""
+    args.warm_ansible = False
+    args.ansible_runner = False
+    args.key_rotation = 0
     mock_server_process = MagicMock()
     mock_terminal_process = MagicMock()
     mock_Process.side_effect = [mock_server_process, mock_terminal_process]
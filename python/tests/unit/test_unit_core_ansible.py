@@ -2,13 +2,41 @@ from pathlib import Path
 
 from pydantic import ValidationError
 import pytest
-from toolbox.core.ansible import Ansible
+from toolbox.core.ansible import Ansible, check_auth_report
 
 
-def test_ansible_singleton():
-    ansible1 = Ansible(user="user", password="password", inventory="inventory")
-    ansible2 = Ansible(user="user", password="password", inventory="inventory")
-    assert ansible1 is ansible2
+def test_ansible_instances_are_independent():
+    ansible1 = Ansible(user="user", password="password", inventory="host1")
+    ansible2 = Ansible(user="user2", password="password2", inventory="host2")
+    assert ansible1 is not ansible2
+    assert ansible1.inventory == "host1"
+    assert ansible1.user == "user"
+    assert ansible2.inventory == "host2"
+    assert ansible2.user == "user2"
+
+
+def test_ansible_get_command_keeps_inventory():
+    ansible = Ansible(user="user", password="password", inventory="host1,host2")
+    ansible.get_command()
+    ansible.get_ping_command()
+    assert ansible.inventory == "host1,host2"
+    assert ansible.get_inventory() == "host1,host2,"
+
+
+def test_ansible_get_ping_command_forks_and_timeout():
+    ansible = Ansible(user="user", password="password", inventory="host1,host2")
+    command = ansible.get_ping_command(forks=50, timeout=5)
+    assert command[:2] == ["ansible", "all"]
+    assert command[-4:] == ["-f", "50", "-T", "5"]
+    assert "-f" not in ansible.get_ping_command()
+
+
+def test_check_auth_report():
+    check_auth_report({"host1": "success"})
+    with pytest.raises(ValueError, match="for host: host2$"):
+        check_auth_report({"host1": "success", "host2": "Timed out."})
+    with pytest.raises(ValueError, match="for hosts: host1, host2$"):
+        check_auth_report({"host1": "Timed out.", "host2": "Timed out."})
 
 
 def test_ansible_required_fields():
@@ -151,3 +179,20 @@ def test_ansible_extra_args():
         extra_args="--extra-arg",
     )
     assert ansible.extra_args == "--extra-arg"
+
+
+def test_ansible_with_invalid_verify_concurrency():
+    with pytest.raises(ValidationError):
+        Ansible(
+            user="user",
+            password="password",
+            inventory="inventory",
+            verify_concurrency=0,
+        )
+
+
+def test_ansible_with_invalid_connect_timeout():
+    with pytest.raises(ValidationError):
+        Ansible(
+            user="user", password="password", inventory="inventory", connect_timeout=0
+        )
@@ -0,0 +1,89 @@
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from pydantic import ValidationError
+import pytest
+from toolbox.core.ansible import Ansible
+from toolbox.core.ansible_profile import AnsibleProfile
+from toolbox.main import get_ansible_profile
+
+
+def test_default_profile_env():
+    env = AnsibleProfile().get_env()
+    assert env["ANSIBLE_FORKS"] == "20"
+    assert env["ANSIBLE_PIPELINING"] == "True"
+    assert env["ANSIBLE_GATHERING"] == "smart"
+    assert env["ANSIBLE_CACHE_PLUGIN"] == "jsonfile"
+    assert env["ANSIBLE_CACHE_PLUGIN_CONNECTION"] == str(
+        Path.home() / ".toolbox" / "facts"
+    )
+    assert env["ANSIBLE_CACHE_PLUGIN_TIMEOUT"] == "86400"
+    assert env["ANSIBLE_STDOUT_CALLBACK"] == "default"
+    assert "ANSIBLE_CALLBACKS_ENABLED" not in env
+
+
+def test_custom_profile_env():
+    env = AnsibleProfile(
+        forks=50,
+        pipelining=False,
+        fact_caching="memory",
+        fact_caching_timeout=60,
+        stdout_callback="yaml",
+        callbacks_enabled=["profile_tasks", "timer"],
+    ).get_env()
+    assert env["ANSIBLE_FORKS"] == "50"
+    assert env["ANSIBLE_PIPELINING"] == "False"
+    assert env["ANSIBLE_CACHE_PLUGIN"] == "memory"
+    assert "ANSIBLE_CACHE_PLUGIN_CONNECTION" not in env
+    assert env["ANSIBLE_CACHE_PLUGIN_TIMEOUT"] == "60"
+    assert env["ANSIBLE_STDOUT_CALLBACK"] == "yaml"
+    assert env["ANSIBLE_CALLBACKS_ENABLED"] == "profile_tasks,timer"
+    assert env["ANSIBLE_LOAD_CALLBACK_PLUGINS"] == "True"
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {"forks": 0},
+        {"gathering": "always"},
+        {"fact_caching": "redis"},
+        {"fact_caching_timeout": -1},
+        {"stdout_callback": ""},
+    ],
+)
+def test_invalid_profile(settings):
+    with pytest.raises(ValidationError):
+        AnsibleProfile(**settings)
+
+
+def test_ansible_uses_current_profile(monkeypatch):
+    monkeypatch.setattr(AnsibleProfile, "current", AnsibleProfile(forks=7))
+    ansible = Ansible(user="user", password="password", inventory="host1")
+    assert ansible.get_env()["ANSIBLE_FORKS"] == "7"
+
+
+def test_ansible_with_own_profile():
+    ansible = Ansible(
+        user="user",
+        password="password",
+        inventory="host1",
+        profile=AnsibleProfile(forks=3),
+    )
+    assert ansible.get_env()["ANSIBLE_FORKS"] == "3"
+
+
+def test_get_ansible_profile_from_args():
+    args = MagicMock()
+    args.forks = 30
+    args.no_pipelining = True
+    args.fact_cache_timeout = 120
+    args.stdout_callback = "yaml"
+    args.callbacks = "profile_tasks, timer,"
+
+    profile = get_ansible_profile(args)
+
+    assert profile.forks == 30
+    assert profile.pipelining is False
+    assert profile.fact_caching_timeout == 120
+    assert profile.stdout_callback == "yaml"
+    assert profile.callbacks_enabled == ["profile_tasks", "timer"]
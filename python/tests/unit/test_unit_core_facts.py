@@ -0,0 +1,76 @@
+import os
+import time
+
+from toolbox.core.ansible_profile import AnsibleProfile
+from toolbox.core.facts import FactCache
+
+
+def test_fact_cache_missing_host(tmp_path):
+    fact_cache = FactCache(profile=AnsibleProfile(fact_caching_connection=tmp_path))
+    assert fact_cache.get_age("host1") is None
+    assert fact_cache.is_fresh("host1") is False
+
+
+def test_fact_cache_fresh_and_stale_hosts(tmp_path):
+    fact_cache = FactCache(
+        profile=AnsibleProfile(
+            fact_caching_connection=tmp_path, fact_caching_timeout=60
+        )
+    )
+    (tmp_path / "host1").write_text("{}")
+    (tmp_path / "host2").write_text("{}")
+    expired = time.time() - 120
+    os.utime(tmp_path / "host2", (expired, expired))
+    assert fact_cache.is_fresh("host1") is True
+    assert fact_cache.is_fresh("host2") is False
+    assert fact_cache.get_stale_hosts(["host1", "host2", "host3"]) == [
+        "host2",
+        "host3",
+    ]
+
+
+def test_fact_cache_without_timeout(tmp_path):
+    fact_cache = FactCache(
+        profile=AnsibleProfile(fact_caching_connection=tmp_path, fact_caching_timeout=0)
+    )
+    (tmp_path / "host1").write_text("{}")
+    expired = time.time() - 10**6
+    os.utime(tmp_path / "host1", (expired, expired))
+    assert fact_cache.is_fresh("host1") is True
+
+
+def test_fact_cache_memory(tmp_path):
+    fact_cache = FactCache(
+        profile=AnsibleProfile(fact_caching="memory", fact_caching_connection=tmp_path)
+    )
+    (tmp_path / "host1").write_text("{}")
+    assert fact_cache.is_fresh("host1") is False
+    assert fact_cache.get_stale_hosts(["host1"]) == ["host1"]
+
+
+def test_fact_cache_clear(tmp_path):
+    fact_cache = FactCache(profile=AnsibleProfile(fact_caching_connection=tmp_path))
+    (tmp_path / "host1").write_text("{}")
+    fact_cache.clear("host1")
+    fact_cache.clear("host2")
+    assert not (tmp_path / "host1").exists()
+
+
+def test_fact_cache_rejects_paths(tmp_path):
+    facts_dir = tmp_path / "facts"
+    facts_dir.mkdir()
+    (tmp_path / "secret").write_text("{}")
+    fact_cache = FactCache(profile=AnsibleProfile(fact_caching_connection=facts_dir))
+    assert fact_cache.get_age("../secret") is None
+    assert fact_cache.get_age("..") is None
+    fact_cache.clear("../secret")
+    assert (tmp_path / "secret").exists()
+
+
+def test_fact_cache_get_facts(tmp_path):
+    fact_cache = FactCache(profile=AnsibleProfile(fact_caching_connection=tmp_path))
+    (tmp_path / "host1").write_text('{"ansible_os_family": "Debian"}')
+    (tmp_path / "host2").write_text("not json")
+    assert fact_cache.get_facts("host1") == {"ansible_os_family": "Debian"}
+    assert fact_cache.get_facts("host2") is None
+    assert fact_cache.get_facts("host3") is None
@@ -0,0 +1,127 @@
+import asyncio
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from toolbox.core.ansible import Ansible
+from toolbox.core.ansible_profile import AnsibleProfile
+from toolbox.core.installed import InstalledState
+from toolbox.core.jobs import JobManager
+import yaml
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path: Path):
+    profile = AnsibleProfile(fact_caching_connection=tmp_path / "facts")
+    with patch.object(InstalledState, "state_dir", tmp_path / "installed"):
+        with patch.object(JobManager, "log_dir", tmp_path / "jobs"):
+            with patch.object(AnsibleProfile, "current", profile):
+                yield tmp_path / "installed"
+
+
+@pytest.fixture
+def ansible(tmp_path: Path) -> Ansible:
+    run_folder = tmp_path / "ansible"
+    roles = {
+        "browsers/install": [{"name": "Install Firefox", "tags": ["firefox"]}],
+        "editors/install": [{"name": "Install Vim", "tags": ["vim"]}],
+    }
+    for role, tasks in roles.items():
+        tasks_folder = run_folder / "roles" / role / "tasks"
+        tasks_folder.mkdir(parents=True)
+        (tasks_folder / "main.yml").write_text(yaml.safe_dump(tasks))
+    play = {"hosts": "all", "roles": list(roles)}
+    (run_folder / "install.yml").write_text(yaml.safe_dump([play]))
+    return Ansible(
+        inventory="host1,host2",
+        user="user",
+        password="password",
+        run_folder=run_folder,
+        tags=["firefox", "vim"],
+    )
+
+
+def test_role_fingerprints_follow_role_files(ansible: Ansible):
+    first = InstalledState().get_role_fingerprints(ansible)
+    vim_file = ansible.run_folder / "roles" / "editors" / "install" / "files" / "vimrc"
+    vim_file.parent.mkdir()
+    vim_file.write_text("set number\n")
+    second = InstalledState().get_role_fingerprints(ansible)
+
+    assert first["firefox"] == second["firefox"]
+    assert first["vim"] != second["vim"]
+
+
+def test_pending_hosts_and_tags(ansible: Ansible):
+    fingerprints = InstalledState().get_role_fingerprints(ansible)
+    InstalledState().record("host1", fingerprints)
+    InstalledState().record("host2", {"firefox": fingerprints["firefox"]})
+
+    pending = InstalledState().get_pending(ansible, fingerprints)
+
+    assert pending is not None
+    assert pending.inventory == "host2"
+    assert pending.tags == ["vim"]
+    assert ansible.inventory == "host1,host2"
+
+
+def test_nothing_pending(ansible: Ansible):
+    fingerprints = InstalledState().get_role_fingerprints(ansible)
+    InstalledState().record("host1", fingerprints)
+    InstalledState().record("host2", fingerprints)
+
+    assert InstalledState().get_pending(ansible, fingerprints) is None
+    assert set(InstalledState().get_installed("host1")) == {"firefox", "vim"}
+
+
+def test_changed_facts_are_pending(ansible: Ansible, tmp_path: Path):
+    fingerprints = InstalledState().get_role_fingerprints(ansible)
+    InstalledState().record("host1", fingerprints)
+    InstalledState().record("host2", fingerprints)
+    (tmp_path / "facts").mkdir()
+    facts = {"ansible_distribution": "Ubuntu", "ansible_uptime_seconds": 10}
+    (tmp_path / "facts" / "host2").write_text(json.dumps(facts))
+
+    pending = InstalledState().get_pending(ansible, fingerprints)
+    InstalledState().record("host2", fingerprints)
+    facts["ansible_uptime_seconds"] = 20
+    (tmp_path / "facts" / "host2").write_text(json.dumps(facts))
+
+    assert pending is not None
+    assert pending.inventory == "host2"
+    assert InstalledState().get_pending(ansible, fingerprints) is None
+
+
+def test_forget(ansible: Ansible):
+    fingerprints = InstalledState().get_role_fingerprints(ansible)
+    InstalledState().record("host1", fingerprints)
+    InstalledState().forget("host1", ["firefox"])
+
+    assert list(InstalledState().get_installed("host1")) == ["vim"]
+    assert InstalledState().get_installed("../host1") == {}
+
+
+def test_track_install_records_succeeded_hosts(ansible: Ansible):
+    async def run(command, on_output, events_path=None):
+        with open(events_path, "a") as f:
+            event = {"event": "task_result", "host": "host2", "status": "failed"}
+            f.write(json.dumps(event) + "\n")
+            event = {"event": "task_result", "host": "host1", "status": "ok"}
+            f.write(json.dumps(event) + "\n")
+            event = {"event": "stats", "hosts": {"host1": {"ok": 1}}}
+            f.write(json.dumps(event) + "\n")
+        raise ValueError("Failed to run ansible. ")
+
+    async def run_job():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            job = JobManager().submit(ansible, ["ansible-playbook", "track"])
+            InstalledState().track_install(job, {"firefox": "fingerprint"})
+            await job._task
+            return job
+
+    job = asyncio.run(run_job())
+
+    assert job.get_succeeded_hosts() == ["host1"]
+    assert list(InstalledState().get_installed("host1")) == ["firefox"]
+    assert InstalledState().get_installed("host2") == {}
@@ -0,0 +1,125 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from toolbox.core.ansible import Ansible
+from toolbox.core.inventory import InventoryCache, read_groups
+
+INVENTORY = """
+[admin-machines]
+admin-01 ansible_host=10.0.0.1
+admin-02 ansible_host=10.0.0.2
+
+[user-machines]
+user-01
+
+[cloud-machines]
+cloud-01
+
+[VMs:children]
+cloud-machines
+
+[non-admin-machines:children]
+user-machines
+VMs
+
+[VMs:vars]
+ansible_port=2222
+"""
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path: Path):
+    with patch.object(InventoryCache, "cache_dir", tmp_path / "inventories"):
+        with patch.object(InventoryCache, "max_inline_hosts", 3):
+            yield tmp_path / "inventories"
+
+
+@pytest.fixture
+def run_folder(tmp_path: Path) -> Path:
+    run_folder = tmp_path / "ansible"
+    (run_folder / "inventory").mkdir(parents=True)
+    (run_folder / "inventory" / "hosts").write_text(INVENTORY)
+    return run_folder
+
+
+def test_read_groups(run_folder: Path):
+    groups = read_groups(run_folder / "inventory" / "hosts")
+    assert groups["admin-machines"] == {"admin-01", "admin-02"}
+    assert groups["VMs"] == {"cloud-01"}
+    assert groups["non-admin-machines"] == {"user-01", "cloud-01"}
+    assert "VMs:vars" not in groups
+    assert read_groups(run_folder / "missing") == {}
+
+
+def test_inline_inventory_for_few_hosts():
+    assert InventoryCache().get_inventory("host1,host2") == "host1,host2,"
+    assert InventoryCache().get_limit(["host1", "host2"]) == "host1,host2"
+
+
+def test_inventory_file_for_many_hosts(cache_dir: Path):
+    inventory = InventoryCache().get_inventory("host4,host3,host2,host1")
+    assert Path(inventory).parent == cache_dir
+    assert Path(inventory).read_text() == "host1\nhost2\nhost3\nhost4\n"
+    assert InventoryCache().get_inventory("host1,host2,host3,host4") == inventory
+    limit = InventoryCache().get_limit(["host1", "host2", "host3", "host4"])
+    assert limit == "@" + inventory
+
+
+def test_inventory_files_are_pruned(cache_dir: Path):
+    with patch.object(InventoryCache, "max_files", 1):
+        first = InventoryCache().get_inventory_file(
+            ["host1", "host2", "host3", "host4"]
+        )
+        second = InventoryCache().get_inventory_file(
+            ["host5", "host6", "host7", "host8"]
+        )
+
+    assert not first.exists()
+    assert list(cache_dir.iterdir()) == [second]
+
+
+def test_ansible_command_uses_inventory_file():
+    ansible = Ansible(
+        inventory="host1,host2,host3,host4", user="user", password="password"
+    )
+    same_hosts = ansible.copy(update={"inventory": "host4,host3,host2,host1"})
+    command = ansible.get_command()
+    assert Path(command[command.index("-i") + 1]).is_file()
+    assert ansible.get_fingerprint(command) == same_hosts.get_fingerprint(
+        same_hosts.get_command()
+    )
+
+
+def test_resolve_groups(run_folder: Path):
+    ansible = Ansible(
+        inventory="VMs,admin-01",
+        user="user",
+        password="password",
+        run_folder=run_folder,
+    ).resolve_groups()
+    assert ansible.inventory == str(run_folder / "inventory" / "hosts")
+    assert ansible.limit == "VMs,admin-01"
+    for command in (
+        ansible.get_command(),
+        ansible.get_ping_command(),
+        ansible.get_facts_command(),
+    ):
+        assert command[command.index("--limit") + 1] == "VMs,admin-01"
+
+
+def test_resolve_group_patterns(run_folder: Path):
+    inventory, limit = InventoryCache().resolve_hosts(
+        "non-admin-machines:!VMs, admin-machines:&user-01", run_folder
+    )
+    assert inventory == str(run_folder / "inventory" / "hosts")
+    assert limit == "non-admin-machines:!VMs,admin-machines:&user-01"
+
+
+def test_resolve_plain_hosts(run_folder: Path):
+    for hosts in ("admin-01,admin-02", "VMs,unknown-host", "10.0.0.1"):
+        assert InventoryCache().resolve_hosts(hosts, run_folder) == (hosts, "")
+    ansible = Ansible(
+        inventory="host1", user="user", password="password", run_folder=run_folder
+    )
+    assert ansible.resolve_groups() is ansible
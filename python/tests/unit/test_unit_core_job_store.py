@@ -0,0 +1,279 @@
+from datetime import datetime, timedelta
+import os
+from pathlib import Path
+import sqlite3
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+from toolbox.core.job_store import JobStore
+
+
+@pytest.fixture
+def job_store(tmp_path: Path):
+    store = JobStore(tmp_path / "jobs.db")
+    yield store
+    store.close()
+
+
+def add_job(store: JobStore, job_id: str, minutes: int, hosts=None, tags=None):
+    store.add_job(
+        job_id,
+        playbook="install.yml",
+        inventory="host1,host2,",
+        tags=tags or [],
+        hosts=hosts or [],
+        created_at=datetime(2023, 1, 1) + timedelta(minutes=minutes),
+        log_path=Path(f"/logs/{job_id}.log"),
+    )
+
+
+def test_add_and_finish_job(job_store: JobStore):
+    add_job(job_store, "job1", 0, hosts=["host1", "host2"], tags=["docker"])
+    job = job_store.get_job("job1")
+    assert job["status"] == "pending"
+    assert job["hosts"] == {"host1": None, "host2": None}
+    assert job["tags"] == ["docker"]
+    assert job["log_path"] == "/logs/job1.log"
+
+    job_store.finish_job(
+        "job1",
+        status="failed",
+        started_at=datetime(2023, 1, 1, 0, 0, 1),
+        finished_at=datetime(2023, 1, 1, 0, 0, 11),
+        error="Failed to run ansible. ",
+        host_statuses={"host1": "changed", "host2": "failed", "host3": "ok"},
+    )
+    job = job_store.get_job("job1")
+    assert job["status"] == "failed"
+    assert job["duration"] == 10
+    assert job["error"] == "Failed to run ansible. "
+    assert job["hosts"] == {"host1": "changed", "host2": "failed", "host3": "ok"}
+
+
+def test_get_missing_job(job_store: JobStore):
+    with pytest.raises(ValueError, match="Job 'missing' does not exist."):
+        job_store.get_job("missing")
+
+
+def test_list_jobs_pages(job_store: JobStore):
+    for i in range(5):
+        add_job(job_store, f"job{i}", i)
+    jobs, next_before = job_store.list_jobs(limit=2)
+    assert [job["id"] for job in jobs] == ["job4", "job3"]
+    assert next_before == "job3"
+    jobs, next_before = job_store.list_jobs(limit=2, before=next_before)
+    assert [job["id"] for job in jobs] == ["job2", "job1"]
+    jobs, next_before = job_store.list_jobs(limit=2, before=next_before)
+    assert [job["id"] for job in jobs] == ["job0"]
+    assert next_before is None
+
+
+def test_list_jobs_with_same_time(job_store: JobStore):
+    for job_id in ("a", "b", "c"):
+        add_job(job_store, job_id, 0)
+    jobs, next_before = job_store.list_jobs(limit=2)
+    assert [job["id"] for job in jobs] == ["c", "b"]
+    jobs, _ = job_store.list_jobs(limit=2, before=next_before)
+    assert [job["id"] for job in jobs] == ["a"]
+
+
+def test_list_jobs_filters(job_store: JobStore):
+    add_job(job_store, "job0", 0, hosts=["host1"], tags=["docker"])
+    add_job(job_store, "job1", 1, hosts=["host1", "host2"], tags=["k3s"])
+    add_job(job_store, "job2", 2, hosts=["host2"], tags=["docker", "k3s"])
+    job_store.finish_job("job1", "succeeded", None, None, None, {})
+
+    def ids(**filters):
+        return [job["id"] for job in job_store.list_jobs(**filters)[0]]
+
+    assert ids(host="host1") == ["job1", "job0"]
+    assert ids(tag="docker") == ["job2", "job0"]
+    assert ids(host="host2", tag="k3s") == ["job2", "job1"]
+    assert ids(status="succeeded") == ["job1"]
+    assert ids(host="host1", status="pending") == ["job0"]
+    assert ids(since=datetime(2023, 1, 1, 0, 1)) == ["job2", "job1"]
+    assert ids(until=datetime(2023, 1, 1, 0, 1)) == ["job0"]
+    assert ids(host="host3") == []
+    jobs, next_before = job_store.list_jobs(tag="k3s", limit=1)
+    assert [job["id"] for job in jobs] == ["job2"]
+    jobs, _ = job_store.list_jobs(tag="k3s", limit=1, before=next_before)
+    assert [job["id"] for job in jobs] == ["job1"]
+
+
+def test_list_jobs_invalid_page(job_store: JobStore):
+    with pytest.raises(ValueError, match="Limit must be at least 1."):
+        job_store.list_jobs(limit=0)
+    with pytest.raises(ValueError, match="Job 'missing' does not exist."):
+        job_store.list_jobs(before="missing")
+
+
+def test_reopen_fails_unfinished_jobs(tmp_path: Path):
+    store = JobStore(tmp_path / "jobs.db")
+    add_job(store, "job1", 0)
+    store.close()
+    store = JobStore(tmp_path / "jobs.db")
+    job = store.get_job("job1")
+    store.close()
+    assert job["status"] == "failed"
+    assert job["error"] == "The server stopped before the job finished."
+
+
+def test_reopen_keeps_jobs_of_running_servers(tmp_path: Path):
+    stopped = subprocess.Popen([sys.executable, "-c", "pass"])
+    stopped.wait()
+    store = JobStore(tmp_path / "jobs.db")
+    with patch("os.getpid", return_value=os.getppid()):
+        add_job(store, "running", 0)
+    with patch("os.getpid", return_value=stopped.pid):
+        add_job(store, "stopped", 1)
+    store.close()
+
+    store = JobStore(tmp_path / "jobs.db")
+    running = store.get_job("running")
+    stopped_job = store.get_job("stopped")
+    store.close()
+
+    assert running["status"] == "pending"
+    assert stopped_job["status"] == "failed"
+    assert "owner" not in running
+
+
+def test_open_store_without_owners(tmp_path: Path):
+    connection = sqlite3.connect(str(tmp_path / "jobs.db"))
+    connection.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, playbook TEXT NOT NULL, "
+        "inventory TEXT NOT NULL, status TEXT NOT NULL, created_at TEXT NOT NULL, "
+        "started_at TEXT, finished_at TEXT, duration REAL, error TEXT, "
+        "log_path TEXT NOT NULL)"
+    )
+    connection.execute(
+        "INSERT INTO jobs (id, playbook, inventory, status, created_at, log_path) "
+        "VALUES ('old', 'install.yml', 'host1,', 'running', '2023-01-01', 'old.log')"
+    )
+    connection.commit()
+    connection.close()
+
+    store = JobStore(tmp_path / "jobs.db")
+    add_job(store, "new", 0)
+    old = store.get_job("old")
+    new = store.get_job("new")
+    store.close()
+
+    assert old["status"] == "failed"
+    assert new["status"] == "pending"
+
+
+def test_timings(job_store: JobStore):
+    add_job(job_store, "job1", 0)
+    add_job(job_store, "job2", 1)
+    job_store.finish_job(
+        "job1",
+        "succeeded",
+        None,
+        None,
+        None,
+        {},
+        task_timings=[
+            ("host1", "docker", "Install docker", 30),
+            ("host1", "docker", "Add repository", 5),
+            ("host1", "k3s", "Install k3s", 10),
+        ],
+    )
+    job_store.finish_job(
+        "job2",
+        "succeeded",
+        None,
+        None,
+        None,
+        {},
+        task_timings=iter(
+            [
+                ("host1", "docker", "Install docker", 10),
+                ("host2", "k3s", "Install k3s", 8),
+            ]
+        ),
+    )
+
+    timings = job_store.get_timings(2)
+
+    assert [(t["role"], t["task"]) for t in timings["tasks"]] == [
+        ("docker", "Install docker"),
+        ("k3s", "Install k3s"),
+    ]
+    assert timings["tasks"][0] == {
+        "role": "docker",
+        "task": "Install docker",
+        "runs": 2,
+        "total": 40,
+        "mean": 20,
+        "max": 30,
+    }
+    assert [(t["role"], t["runs"], t["total"]) for t in timings["roles"]] == [
+        ("docker", 2, 45),
+        ("k3s", 2, 18),
+    ]
+    with pytest.raises(ValueError):
+        job_store.get_timings(0)
+
+
+def test_timings_of_last_jobs(job_store: JobStore):
+    for index in range(4):
+        add_job(job_store, f"job{index}", index)
+        job_store.finish_job(
+            f"job{index}",
+            "succeeded",
+            None,
+            None,
+            None,
+            {},
+            [("host1", "docker", "Install docker", index + 1)],
+        )
+
+    timings = job_store.get_timings(10, jobs=2)
+
+    assert timings["tasks"][0]["runs"] == 2
+    assert timings["tasks"][0]["total"] == 7
+    with pytest.raises(ValueError):
+        job_store.get_timings(10, jobs=0)
+
+
+def test_timings_of_old_jobs_removed(job_store: JobStore):
+    with patch.object(JobStore, "max_timed_jobs", 2):
+        for index in range(3):
+            add_job(job_store, f"job{index}", index)
+            job_store.finish_job(
+                f"job{index}",
+                "succeeded",
+                None,
+                None,
+                None,
+                {},
+                [("host1", "", "ping", 1), ("host2", "", "ping", 1)],
+            )
+
+    timings = job_store.get_timings(10, jobs=10)
+
+    assert timings["tasks"][0]["runs"] == 4
+    assert job_store.get_job("job0")["status"] == "succeeded"
+
+
+def test_timings_without_jobs(job_store: JobStore):
+    assert job_store.get_timings(10) == {"tasks": [], "roles": []}
+
+
+def test_timings_kept_across_restarts(tmp_path: Path):
+    store = JobStore(tmp_path / "jobs.db")
+    add_job(store, "job1", 0)
+    store.finish_job(
+        "job1", "succeeded", None, None, None, {}, [("host1", "", "ping", 1.5)]
+    )
+    store.close()
+
+    timings = JobStore(tmp_path / "jobs.db").get_timings(10)
+
+    assert timings["tasks"][0]["total"] == 1.5
+    assert timings["roles"] == [
+        {"role": "", "task": "", "runs": 1, "total": 1.5, "mean": 1.5, "max": 1.5}
+    ]
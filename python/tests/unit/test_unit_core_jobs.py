@@ -0,0 +1,730 @@
+import asyncio
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from toolbox.core.ansible import Ansible
+from toolbox.core.inventory import InventoryCache
+from toolbox.core.jobs import Job, JobManager, JobStatus
+from toolbox.core.rolling import Rollout
+
+
+@pytest.fixture
+def ansible_instance():
+    return Ansible(
+        inventory="host1,host2",
+        user="user",
+        password="password",
+        tags=["tag1"],
+        playbook="install.yml",
+    )
+
+
+def test_job_manager_singleton():
+    assert JobManager() is JobManager()
+
+
+def test_job_hides_command(ansible_instance: Ansible, log_dir: Path):
+    async def create_job():
+        return Job(ansible_instance, ansible_instance.get_command(), log_dir)
+
+    job = asyncio.run(create_job())
+
+    status = job.get_status()
+    assert status["status"] == JobStatus.PENDING
+    assert status["playbook"] == "install.yml"
+    assert status["tags"] == ["tag1"]
+    assert "password" not in str(status)
+
+
+def test_job_success(ansible_instance: Ansible):
+    async def run_job():
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async", return_value="done"
+        ):
+            job = JobManager().submit(ansible_instance, ["ansible-playbook"])
+            assert job.status == JobStatus.PENDING
+            return job, await job.wait()
+
+    job, result = asyncio.run(run_job())
+
+    assert result == "done"
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.result == "done"
+    assert job.started_at is not None
+    assert job.finished_at is not None
+    assert JobManager().get_job(job.id) is job
+
+
+def test_job_failure(ansible_instance: Ansible):
+    async def run_job():
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async",
+            side_effect=ValueError("Failed to run ansible. boom"),
+        ):
+            job = JobManager().submit(ansible_instance, ["ansible-playbook"])
+            with pytest.raises(ValueError, match="boom"):
+                await job.wait()
+            return job
+
+    job = asyncio.run(run_job())
+
+    assert job.status == JobStatus.FAILED
+    assert job.error == "Failed to run ansible. boom"
+
+
+def test_job_unexpected_error(ansible_instance: Ansible):
+    async def run_job():
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async",
+            side_effect=RuntimeError("runner crashed"),
+        ):
+            job = JobManager().submit(ansible_instance, ["ansible-playbook"])
+            with pytest.raises(ValueError, match="runner crashed"):
+                await job.wait()
+            await asyncio.sleep(0)
+            return job
+
+    job = asyncio.run(run_job())
+
+    assert job.status == JobStatus.FAILED
+    assert job.error == "runner crashed"
+    stored = JobManager().get_store().get_job(job.id)
+    assert stored["status"] == "failed"
+    assert stored["error"] == "runner crashed"
+
+
+def test_jobs_run_concurrently(ansible_instance: Ansible):
+    async def slow_run(command, on_output, events_path=None):
+        await asyncio.sleep(0.2)
+        return "done"
+
+    async def run_jobs():
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async", side_effect=slow_run
+        ):
+            jobs = [
+                JobManager().submit(ansible_instance, ["ansible-playbook", str(i)])
+                for i in range(10)
+            ]
+            return await asyncio.gather(*(job.wait() for job in jobs))
+
+    loop = asyncio.new_event_loop()
+    start = loop.time()
+    results = loop.run_until_complete(run_jobs())
+    elapsed = loop.time() - start
+    loop.close()
+
+    assert results == ["done"] * 10
+    assert elapsed < 1
+
+
+def test_get_missing_job():
+    with pytest.raises(ValueError, match="does not exist"):
+        JobManager().get_job("missing")
+
+
+def test_forget_old_jobs(ansible_instance: Ansible):
+    async def run_jobs():
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async", return_value="done"
+        ):
+            jobs = [
+                JobManager().submit(ansible_instance, ["ansible-playbook", str(i)])
+                for i in range(3)
+            ]
+            for job in jobs:
+                await job.wait()
+            JobManager().submit(ansible_instance, ["ansible-playbook"])
+            return jobs
+
+    with patch.object(JobManager, "max_finished_jobs", 1):
+        jobs = asyncio.run(run_jobs())
+
+    assert jobs[0].id not in JobManager().jobs
+    assert jobs[1].id not in JobManager().jobs
+    assert jobs[2].id in JobManager().jobs
+
+
+def test_job_output(ansible_instance: Ansible, log_dir: Path):
+    async def run(command, on_output, events_path=None):
+        for i in range(5):
+            on_output(f"line {i}\n")
+        return "Ran ansible successfully."
+
+    async def run_job():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            job = Job(ansible_instance, ["ansible-playbook"], log_dir, max_tail_lines=2)
+            await job.run()
+            return job, await job.wait()
+
+    job, result = asyncio.run(run_job())
+
+    assert result == "Ran ansible successfully."
+    assert (
+        "".join(job.iter_output(chunk_size=4))
+        == "line 0\nline 1\nline 2\nline 3\nline 4\n"
+    )
+    assert job.result == "Ran ansible successfully."
+    assert job.get_output_tail() == "line 3\nline 4\n"
+    assert job.get_log_path() == log_dir / f"{job.id}.log"
+
+
+def test_job_failure_includes_output_tail(ansible_instance: Ansible, log_dir: Path):
+    async def run(command, on_output, events_path=None):
+        on_output("fatal: unreachable\n")
+        raise ValueError("Failed to run ansible. ")
+
+    async def run_job():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            job = Job(ansible_instance, ["ansible-playbook"], log_dir)
+            await job.run()
+            return job
+
+    job = asyncio.run(run_job())
+
+    assert job.error == "Failed to run ansible. fatal: unreachable\n"
+
+
+def test_follow_output(ansible_instance: Ansible, log_dir: Path):
+    async def run(command, on_output, events_path=None):
+        for i in range(3):
+            await asyncio.sleep(0.05)
+            on_output(f"line {i}\n")
+        return "Ran ansible successfully."
+
+    async def follow():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            job = JobManager().submit(ansible_instance, ["ansible-playbook"])
+            return [line async for line in job.follow_output()]
+
+    assert asyncio.run(follow()) == ["line 0\n", "line 1\n", "line 2\n"]
+
+
+def test_job_pool_limits_running_jobs(ansible_instance: Ansible):
+    running = []
+    most_running = []
+
+    async def run(command, on_output, events_path=None):
+        running.append(command)
+        most_running.append(len(running))
+        await asyncio.sleep(0.05)
+        running.remove(command)
+        return "done"
+
+    async def run_jobs():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            jobs = [JobManager().submit(ansible_instance, [str(i)]) for i in range(6)]
+            await asyncio.sleep(0.01)
+            statuses = [job.status for job in jobs]
+            await asyncio.gather(*(job.wait() for job in jobs))
+            return statuses
+
+    JobManager().configure(max_concurrent_jobs=2)
+    try:
+        statuses = asyncio.run(run_jobs())
+    finally:
+        JobManager().configure(max_concurrent_jobs=4)
+
+    assert max(most_running) == 2
+    assert statuses.count(JobStatus.RUNNING) == 2
+    assert statuses.count(JobStatus.PENDING) == 4
+
+
+def test_job_pool_must_allow_a_job():
+    with pytest.raises(ValueError, match="At least one job"):
+        JobManager().configure(max_concurrent_jobs=0)
+
+
+def test_job_results(ansible_instance: Ansible, log_dir: Path):
+    async def run(command, on_output, events_path=None):
+        with open(events_path, "a") as f:
+            f.write(
+                json.dumps(
+                    {
+                        "event": "task_result",
+                        "host": "host1",
+                        "task": "Install",
+                        "status": "ok",
+                        "changed": True,
+                    }
+                )
+                + "\n"
+            )
+            f.write("not json\n")
+            f.write('{"event": "task_result"')
+        return "Ran ansible successfully."
+
+    async def run_job():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            job = Job(ansible_instance, ["ansible-playbook"], log_dir)
+            assert list(job.iter_task_results()) == []
+            await job.run()
+            return job
+
+    job = asyncio.run(run_job())
+
+    results = job.get_results()
+    assert [task.task for task in job.iter_task_results()] == ["Install"]
+    assert results.get_hosts()["host1"]["status"] == "changed"
+    assert job.get_results() is results
+    assert results.get_hosts()["host1"]["ok"] == 1
+
+
+def rollout_ansible(hosts: int) -> Ansible:
+    return Ansible(
+        inventory=",".join(f"host{i}" for i in range(hosts)),
+        user="user",
+        password="password",
+        tags=["tag1"],
+    )
+
+
+def test_job_rollout(log_dir: Path):
+    inventories = []
+
+    async def run(self, command, on_output, events_path=None):
+        inventories.append(command[3])
+        on_output("PLAY RECAP\n")
+        return "Ran ansible successfully."
+
+    async def run_job():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", run):
+            ansible = rollout_ansible(5)
+            job = Job(
+                ansible, ansible.get_command(), log_dir, rollout=Rollout(batch_size=2)
+            )
+            await job.run()
+            return job
+
+    job = asyncio.run(run_job())
+
+    assert job.status == JobStatus.SUCCEEDED
+    assert inventories == ["host0,host1,", "host2,host3,", "host4,"]
+    assert job.batches == 3
+    assert job.finished_batches == 3
+    assert "".join(job.iter_output()).startswith(
+        "Batch 1/3: host0, host1\nPLAY RECAP\n"
+    )
+
+
+def test_job_rollout_stops_after_failures(log_dir: Path):
+    async def run(self, command, on_output, events_path=None):
+        if command[3] == "host2,host3,":
+            with open(events_path, "a") as f:
+                event = {"event": "task_result", "host": "host3", "status": "failed"}
+                f.write(json.dumps(event) + "\n")
+                event = {"event": "task_result", "host": "host2", "status": "ok"}
+                f.write(json.dumps(event) + "\n")
+            raise ValueError("Failed to run ansible. ")
+        return "Ran ansible successfully."
+
+    async def run_job(rollout):
+        with patch("toolbox.core.ansible.Ansible.run_command_async", run):
+            ansible = rollout_ansible(6)
+            job = Job(ansible, ansible.get_command(), log_dir, rollout=rollout)
+            await job.run()
+            return job
+
+    job = asyncio.run(run_job(Rollout(batch_size=2)))
+
+    assert job.status == JobStatus.FAILED
+    assert job.finished_batches == 2
+    assert job.error.startswith(
+        "Stopped the rollout after 1 of 6 hosts failed, 2 hosts were not run on. "
+        "Failed hosts: host3. "
+    )
+
+    job = asyncio.run(run_job(Rollout(batch_size=2, max_failures=1)))
+
+    assert job.status == JobStatus.FAILED
+    assert job.finished_batches == 3
+    assert job.error.startswith("Failed to run ansible on hosts: host3. ")
+
+
+def test_job_rollout_counts_whole_batch_without_results(log_dir: Path):
+    async def run(self, command, on_output, events_path=None):
+        raise ValueError("Failed to run ansible. ")
+
+    async def run_job():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", run):
+            ansible = rollout_ansible(4)
+            job = Job(
+                ansible,
+                ansible.get_command(),
+                log_dir,
+                rollout=Rollout(batch_size=2, max_failures="50%"),
+            )
+            await job.run()
+            return job
+
+    job = asyncio.run(run_job())
+
+    assert job.finished_batches == 2
+    assert job.error.startswith("Failed to run ansible on hosts: host0, host1, host2")
+
+
+def test_job_rollout_pauses_between_batches(log_dir: Path):
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    async def run_job():
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async", return_value="done"
+        ):
+            with patch("toolbox.core.jobs.asyncio.sleep", sleep):
+                ansible = rollout_ansible(3)
+                job = Job(
+                    ansible,
+                    ansible.get_command(),
+                    log_dir,
+                    rollout=Rollout(batch_size=1, pause=5),
+                )
+                await job.run()
+
+    asyncio.run(run_job())
+
+    assert sleeps == [5, 5]
+
+
+def test_rollout_needs_hosts(tmp_path: Path):
+    inventory = tmp_path / "inventory"
+    inventory.write_text("host1\n")
+    ansible = Ansible(inventory=str(inventory), user="user", password="password")
+
+    async def submit():
+        JobManager().submit(ansible, ansible.get_command(), rollout=Rollout())
+
+    with pytest.raises(ValueError, match="Rolling runs need a list of hosts"):
+        asyncio.run(submit())
+
+
+def test_identical_submissions_are_coalesced(ansible_instance: Ansible):
+    runs = []
+
+    async def run(command, on_output, events_path=None):
+        runs.append(command)
+        on_output("PLAY RECAP\n")
+        await asyncio.sleep(0.05)
+        return "Ran ansible successfully."
+
+    async def run_jobs():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            reordered = ansible_instance.copy(
+                update={"inventory": "host2, host1", "tags": ["tag1"]}
+            )
+            first = JobManager().submit(
+                ansible_instance, ansible_instance.get_command()
+            )
+            second = JobManager().submit(reordered, reordered.get_command())
+            other = ansible_instance.copy(update={"tags": ["tag2"]})
+            third = JobManager().submit(other, other.get_command())
+            outputs = await asyncio.gather(first.wait(), second.wait(), third.wait())
+            later = JobManager().submit(
+                ansible_instance, ansible_instance.get_command()
+            )
+            await later.wait()
+            return first, second, third, later, outputs
+
+    first, second, third, later, outputs = asyncio.run(run_jobs())
+
+    assert second is first
+    assert first.attached == 1
+    assert third is not first
+    assert later is not first
+    assert outputs == ["Ran ansible successfully."] * 3
+    assert "".join(first.iter_output()) == "PLAY RECAP\n"
+    assert len(runs) == 3
+
+
+def test_fingerprint(ansible_instance: Ansible):
+    command = ansible_instance.get_command()
+    reordered = ansible_instance.copy(update={"inventory": "host2,host1,"})
+    assert ansible_instance.get_fingerprint(command) == reordered.get_fingerprint(
+        reordered.get_command()
+    )
+    other = ansible_instance.copy(update={"extra_vars": [{"var": "value"}]})
+    assert ansible_instance.get_fingerprint(command) != other.get_fingerprint(
+        other.get_command()
+    )
+    assert ansible_instance.get_fingerprint(
+        command
+    ) != ansible_instance.get_fingerprint(ansible_instance.get_ping_command())
+
+
+def test_cancel_running_job(ansible_instance: Ansible):
+    started = []
+
+    async def run(command, on_output, events_path=None):
+        on_output("PLAY [all]\n")
+        started.append(True)
+        await asyncio.sleep(30)
+
+    async def run_job():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            job = JobManager().submit(ansible_instance, ["ansible-playbook", "cancel"])
+            while not started:
+                await asyncio.sleep(0.01)
+            job.cancel()
+            await job.wait_finished()
+            with pytest.raises(ValueError, match="Job was cancelled."):
+                await job.wait()
+            with pytest.raises(ValueError, match="Job has already finished."):
+                job.cancel()
+            return job
+
+    job = asyncio.run(run_job())
+
+    assert job.status == JobStatus.CANCELLED
+    assert job.error == "Job was cancelled. PLAY [all]\n"
+    assert job.finished_at is not None
+
+
+def test_cancel_pending_job(ansible_instance: Ansible):
+    async def run(command, on_output, events_path=None):
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def run_jobs():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            running = JobManager().submit(ansible_instance, ["ansible-playbook", "1"])
+            pending = JobManager().submit(ansible_instance, ["ansible-playbook", "2"])
+            await asyncio.sleep(0.01)
+            assert pending.status == JobStatus.PENDING
+            pending.cancel()
+            await pending.wait_finished()
+            await running.wait()
+            return running, pending
+
+    JobManager().configure(max_concurrent_jobs=1)
+    try:
+        running, pending = asyncio.run(run_jobs())
+    finally:
+        JobManager().configure(max_concurrent_jobs=4)
+
+    assert running.status == JobStatus.SUCCEEDED
+    assert pending.status == JobStatus.CANCELLED
+    assert pending.started_at is None
+    assert pending.error == "Job was cancelled before it started."
+
+
+def test_job_timeout(ansible_instance: Ansible, tmp_path: Path, log_dir: Path):
+    ansible_instance.run_folder = tmp_path
+
+    async def run_job():
+        job = Job(ansible_instance, ["sleep", "30"], log_dir, timeout=0.2)
+        await job.run()
+        return job
+
+    job = asyncio.run(run_job())
+
+    assert job.status == JobStatus.FAILED
+    assert job.error == "Job timed out after 0.2 seconds. "
+
+
+def test_invalid_job_timeout(ansible_instance: Ansible, log_dir: Path):
+    with pytest.raises(ValueError, match="Timeout must be a positive number"):
+        Job(ansible_instance, ["ansible-playbook"], log_dir, timeout=0)
+
+
+def fail_hosts(events_path: Path, *hosts: str) -> None:
+    with open(events_path, "a") as f:
+        for host in hosts:
+            event = {"event": "task_result", "host": host, "status": "failed"}
+            f.write(json.dumps(event) + "\n")
+    raise ValueError("Failed to run ansible. ")
+
+
+def test_retry_failed_hosts(ansible_instance: Ansible):
+    commands = []
+
+    async def run(command, on_output, events_path=None):
+        commands.append(command)
+        fail_hosts(events_path, "host2")
+
+    async def run_jobs():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            job = JobManager().submit(ansible_instance, ["ansible-playbook", "retry"])
+            await job._task
+            retry = JobManager().retry(job.id)
+            await retry._task
+            second_retry = JobManager().retry(retry.id)
+            await second_retry._task
+            return job, retry
+
+    job, retry = asyncio.run(run_jobs())
+
+    assert job.status == JobStatus.FAILED
+    assert job.failed_hosts == ["host2"]
+    assert job.retried_by == retry.id
+    assert retry.retry_of == job.id
+    assert commands == [
+        ["ansible-playbook", "retry"],
+        ["ansible-playbook", "retry", "--limit", "host2"],
+        ["ansible-playbook", "retry", "--limit", "host2"],
+    ]
+
+
+def test_retry_only_reports_the_retried_hosts(log_dir: Path):
+    ansible = Ansible(inventory="host1,host2,host3", user="user", password="pass")
+    commands, succeeded = [], []
+
+    async def run(command, on_output, events_path=None):
+        commands.append(command)
+        if len(commands) == 1:
+            fail_hosts(events_path, "host1")
+        return "Ran ansible successfully."
+
+    async def run_jobs():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            job = JobManager().submit(ansible, ansible.get_command())
+            job.add_done_callback(
+                lambda job: succeeded.append(job.get_succeeded_hosts())
+            )
+            await job._task
+            retry = JobManager().retry(job.id)
+            await retry._task
+            return retry
+
+    with patch.object(InventoryCache, "cache_dir", log_dir / "inventories"):
+        retry = asyncio.run(run_jobs())
+
+    assert retry.status == JobStatus.SUCCEEDED
+    assert retry.inventory == "host1"
+    assert commands[1][commands[1].index("-i") + 1] == "host1,"
+    assert commands[1][-2:] == ["--limit", "host1"]
+    assert succeeded == [[], ["host1"]]
+    assert list(JobManager().get_store().get_job(retry.id)["hosts"]) == ["host1"]
+
+
+def test_retry_many_failed_hosts_with_limit_file(log_dir: Path):
+    hosts = [f"host{index}" for index in range(5)]
+    ansible = Ansible(inventory=",".join(hosts), user="user", password="password")
+    commands = []
+
+    async def run(command, on_output, events_path=None):
+        commands.append(command)
+        fail_hosts(events_path, *hosts[1:])
+
+    async def run_jobs():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            job = JobManager().submit(ansible, ["ansible-playbook", "retry"])
+            await job._task
+            retry = JobManager().retry(job.id)
+            await retry._task
+
+    with patch.object(InventoryCache, "cache_dir", log_dir / "inventories"):
+        with patch.object(InventoryCache, "max_inline_hosts", 2):
+            asyncio.run(run_jobs())
+
+    limit = commands[1][-1]
+    assert commands[1][-2] == "--limit"
+    assert limit.startswith("@")
+    assert Path(limit[1:]).read_text().split() == hosts[1:]
+
+
+def test_retry_rollout_failed_hosts(log_dir: Path):
+    inventories = []
+
+    async def run(self, command, on_output, events_path=None):
+        inventories.append(command[3])
+        if "host3" in command[3]:
+            fail_hosts(events_path, "host3")
+        return "Ran ansible successfully."
+
+    async def run_jobs():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", run):
+            ansible = rollout_ansible(4)
+            rollout = Rollout(batch_size=2, max_failures=1)
+            job = JobManager().submit(ansible, ansible.get_command(), rollout=rollout)
+            await job._task
+            retry = JobManager().retry(job.id)
+            await retry._task
+            return job, retry
+
+    job, retry = asyncio.run(run_jobs())
+
+    assert job.failed_hosts == ["host3"]
+    assert retry.inventory == "host3"
+    assert inventories == ["host0,host1,", "host2,host3,", "host3,"]
+
+
+def test_retry_needs_failed_hosts(ansible_instance: Ansible):
+    async def run(command, on_output, events_path=None):
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run_jobs():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            job = JobManager().submit(ansible_instance, ["ansible-playbook", "ok"])
+            with pytest.raises(ValueError, match="Job has not finished yet."):
+                JobManager().retry(job.id)
+            await job.wait()
+            with pytest.raises(ValueError, match="Job has no failed hosts to retry."):
+                JobManager().retry(job.id)
+
+    asyncio.run(run_jobs())
+
+
+def test_automatic_retries_back_off(ansible_instance: Ansible):
+    delays = []
+    sleep = asyncio.sleep
+
+    async def record_sleep(delay):
+        delays.append(delay)
+        await sleep(0)
+
+    async def run(command, on_output, events_path=None):
+        fail_hosts(events_path, "host1", "host2")
+
+    async def run_jobs():
+        with patch("toolbox.core.ansible.Ansible.run_command_async", side_effect=run):
+            with patch("toolbox.core.jobs.asyncio.sleep", side_effect=record_sleep):
+                job = JobManager().submit(
+                    ansible_instance,
+                    ["ansible-playbook", "backoff"],
+                    retries=2,
+                    retry_delay=10,
+                )
+                jobs = [job]
+                await job._task
+                while jobs[-1].retried_by is not None:
+                    jobs.append(JobManager().get_job(jobs[-1].retried_by))
+                    await jobs[-1]._task
+                return jobs
+
+    jobs = asyncio.run(run_jobs())
+
+    assert len(jobs) == 3
+    assert delays == [10, 20]
+    assert [job.delay for job in jobs] == [0, 10, 20]
+    assert [job.retries for job in jobs] == [2, 1, 0]
+    assert jobs[-1].retried_by is None
+    assert jobs[-1].failed_hosts == ["host1", "host2"]
+
+
+def test_cancel_delayed_job(ansible_instance: Ansible):
+    async def run_job():
+        with patch(
+            "toolbox.core.ansible.Ansible.run_command_async", return_value="done"
+        ):
+            job = JobManager().submit(
+                ansible_instance, ["ansible-playbook", "delayed"], delay=30
+            )
+            await asyncio.sleep(0.01)
+            job.cancel()
+            await job.wait_finished()
+            return job
+
+    job = asyncio.run(run_job())
+
+    assert job.status == JobStatus.CANCELLED
+    assert job.error == "Job was cancelled before it started."
+
+
+def test_invalid_job_retries(ansible_instance: Ansible, log_dir: Path):
+    with pytest.raises(ValueError, match="Retries cannot be negative."):
+        Job(ansible_instance, ["ansible-playbook"], log_dir, retries=-1)
@@ -0,0 +1,131 @@
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from toolbox.core.ansible import Ansible
+from toolbox.core.playbooks import PlaybookCache
+import yaml
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path: Path):
+    with patch.object(PlaybookCache, "cache_dir", tmp_path / "cache"):
+        yield tmp_path / "cache"
+
+
+@pytest.fixture
+def run_folder(tmp_path: Path) -> Path:
+    run_folder = tmp_path / "ansible"
+    roles = {
+        "tools": [{"name": "Tools", "tags": "always", "block": [{"name": "curl"}]}],
+        "browsers/install": [
+            {"name": "Install Firefox", "tags": ["firefox"]},
+            {"name": "Install Chrome", "tags": ["chrome"]},
+        ],
+        "editors/install": [
+            {"name": "Editors", "block": [{"name": "Install Vim", "tags": ["vim"]}]}
+        ],
+    }
+    for role, tasks in roles.items():
+        tasks_folder = run_folder / "roles" / role / "tasks"
+        tasks_folder.mkdir(parents=True)
+        (tasks_folder / "main.yml").write_text(yaml.safe_dump(tasks))
+    play = {
+        "name": "Install Software",
+        "hosts": "all",
+        "roles": ["tools", "browsers/install", {"role": "editors/install"}],
+    }
+    (run_folder / "install.yml").write_text(yaml.safe_dump([play]))
+    return run_folder
+
+
+def get_roles(playbook: str):
+    with open(playbook, "r") as f:
+        return yaml.safe_load(f)[0]["roles"]
+
+
+def test_minimal_playbook(run_folder: Path, cache_dir: Path):
+    playbook = PlaybookCache().get_playbook(run_folder, "install.yml", ["firefox"])
+
+    assert Path(playbook).parent == cache_dir
+    assert get_roles(playbook) == ["tools", "browsers/install"]
+
+
+def test_minimal_playbook_with_tags_inside_blocks(run_folder: Path):
+    playbook = PlaybookCache().get_playbook(run_folder, "install.yml", ["vim"])
+
+    assert get_roles(playbook) == ["tools", {"role": "editors/install"}]
+
+
+def test_minimal_playbook_is_cached(run_folder: Path):
+    first = PlaybookCache().get_playbook(run_folder, "install.yml", ["chrome", "vim"])
+    with patch.object(PlaybookCache, "_read_role_tags") as read_role_tags:
+        second = PlaybookCache().get_playbook(
+            run_folder, "install.yml", ["vim", "chrome"]
+        )
+    other = PlaybookCache().get_playbook(run_folder, "install.yml", ["chrome"])
+
+    read_role_tags.assert_not_called()
+    assert first == second
+    assert other != first
+
+
+def test_minimal_playbooks_are_pruned(run_folder: Path, cache_dir: Path):
+    with patch.object(PlaybookCache, "max_files", 2):
+        firefox = PlaybookCache().get_playbook(run_folder, "install.yml", ["firefox"])
+        chrome = PlaybookCache().get_playbook(run_folder, "install.yml", ["chrome"])
+        os.utime(firefox, (0, 0))
+        os.utime(chrome, (1, 1))
+        assert PlaybookCache().get_playbook(run_folder, "install.yml", ["firefox"]) == (
+            firefox
+        )
+        vim = PlaybookCache().get_playbook(run_folder, "install.yml", ["vim"])
+
+    assert sorted(cache_dir.iterdir()) == sorted([Path(firefox), Path(vim)])
+
+
+def test_minimal_playbook_follows_role_changes(run_folder: Path):
+    first = PlaybookCache().get_playbook(run_folder, "install.yml", ["nano"])
+    tasks_file = run_folder / "roles" / "editors" / "install" / "tasks" / "main.yml"
+    tasks_file.write_text(yaml.safe_dump([{"name": "Install Nano", "tags": ["nano"]}]))
+    second = PlaybookCache().get_playbook(run_folder, "install.yml", ["nano"])
+
+    assert get_roles(first) == ["tools"]
+    assert get_roles(second) == ["tools", {"role": "editors/install"}]
+
+
+def test_minimal_playbook_keeps_unreadable_roles(run_folder: Path):
+    (run_folder / "roles" / "browsers" / "install" / "tasks" / "main.yml").unlink()
+
+    playbook = PlaybookCache().get_playbook(run_folder, "install.yml", ["vim"])
+
+    assert get_roles(playbook) == [
+        "tools",
+        "browsers/install",
+        {"role": "editors/install"},
+    ]
+
+
+def test_no_tags_runs_whole_playbook(run_folder: Path):
+    assert PlaybookCache().get_playbook(run_folder, "install.yml", []) == "install.yml"
+    assert PlaybookCache().get_playbook(run_folder, "missing.yml", ["vim"]) == (
+        "missing.yml"
+    )
+
+
+def test_ansible_runs_minimal_playbook(run_folder: Path, cache_dir: Path):
+    ansible = Ansible(
+        inventory="host1",
+        user="user",
+        password="password",
+        run_folder=run_folder,
+        tags=["firefox"],
+        minimal_playbook=True,
+    )
+
+    assert Path(ansible.get_command()[1]).parent == cache_dir
+    assert ansible.get_env()["ANSIBLE_ROLES_PATH"] == str(run_folder / "roles")
+    ansible.minimal_playbook = False
+    assert ansible.get_command()[1] == "install.yml"
+    assert "ANSIBLE_ROLES_PATH" not in ansible.get_env()
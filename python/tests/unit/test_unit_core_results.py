@@ -0,0 +1,175 @@
+import json
+from pathlib import Path
+
+from toolbox.core.ansible import Ansible
+from toolbox.core.ansible_profile import AnsibleProfile
+from toolbox.core.results import (
+    EVENTS_CALLBACK_DIR,
+    RunResults,
+    TaskResult,
+    filter_tasks,
+    get_events_env,
+    get_reachability,
+    read_task_results,
+)
+
+
+def task_event(host: str, task: str, status: str, **data) -> dict:
+    return {
+        "event": "task_result",
+        "host": host,
+        "task": task,
+        "status": status,
+        **data,
+    }
+
+
+def test_results_count_task_results():
+    results = RunResults()
+    results.add_event(task_event("host1", "Gathering Facts", "ok"))
+    results.add_event(task_event("host1", "Install", "ok", changed=True))
+    results.add_event(task_event("host1", "Optional", "failed", ignored=True))
+    results.add_event(task_event("host2", "Gathering Facts", "unreachable"))
+    results.add_event(task_event("host1", "Remove", "skipped"))
+
+    hosts = results.get_hosts()
+
+    assert results.complete is False
+    assert hosts["host1"]["ok"] == 3
+    assert hosts["host1"]["changed"] == 1
+    assert hosts["host1"]["ignored"] == 1
+    assert hosts["host1"]["skipped"] == 1
+    assert hosts["host1"]["status"] == "changed"
+    assert hosts["host2"]["unreachable"] == 1
+    assert hosts["host2"]["status"] == "unreachable"
+
+
+def test_results_use_final_stats():
+    results = RunResults()
+    results.add_event(task_event("host1", "Install", "failed"))
+    results.add_event(
+        {
+            "event": "stats",
+            "hosts": {"host1": {"ok": 2, "changed": 0, "failures": 1, "rescued": 0}},
+        }
+    )
+
+    assert results.complete is True
+    assert results.get_hosts()["host1"]["ok"] == 2
+    assert results.get_hosts()["host1"]["failures"] == 1
+    assert results.get_hosts()["host1"]["status"] == "failed"
+
+
+def test_results_of_several_runs():
+    results = RunResults()
+    results.add_event(task_event("host1", "Install", "failed"))
+    results.add_event(
+        {"event": "stats", "hosts": {"host1": {"ok": 1, "failures": 1, "rescued": 1}}}
+    )
+    results.add_event(task_event("host2", "Install", "ok", changed=True))
+    results.add_event(task_event("host1", "Install", "ok"))
+
+    assert results.complete is False
+    assert results.get_hosts()["host1"]["ok"] == 2
+    assert results.get_hosts()["host2"]["status"] == "changed"
+
+    results.add_event(
+        {
+            "event": "stats",
+            "hosts": {"host1": {"ok": 1}, "host2": {"ok": 1, "changed": 1}},
+        }
+    )
+
+    assert results.complete is True
+    assert results.get_hosts()["host1"]["ok"] == 2
+    assert results.get_hosts()["host1"]["failures"] == 1
+    assert results.get_hosts()["host1"]["rescued"] == 1
+    assert results.get_hosts()["host2"]["ok"] == 1
+    assert "tasks" not in results.dict()
+
+
+def test_results_ignore_unknown_events():
+    results = RunResults()
+    results.add_event({"event": "playbook_start"})
+    assert results.get_hosts() == {}
+
+
+def test_read_task_results(tmp_path: Path):
+    events_path = tmp_path / "events.jsonl"
+    assert list(read_task_results(events_path)) == []
+    events_path.write_text(
+        json.dumps(task_event("host1", "Install", "ok"))
+        + "\n"
+        + json.dumps({"event": "stats", "hosts": {}})
+        + "\nnot json\n"
+        + json.dumps(task_event("host2", "Install", "failed"))
+        + "\n"
+        + '{"event": "task_result"'
+    )
+
+    tasks = list(read_task_results(events_path))
+
+    assert [(task.host, task.status) for task in tasks] == [
+        ("host1", "ok"),
+        ("host2", "failed"),
+    ]
+
+
+def test_filter_tasks():
+    tasks = [
+        TaskResult(**task_event("host1", "Install", "ok", changed=True, duration=2)),
+        TaskResult(**task_event("host1", "Check", "ok")),
+        TaskResult(**task_event("host2", "Install", "failed", message="No space")),
+    ]
+
+    assert [task.task for task in filter_tasks(tasks, host="host1")] == [
+        "Install",
+        "Check",
+    ]
+    assert [task.host for task in filter_tasks(tasks, status="changed")] == ["host1"]
+    failed = filter_tasks(iter(tasks), status="failed")
+    assert len(failed) == 1
+    assert failed[0].message == "No space"
+    assert filter_tasks(tasks, host="host1", status="failed") == []
+    assert filter_tasks(tasks)[0].duration == 2
+
+
+def test_get_reachability():
+    tasks = [
+        TaskResult(**task_event("host1", "ping", "ok")),
+        TaskResult(
+            **task_event("host2", "ping", "unreachable", message="Connection refused.")
+        ),
+    ]
+
+    reachability = get_reachability(["host1", "host2", "host3"], iter(tasks))
+
+    assert reachability["host1"].reachable is True
+    assert reachability["host1"].message == "pong"
+    assert reachability["host2"].reachable is False
+    assert reachability["host2"].message == "Connection refused."
+    assert reachability["host3"].reachable is False
+    assert reachability["host3"].message == "No response."
+
+
+def test_get_events_env():
+    env = get_events_env(Path("/tmp/events.jsonl"), ["timer"])
+    assert env == {
+        "ANSIBLE_CALLBACK_PLUGINS": str(EVENTS_CALLBACK_DIR),
+        "ANSIBLE_CALLBACKS_ENABLED": "timer,toolbox_events",
+        "ANSIBLE_LOAD_CALLBACK_PLUGINS": "True",
+        "TOOLBOX_EVENTS_FILE": "/tmp/events.jsonl",
+    }
+
+
+def test_ansible_env_records_events():
+    ansible = Ansible(
+        inventory="host1",
+        user="user",
+        password="password",
+        profile=AnsibleProfile(callbacks_enabled=["timer"]),
+    )
+    assert "TOOLBOX_EVENTS_FILE" not in ansible.get_env()
+    env = ansible.get_env(Path("/tmp/events.jsonl"))
+    assert env["TOOLBOX_EVENTS_FILE"] == "/tmp/events.jsonl"
+    assert env["ANSIBLE_CALLBACKS_ENABLED"] == "timer,toolbox_events"
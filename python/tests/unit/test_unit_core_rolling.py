@@ -0,0 +1,49 @@
+from pydantic import ValidationError
+import pytest
+from toolbox.core.rolling import Rollout
+
+HOSTS = [f"host{i}" for i in range(10)]
+
+
+def test_default_rollout_is_one_batch():
+    assert Rollout().get_batches(HOSTS) == [HOSTS]
+    assert Rollout().get_max_failures(10) == 0
+
+
+def test_rollout_batch_size():
+    batches = Rollout(batch_size=4).get_batches(HOSTS)
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert sum(batches, []) == HOSTS
+
+
+def test_rollout_batch_percentage():
+    assert [len(batch) for batch in Rollout(batch_size="25%").get_batches(HOSTS)] == [
+        3,
+        3,
+        3,
+        1,
+    ]
+    assert len(Rollout(batch_size="1%").get_batches(HOSTS)) == 10
+
+
+def test_rollout_max_failures():
+    assert Rollout(max_failures=3).get_max_failures(10) == 3
+    assert Rollout(max_failures="10%").get_max_failures(500) == 50
+    assert Rollout(max_failures="1%").get_max_failures(10) == 1
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {"batch_size": 0},
+        {"batch_size": "0%"},
+        {"batch_size": "101%"},
+        {"batch_size": "a few"},
+        {"max_failures": -1},
+        {"max_failures": "%"},
+        {"pause": -1},
+    ],
+)
+def test_invalid_rollout(settings):
+    with pytest.raises(ValidationError):
+        Rollout(**settings)
@@ -1,5 +1,19 @@
+import base64
+import json
+import stat
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+
 import pytest
-from toolbox.core.rsakey import RSAKey, encrypt
+from toolbox.core.rsakey import (
+    RSAKey,
+    encrypt,
+    encrypt_envelope,
+    open_request,
+    read_plain,
+)
 
 
 def test_rsa_public_key():
@@ -47,3 +61,163 @@ def test_rsa_encrypt_decrypt_wrong_message():
     assert isinstance(encrypted_message, str)
     with pytest.raises(ValueError):
         rsa_key.decrypt("wrong message")
+
+
+def test_rsa_open_envelope():
+    """Test the fields sealed in an envelope are decrypted together."""
+    rsa_key = RSAKey()
+    fields = {"hosts": ",".join(f"host{index}" for index in range(500)), "verbosity": 2}
+    envelope = encrypt_envelope(fields, rsa_key.get_public_key().encode("utf-8"))
+    assert rsa_key.open_envelope(envelope) == fields
+
+
+def test_rsa_open_tampered_envelope():
+    """Test an envelope whose data was changed is rejected."""
+    rsa_key = RSAKey()
+    envelope = encrypt_envelope({"hosts": "host1"}, rsa_key.get_public_key().encode())
+    data = bytearray(base64.b64decode(envelope["data"]))
+    data[0] ^= 1
+    tampered = {**envelope, "data": base64.b64encode(bytes(data)).decode()}
+    for malformed in (tampered, {**envelope, "iv": "AAAA"}, {"key": envelope["key"]}):
+        with pytest.raises(ValueError, match="Malformed envelope."):
+            rsa_key.open_envelope(malformed)
+
+
+def test_open_request():
+    """Test the data of a request with and without an envelope."""
+    public_key = RSAKey().get_public_key().encode("utf-8")
+    data = {"hosts": encrypt("host1", public_key), "background": True}
+    opened, decrypt = open_request(data)
+    assert opened is data
+    assert decrypt(opened["hosts"]) == "host1"
+    data = {"envelope": encrypt_envelope({"hosts": "host1"}, public_key), "force": 1}
+    opened, decrypt = open_request(data)
+    assert opened == {"hosts": "host1", "force": 1}
+    assert decrypt(opened["hosts"]) == "host1"
+    with pytest.raises(ValueError):
+        open_request({"envelope": "envelope"})
+
+
+def test_read_plain():
+    """Test the fields of an envelope must be strings."""
+    assert read_plain("host1") == "host1"
+    with pytest.raises(ValueError):
+        read_plain(["host1"])
+
+
+@pytest.fixture
+def keystore(tmp_path):
+    """Keep the keys of the test in a temporary folder."""
+    rsa_key = RSAKey()
+    with patch.object(RSAKey, "key_dir", tmp_path / "keys"):
+        with patch.object(rsa_key, "rotate_after", 0):
+            rsa_key.reload()
+            yield tmp_path / "keys" / "keystore.json"
+    rsa_key.reload()
+
+
+def test_rsa_key_generated_on_first_use(keystore):
+    """Test the key is generated on first use and stored for the user only."""
+    assert not keystore.exists()
+    public_key = RSAKey().get_public_key()
+    assert stat.S_IMODE(keystore.stat().st_mode) == 0o600
+    assert stat.S_IMODE(keystore.parent.stat().st_mode) == 0o700
+    assert len(json.loads(keystore.read_text())["keys"]) == 1
+    RSAKey().reload()
+    assert RSAKey().get_public_key() == public_key
+
+
+def test_rsa_key_shared_between_processes(keystore):
+    """Test a key rotated by another server process is used from then on."""
+    rsa_key = RSAKey()
+    old_public_key = rsa_key.get_public_key()
+    code = "\n".join(
+        [
+            "from pathlib import Path",
+            "from toolbox.core.rsakey import RSAKey",
+            f"RSAKey.key_dir = Path({str(keystore.parent)!r})",
+            f"assert RSAKey().get_public_key() == {old_public_key!r}",
+            "RSAKey().rotate()",
+            "print(RSAKey().get_public_key(), end='')",
+        ]
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert rsa_key.get_public_key() == output != old_public_key
+    message = encrypt("test message", old_public_key.encode("utf-8"))
+    assert rsa_key.decrypt(message) == "test message"
+    assert sorted(path.name for path in keystore.parent.iterdir()) == [
+        "keystore.json",
+        "keystore.lock",
+    ]
+
+
+def test_rsa_key_rotated_once(keystore):
+    """Test a process finding the key rotated by another one does not rotate it again."""
+    rsa_key = RSAKey()
+    old_public_key = rsa_key.get_public_key()
+    rsa_key.configure(rotate_after=60)
+    later = time.time() + 61
+    with patch("time.time", return_value=later):
+        new_public_key = rsa_key.get_public_key()
+        rsa_key._created = 0.0
+        assert rsa_key.get_public_key() == new_public_key
+    keys = json.loads(keystore.read_text())
+    assert keys["created"] == later
+    assert len(keys["keys"]) == 2
+    assert new_public_key != old_public_key
+
+
+def test_rsa_key_rotation(keystore):
+    """Test the previous key still decrypts once the key was rotated."""
+    rsa_key = RSAKey()
+    old_public_key = rsa_key.get_public_key()
+    encrypted_message = encrypt("test message", old_public_key.encode("utf-8"))
+    rsa_key.rotate()
+    assert rsa_key.get_public_key() != old_public_key
+    assert rsa_key.decrypt(encrypted_message) == "test message"
+    assert len(json.loads(keystore.read_text())["keys"]) == 2
+    rsa_key.rotate()
+    with pytest.raises(ValueError):
+        rsa_key.decrypt(encrypted_message)
+
+
+def test_rsa_key_rotate_after(keystore):
+    """Test the key is replaced once it is older than rotate_after."""
+    rsa_key = RSAKey()
+    public_key = rsa_key.get_public_key()
+    rsa_key.configure(rotate_after=60)
+    assert rsa_key.get_public_key() == public_key
+    with patch("time.time", return_value=time.time() + 61):
+        assert rsa_key.get_public_key() != public_key
+    with pytest.raises(ValueError):
+        rsa_key.configure(rotate_after=-1)
+
+
+def test_rsa_key_in_memory(keystore):
+    """Test the key is not stored without a key folder."""
+    with patch.object(RSAKey, "key_dir", None):
+        rsa_key = RSAKey()
+        rsa_key.reload()
+        message = encrypt("test message", rsa_key.get_public_key().encode("utf-8"))
+        assert rsa_key.decrypt(message) == "test message"
+        rsa_key.rotate()
+        rsa_key.reload()
+    assert not keystore.parent.exists()
+
+
+def test_rsa_published_key(keystore):
+    """Test the public key is served with an ETag and as long as it stays current."""
+    rsa_key = RSAKey()
+    published = rsa_key.get_published_key()
+    assert published.pem == rsa_key.get_public_key()
+    assert published.max_age == 86400
+    assert rsa_key.get_published_key().etag == published.etag
+    rsa_key.configure(rotate_after=600)
+    assert 590 <= rsa_key.get_published_key().max_age <= 600
+    rsa_key.rotate()
+    assert rsa_key.get_published_key().etag != published.etag
+    with patch.object(RSAKey, "key_dir", None):
+        with patch.object(rsa_key, "rotate_after", 0):
+            assert rsa_key.get_published_key().max_age == 0
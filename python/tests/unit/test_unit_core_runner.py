@@ -0,0 +1,241 @@
+import asyncio
+import json
+from pathlib import Path
+import subprocess
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+import pytest
+from toolbox.core.ansible import Ansible
+from toolbox.core.runner import RunnerBackend, to_toolbox_event
+
+OK_EVENT = {
+    "event": "runner_on_ok",
+    "stdout": "ok: [host1]",
+    "event_data": {
+        "host": "host1",
+        "task": "Install Vim",
+        "role": "editors/install",
+        "task_action": "apt",
+        "res": {"changed": True, "msg": "installed"},
+        "start": "2023-07-01T12:00:00+00:00",
+        "duration": 1.23456,
+    },
+}
+FAILED_EVENT = {
+    "event": "runner_on_failed",
+    "stdout": "fatal: [host2]: FAILED!",
+    "event_data": {
+        "host": "host2",
+        "task": "Install Vim",
+        "task_action": "apt",
+        "res": {"msg": ["no", "package"]},
+        "ignore_errors": None,
+    },
+}
+STATS_EVENT = {
+    "event": "playbook_on_stats",
+    "stdout": "PLAY RECAP",
+    "event_data": {
+        "ok": {"host1": 2},
+        "changed": {"host1": 1},
+        "failures": {"host2": 1},
+        "dark": {},
+        "skipped": {},
+        "rescued": {},
+        "ignored": {},
+    },
+}
+
+
+class FakeRunner:
+    def __init__(self, events: List[Dict[str, Any]], rc: int, wait: bool = False):
+        self.events = events
+        self.rc = rc
+        self.wait = wait
+        self.kwargs: Dict[str, Any] = {}
+
+    def run_async(self, **kwargs):
+        self.kwargs = kwargs
+
+        def run():
+            for event in self.events:
+                kwargs["event_handler"](event)
+            while self.wait and not kwargs["cancel_callback"]():
+                time.sleep(0.01)
+            status = "successful" if self.rc == 0 else "failed"
+            kwargs["finished_callback"](SimpleNamespace(rc=self.rc, status=status))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread, None
+
+
+class ProcessRunner(FakeRunner):
+    """Run a command in its own session, only killing the command when cancelled."""
+
+    def __init__(self, command: List[str]):
+        super().__init__([], rc=0)
+        self.command = command
+
+    def run_async(self, **kwargs):
+        self.kwargs = kwargs
+        process = subprocess.Popen(
+            self.command, stdout=subprocess.PIPE, text=True, start_new_session=True
+        )
+
+        def run():
+            line = process.stdout.readline().strip()
+            kwargs["event_handler"](
+                {"event": "verbose", "pid": process.pid, "stdout": line}
+            )
+            while process.poll() is None:
+                if kwargs["cancel_callback"]():
+                    process.kill()
+                time.sleep(0.01)
+            status = SimpleNamespace(rc=process.returncode, status="canceled")
+            kwargs["finished_callback"](status)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread, None
+
+
+def is_running(pid: int) -> bool:
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except FileNotFoundError:
+        return False
+    return stat.rsplit(")", 1)[1].split()[0] != "Z"
+
+
+@pytest.fixture(autouse=True)
+def backend():
+    with patch.object(RunnerBackend(), "enabled", True):
+        yield RunnerBackend()
+
+
+def test_task_result_event():
+    assert to_toolbox_event(OK_EVENT) == {
+        "event": "task_result",
+        "host": "host1",
+        "task": "Install Vim",
+        "role": "editors/install",
+        "action": "apt",
+        "status": "ok",
+        "changed": True,
+        "ignored": False,
+        "started": 1688212800.0,
+        "duration": 1.235,
+        "message": "installed",
+    }
+    event = to_toolbox_event(FAILED_EVENT)
+    assert event["status"] == "failed"
+    assert event["role"] is None
+    assert event["message"] == '["no", "package"]'
+    assert event["started"] == 0
+
+
+def test_stats_event():
+    assert to_toolbox_event(STATS_EVENT)["hosts"]["host2"] == {
+        "ok": 0,
+        "changed": 0,
+        "failures": 1,
+        "skipped": 0,
+        "unreachable": 0,
+        "rescued": 0,
+        "ignored": 0,
+    }
+    assert to_toolbox_event({"event": "playbook_on_start"}) is None
+
+
+def test_can_run(backend: RunnerBackend):
+    assert backend.can_run(["ansible-playbook", "install.yml"])
+    assert not backend.can_run(["ansible", "all", "-m", "ping"])
+    with patch.object(backend, "enabled", False):
+        assert not backend.can_run(["ansible-playbook", "install.yml"])
+
+
+def test_configure_without_ansible_runner(backend: RunnerBackend):
+    with patch("toolbox.core.runner.ansible_runner", None):
+        with pytest.raises(ValueError):
+            backend.configure(enabled=True)
+
+
+def test_run_streams_output_and_events(backend: RunnerBackend, tmp_path: Path):
+    runner = FakeRunner([OK_EVENT, FAILED_EVENT, STATS_EVENT], rc=0)
+    lines: List[str] = []
+    command = ["ansible-playbook", "install.yml", "--tags", "vim,git", "-i", "a,b,"]
+    with patch("toolbox.core.runner.ansible_runner", runner):
+        result = asyncio.run(
+            backend.run(command, tmp_path, {}, lines.append, tmp_path / "events")
+        )
+    assert result == "Ran ansible successfully."
+    assert lines == ["ok: [host1]\n", "fatal: [host2]: FAILED!\n", "PLAY RECAP\n"]
+    events = [
+        json.loads(line) for line in (tmp_path / "events").read_text().splitlines()
+    ]
+    assert [event["event"] for event in events] == ["task_result"] * 2 + ["stats"]
+    assert runner.kwargs["playbook"] == "install.yml"
+    assert runner.kwargs["cmdline"] == "--tags vim,git -i a,b,"
+    assert runner.kwargs["project_dir"] == str(tmp_path)
+    assert not Path(runner.kwargs["private_data_dir"]).exists()
+
+
+def test_run_failure(backend: RunnerBackend, tmp_path: Path):
+    runner = FakeRunner([FAILED_EVENT], rc=2)
+    with patch("toolbox.core.runner.ansible_runner", runner):
+        with pytest.raises(ValueError, match="FAILED!"):
+            asyncio.run(backend.run(["ansible-playbook", "install.yml"], tmp_path, {}))
+
+
+def test_cancel_stops_the_run(backend: RunnerBackend, tmp_path: Path):
+    runner = FakeRunner([OK_EVENT], rc=0, wait=True)
+
+    async def run():
+        task = asyncio.create_task(
+            backend.run(["ansible-playbook", "install.yml"], tmp_path, {})
+        )
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with patch("toolbox.core.runner.ansible_runner", runner):
+        asyncio.run(run())
+    assert runner.kwargs["cancel_callback"]()
+    assert not Path(runner.kwargs["private_data_dir"]).exists()
+
+
+def test_cancel_kills_process_group(backend: RunnerBackend, tmp_path: Path):
+    runner = ProcessRunner(["sh", "-c", "sleep 30 > /dev/null & echo $!; wait"])
+    lines: List[str] = []
+
+    async def run():
+        task = asyncio.create_task(
+            backend.run(["ansible-playbook", "install.yml"], tmp_path, {}, lines.append)
+        )
+        while lines == []:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with patch("toolbox.core.runner.ansible_runner", runner):
+        asyncio.run(run())
+
+    assert not is_running(int(lines[0]))
+
+
+def test_ansible_uses_runner_backend(tmp_path: Path):
+    runner = FakeRunner([OK_EVENT], rc=0)
+    ansible = Ansible(
+        inventory="host1", user="user", password="password", run_folder=tmp_path
+    )
+    with patch("toolbox.core.runner.ansible_runner", runner):
+        output = asyncio.run(ansible.run_command_async(ansible.get_command()))
+    assert output == "ok: [host1]\n"
+    assert "TOOLBOX_EVENTS_FILE" not in runner.kwargs["envvars"]
@@ -0,0 +1,51 @@
+from unittest.mock import patch
+
+import pytest
+from toolbox.core.sessions import SessionCache
+
+
+@pytest.fixture(autouse=True)
+def sessions():
+    SessionCache().clear()
+    yield SessionCache()
+    SessionCache().clear()
+
+
+def test_session_cache_singleton():
+    assert SessionCache() is SessionCache()
+
+
+def test_open_session(sessions: SessionCache):
+    first = sessions.open(b"k" * 32)
+    second = sessions.open(b"l" * 32)
+    assert first != second
+    assert sessions.get_key(first) == b"k" * 32
+    assert sessions.get_key(second) == b"l" * 32
+
+
+def test_session_expires(sessions: SessionCache):
+    with patch("toolbox.core.sessions.time.monotonic", return_value=100):
+        session_id = sessions.open(b"k" * 32)
+    with patch("toolbox.core.sessions.time.monotonic", return_value=100 + sessions.ttl):
+        with pytest.raises(ValueError, match="Unknown or expired session."):
+            sessions.get_key(session_id)
+
+
+def test_least_recently_used_session_is_closed(sessions: SessionCache):
+    with patch.object(SessionCache, "max_sessions", 2):
+        first = sessions.open(b"a" * 16)
+        second = sessions.open(b"b" * 16)
+        sessions.get_key(first)
+        sessions.open(b"c" * 16)
+        assert sessions.get_key(first) == b"a" * 16
+        with pytest.raises(ValueError):
+            sessions.get_key(second)
+
+
+def test_close_session(sessions: SessionCache):
+    session_id = sessions.open(b"k" * 32)
+    sessions.close(session_id)
+    with pytest.raises(ValueError):
+        sessions.get_key(session_id)
+    with pytest.raises(ValueError):
+        sessions.close(session_id)
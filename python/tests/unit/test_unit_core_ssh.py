@@ -0,0 +1,139 @@
+from pathlib import Path
+import shlex
+import socket
+from unittest.mock import patch
+
+import pytest
+from toolbox.core.ansible import Ansible
+from toolbox.core.ssh import SSHMultiplexer
+
+
+@pytest.fixture(autouse=True)
+def control_dir(tmp_path: Path):
+    with patch.object(SSHMultiplexer, "control_dir", tmp_path / "ssh"):
+        with patch.object(SSHMultiplexer, "control_persist", 600):
+            yield tmp_path / "ssh"
+
+
+def test_ssh_multiplexer_singleton():
+    assert SSHMultiplexer() is SSHMultiplexer()
+
+
+def test_get_config(control_dir: Path):
+    config = SSHMultiplexer().get_config()
+    assert "Host *\n" in config
+    assert "    ControlMaster auto\n" in config
+    assert f"    ControlPath {control_dir}/%C\n" in config
+    assert "    ControlPersist 600\n" in config
+
+
+def test_get_config_path_writes_config(control_dir: Path):
+    config_path = SSHMultiplexer().get_config_path()
+    assert config_path == control_dir / "config"
+    assert config_path.read_text() == SSHMultiplexer().get_config()
+    assert config_path.stat().st_mode & 0o777 == 0o600
+
+
+def test_get_ssh_args(control_dir: Path):
+    control_path = SSHMultiplexer().get_control_path("user", "password")
+    assert SSHMultiplexer().get_ssh_args("user", "password") == [
+        "-F",
+        str(control_dir / "config"),
+        "-o",
+        f"ControlPath={control_path}",
+    ]
+
+
+def test_control_path_depends_on_credentials(control_dir: Path):
+    control_path = SSHMultiplexer().get_control_path("user", "password")
+    assert control_path.startswith(f"{control_dir}/")
+    assert control_path.endswith("-%C")
+    assert "password" not in control_path
+    assert control_path == SSHMultiplexer().get_control_path("user", "password")
+    assert control_path != SSHMultiplexer().get_control_path("user", "wrong")
+    assert control_path != SSHMultiplexer().get_control_path("other", "password")
+
+
+def test_get_ansible_env(control_dir: Path):
+    env = SSHMultiplexer().get_ansible_env("user", "password")
+    assert shlex.split(env["ANSIBLE_SSH_ARGS"]) == [
+        "-C",
+        *SSHMultiplexer().get_ssh_args("user", "password"),
+    ]
+
+
+def test_disabled_multiplexing(control_dir: Path):
+    SSHMultiplexer().configure(control_persist=0)
+    try:
+        assert not SSHMultiplexer().is_enabled()
+        assert SSHMultiplexer().get_ssh_args("user", "password") == []
+        assert SSHMultiplexer().get_ansible_env("user", "password") == {}
+        assert not control_dir.exists()
+    finally:
+        SSHMultiplexer().configure(control_persist=600)
+
+
+def test_configure_negative_persist():
+    with pytest.raises(ValueError):
+        SSHMultiplexer().configure(control_persist=-1)
+
+
+def test_ansible_env_uses_shared_connections(control_dir: Path):
+    ansible = Ansible(user="user", password="password", inventory="host1")
+    env = ansible.get_env()
+    assert (
+        env["ANSIBLE_SSH_ARGS"]
+        == SSHMultiplexer().get_ansible_env("user", "password")["ANSIBLE_SSH_ARGS"]
+    )
+
+
+def test_verify_auth_uses_shared_connections(control_dir: Path, mocker):
+    run = mocker.patch(
+        "subprocess.run",
+        return_value=mocker.Mock(returncode=0, stdout=b"success\n", stderr=b""),
+    )
+    ansible = Ansible(user="user", password="password", inventory="host1")
+
+    ansible.verify_auth()
+
+    command = run.call_args.args[0]
+    assert command[command.index("-F") + 1] == str(control_dir / "config")
+    assert f"ControlPath={SSHMultiplexer().get_control_path('user', 'password')}" in (
+        command
+    )
+
+
+def test_verify_auth_wrong_password_does_not_reuse_connections(
+    control_dir: Path, mocker
+):
+    run = mocker.patch(
+        "subprocess.run",
+        return_value=mocker.Mock(returncode=0, stdout=b"success\n", stderr=b""),
+    )
+    Ansible(user="user", password="password", inventory="host1").verify_auth()
+    right = run.call_args.args[0]
+    Ansible(user="user", password="wrong", inventory="host1").verify_auth()
+    wrong = run.call_args.args[0]
+
+    control_paths = [
+        [arg for arg in command if arg.startswith("ControlPath=")]
+        for command in (right, wrong)
+    ]
+    assert control_paths[0] != control_paths[1]
+
+
+def test_close_all(control_dir: Path, mocker):
+    run = mocker.patch("subprocess.run")
+    control_dir.mkdir()
+    server = socket.socket(socket.AF_UNIX)
+    server.bind(str(control_dir / "abc"))
+    (control_dir / "config").write_text("")
+
+    assert SSHMultiplexer().get_sockets() == [control_dir / "abc"]
+    SSHMultiplexer().close_all()
+    server.close()
+
+    command = run.call_args.args[0]
+    assert f"ControlPath={control_dir / 'abc'}" in command
+    assert "exit" in command
+    assert SSHMultiplexer().get_sockets() == []
@@ -0,0 +1,46 @@
+from typing import List
+
+from toolbox.core.results import TaskResult
+from toolbox.core.timings import (
+    get_role_durations,
+    get_slowest_tasks,
+)
+
+
+def run_results(durations: dict) -> List[TaskResult]:
+    return [
+        TaskResult(host=host, role=role, task=task, status="ok", duration=duration)
+        for (host, role, task), duration in durations.items()
+    ]
+
+
+def test_get_slowest_tasks():
+    results = run_results(
+        {
+            ("host1", None, "Gathering Facts"): 2,
+            ("host1", "docker", "Install docker"): 30,
+            ("host1", "docker", "Add repository"): 5,
+            ("host2", "docker", "Install docker"): 20,
+        }
+    )
+    slowest = get_slowest_tasks(iter(results), 2)
+    assert [task.task for task in slowest["host1"]] == [
+        "Install docker",
+        "Add repository",
+    ]
+    assert [task.duration for task in slowest["host2"]] == [20]
+
+
+def test_get_role_durations():
+    results = run_results(
+        {
+            ("host1", None, "Gathering Facts"): 2,
+            ("host1", "docker", "Install docker"): 30,
+            ("host1", "docker", "Add repository"): 5.5,
+            ("host2", "k3s", "Install k3s"): 20,
+        }
+    )
+    assert get_role_durations(results) == {
+        "host1": {"": 2, "docker": 35.5},
+        "host2": {"k3s": 20},
+    }
@@ -64,22 +64,23 @@ def test_mount_api_with_endpoints(
     assert app.routes[13].path == "/api/target/ping"
     assert app.routes[14].path == "/api/target/install"
     assert app.routes[15].path == "/api/target/uninstall"
-    assert app.routes[16].path == "/api/target"
-    assert app.routes[17].path == "/api/editor/files"
-    assert app.routes[18].path == "/api/editor/file/read"
-    assert app.routes[19].path == "/api/editor/file/write"
-    assert app.routes[20].path == "/api/editor/file/create"
-    assert app.routes[21].path == "/api/editor/file/delete"
-    assert app.routes[22].path == "/api/editor/file/rename"
-    assert app.routes[23].path == "/api/editor/folder/create"
-    assert app.routes[24].path == "/api/editor/folder/delete"
-    assert app.routes[25].path == "/api/editor/folder/delete/confirmed"
-    assert app.routes[26].path == "/api/editor/folder/rename"
-    assert app.routes[27].path == "/api/editor"
-    assert app.routes[28].path == "/api/custom/playbooks"
-    assert app.routes[29].path == "/api/custom/inventories"
-    assert app.routes[30].path == "/api/custom/run"
-    assert app.routes[31].path == "/api/custom"
+    assert app.routes[16].path == "/api/target/facts/warm"
+    assert app.routes[17].path == "/api/target"
+    assert app.routes[18].path == "/api/editor/files"
+    assert app.routes[19].path == "/api/editor/file/read"
+    assert app.routes[20].path == "/api/editor/file/write"
+    assert app.routes[21].path == "/api/editor/file/create"
+    assert app.routes[22].path == "/api/editor/file/delete"
+    assert app.routes[23].path == "/api/editor/file/rename"
+    assert app.routes[24].path == "/api/editor/folder/create"
+    assert app.routes[25].path == "/api/editor/folder/delete"
+    assert app.routes[26].path == "/api/editor/folder/delete/confirmed"
+    assert app.routes[27].path == "/api/editor/folder/rename"
+    assert app.routes[28].path == "/api/editor"
+    assert app.routes[29].path == "/api/custom/playbooks"
+    assert app.routes[30].path == "/api/custom/inventories"
+    assert app.routes[31].path == "/api/custom/run"
+    assert app.routes[32].path == "/api/custom"
 
 
 def test_mount_api_without_endpoints():
@@ -104,22 +105,23 @@ def test_mount_api_without_endpoints():
     assert app.routes[13].path == "/api/target/ping"
     assert app.routes[14].path == "/api/target/install"
     assert app.routes[15].path == "/api/target/uninstall"
-    assert app.routes[16].path == "/api/target"
-    assert app.routes[17].path == "/api/editor/files"
-    assert app.routes[18].path == "/api/editor/file/read"
-    assert app.routes[19].path == "/api/editor/file/write"
-    assert app.routes[20].path == "/api/editor/file/create"
-    assert app.routes[21].path == "/api/editor/file/delete"
-    assert app.routes[22].path == "/api/editor/file/rename"
-    assert app.routes[23].path == "/api/editor/folder/create"
-    assert app.routes[24].path == "/api/editor/folder/delete"
-    assert app.routes[25].path == "/api/editor/folder/delete/confirmed"
-    assert app.routes[26].path == "/api/editor/folder/rename"
-    assert app.routes[27].path == "/api/editor"
-    assert app.routes[28].path == "/api/custom/playbooks"
-    assert app.routes[29].path == "/api/custom/inventories"
-    assert app.routes[30].path == "/api/custom/run"
-    assert app.routes[31].path == "/api/custom"
+    assert app.routes[16].path == "/api/target/facts/warm"
+    assert app.routes[17].path == "/api/target"
+    assert app.routes[18].path == "/api/editor/files"
+    assert app.routes[19].path == "/api/editor/file/read"
+    assert app.routes[20].path == "/api/editor/file/write"
+    assert app.routes[21].path == "/api/editor/file/create"
+    assert app.routes[22].path == "/api/editor/file/delete"
+    assert app.routes[23].path == "/api/editor/file/rename"
+    assert app.routes[24].path == "/api/editor/folder/create"
+    assert app.routes[25].path == "/api/editor/folder/delete"
+    assert app.routes[26].path == "/api/editor/folder/delete/confirmed"
+    assert app.routes[27].path == "/api/editor/folder/rename"
+    assert app.routes[28].path == "/api/editor"
+    assert app.routes[29].path == "/api/custom/playbooks"
+    assert app.routes[30].path == "/api/custom/inventories"
+    assert app.routes[31].path == "/api/custom/run"
+    assert app.routes[32].path == "/api/custom"
 
 
 def test_if_mount_api_returns_fastapi_app():
@@ -0,0 +1,25 @@
+/**
+ * Summarize the response of /api/target/ping.
+ *
+ * The endpoint returns the reachability of every host,
+ * { host: { reachable, message } }, which is turned into one line per host.
+ *
+ * @param {Object} results The reachability of every host.
+ * @returns {{ message: string, unreachable: string[], total: number }}
+ *   The lines to show, the hosts that could not be reached and the number of
+ *   hosts pinged.
+ */
+export default function summarizePing(results) {
+	const hosts = Object.keys(results);
+	const unreachable = hosts.filter((host) => !results[host].reachable);
+	const message = hosts
+		.map((host) => {
+			const { reachable, message: hostMessage } = results[host];
+			const status = reachable ? 'reachable' : 'not reachable';
+			return hostMessage
+				? `${host}: ${status}, ${hostMessage}`
+				: `${host}: ${status}`;
+		})
+		.join('\n');
+	return { message, unreachable, total: hosts.length };
+}
@@ -0,0 +1,24 @@
+/* global describe, test, expect */
+import summarizePing from './ping';
+
+describe('summarizePing', () => {
+	test('lists the reachability of every host', () => {
+		const summary = summarizePing({
+			host1: { reachable: true, message: 'pong' },
+			host2: { reachable: false, message: 'Permission denied.' },
+		});
+
+		expect(summary.message).toBe(
+			'host1: reachable, pong\nhost2: not reachable, Permission denied.'
+		);
+		expect(summary.unreachable).toEqual(['host2']);
+		expect(summary.total).toBe(2);
+	});
+
+	test('reports no unreachable hosts when all answered', () => {
+		const summary = summarizePing({ host1: { reachable: true, message: '' } });
+
+		expect(summary.message).toBe('host1: reachable');
+		expect(summary.unreachable).toEqual([]);
+	});
+});
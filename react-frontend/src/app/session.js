@@ -0,0 +1,131 @@
+import forge from 'node-forge';
+
+const SESSION_KEY_SIZE = 32;
+const NONCE_SIZE = 12;
+const SESSION_EXPIRED = 'Unknown or expired session.';
+
+let session = null;
+
+/**
+ * Encrypt a value with the public key of the server (RSA-OAEP with SHA-256).
+ *
+ * @param {string} publicKeyPem The public key, in PEM format.
+ * @param {string} value The value, as a binary string.
+ * @returns {string} The base64 of the encrypted value.
+ */
+function encryptWithPublicKey(publicKeyPem, value) {
+	const publicKey = forge.pki.publicKeyFromPem(publicKeyPem);
+	const encrypted = publicKey.encrypt(value, 'RSA-OAEP', {
+		md: forge.md.sha256.create(),
+		mgf1: {
+			md: forge.md.sha256.create(),
+		},
+	});
+	return forge.util.encode64(encrypted);
+}
+
+/**
+ * Encrypt the fields as a json object with an AES-GCM key.
+ *
+ * @param {string} key The AES key, as a binary string.
+ * @param {Object} fields The fields to encrypt.
+ * @returns {{ iv: string, data: string }} The base64 of the nonce, and of the
+ *   encrypted json object followed by its tag.
+ */
+export function seal(key, fields) {
+	const iv = forge.random.getBytesSync(NONCE_SIZE);
+	const cipher = forge.cipher.createCipher('AES-GCM', key);
+	cipher.start({ iv, tagLength: 128 });
+	cipher.update(forge.util.createBuffer(JSON.stringify(fields), 'utf8'));
+	cipher.finish();
+	return {
+		iv: forge.util.encode64(iv),
+		data: forge.util.encode64(
+			cipher.output.getBytes() + cipher.mode.tag.getBytes()
+		),
+	};
+}
+
+/**
+ * Open a session with the server, sending it a new AES key.
+ *
+ * The key is encrypted with the public key of the server, which is the only
+ * private key operation of the session on the server.
+ *
+ * @param {string} publicKeyPem The public key of the server, in PEM format.
+ * @returns {Promise<Object>} The session, with its id, key and expiry time.
+ */
+export async function openSession(publicKeyPem) {
+	const key = forge.random.getBytesSync(SESSION_KEY_SIZE);
+	const response = await fetch(`${window.location.origin}/api/session`, {
+		method: 'PUT',
+		headers: {
+			'Content-Type': 'application/json',
+		},
+		body: JSON.stringify({ key: encryptWithPublicKey(publicKeyPem, key) }),
+	});
+	const data = await response.json();
+	if (!response.ok) {
+		throw new Error(data.detail);
+	}
+	session = {
+		id: data.session,
+		key,
+		expiresAt: Date.now() + data.expires_in * 1000,
+	};
+	return session;
+}
+
+/**
+ * Forget the current session, so that the next request opens a new one.
+ */
+export function resetSession() {
+	session = null;
+}
+
+const getSession = async (publicKeyPem) => {
+	if (session === null || session.expiresAt <= Date.now()) {
+		return openSession(publicKeyPem);
+	}
+	return session;
+};
+
+const isSessionExpired = async (response) => {
+	if (response.status !== 400) {
+		return false;
+	}
+	const data = await response.clone().json();
+	return data.detail === SESSION_EXPIRED;
+};
+
+/**
+ * Send a PUT request with the fields sealed with the key of the session.
+ *
+ * A session is opened if there is none yet or it has expired. If the server no
+ * longer knows the session, a new one is opened and the request sent again.
+ *
+ * @param {string} url The url of the endpoint.
+ * @param {string} publicKeyPem The public key of the server, in PEM format.
+ * @param {Object} fields The fields of the request.
+ * @returns {Promise<Response>} The response of the request.
+ */
+export async function putSealed(url, publicKeyPem, fields) {
+	const send = async () => {
+		const { id, key } = await getSession(publicKeyPem);
+		return fetch(url, {
+			method: 'PUT',
+			headers: {
+				'Content-Type': 'application/json',
+			},
+			body: JSON.stringify({
+				envelope: { session: id, ...seal(key, fields) },
+			}),
+		});
+	};
+	const response = await send();
+	if (!(await isSessionExpired(response))) {
+		return response;
+	}
+	resetSession();
+	return send();
+}
@@ -0,0 +1,95 @@
+/* global jest, describe, test, expect, beforeEach */
+import forge from 'node-forge';
+import { putSealed, resetSession, seal } from './session';
+
+const keyPair = forge.pki.rsa.generateKeyPair({ bits: 1024, e: 0x10001 });
+const publicKeyPem = forge.pki.publicKeyToPem(keyPair.publicKey);
+
+const decryptKey = (encryptedKey) =>
+	keyPair.privateKey.decrypt(forge.util.decode64(encryptedKey), 'RSA-OAEP', {
+		md: forge.md.sha256.create(),
+		mgf1: {
+			md: forge.md.sha256.create(),
+		},
+	});
+
+const open = (key, envelope) => {
+	const data = forge.util.decode64(envelope.data);
+	const decipher = forge.cipher.createDecipher('AES-GCM', key);
+	decipher.start({
+		iv: forge.util.decode64(envelope.iv),
+		tag: forge.util.createBuffer(data.slice(-16)),
+	});
+	decipher.update(forge.util.createBuffer(data.slice(0, -16)));
+	expect(decipher.finish()).toBe(true);
+	return JSON.parse(forge.util.decodeUtf8(decipher.output.getBytes()));
+};
+
+const jsonResponse = (status, body) => ({
+	status,
+	ok: status === 200,
+	json: () => Promise.resolve(body),
+	clone() {
+		return this;
+	},
+});
+
+describe('seal', () => {
+	test('encrypts the fields with AES-GCM', () => {
+		const key = forge.random.getBytesSync(32);
+		const envelope = seal(key, { user: 'user', password: 'pässword' });
+
+		expect(forge.util.decode64(envelope.iv)).toHaveLength(12);
+		expect(open(key, envelope)).toEqual({ user: 'user', password: 'pässword' });
+	});
+});
+
+describe('putSealed', () => {
+	let sessionKeys;
+
+	beforeEach(() => {
+		resetSession();
+		sessionKeys = [];
+		global.fetch = jest.fn((url, options) => {
+			const body = JSON.parse(options.body);
+			if (url.endsWith('/api/session')) {
+				sessionKeys.push(decryptKey(body.key));
+				return Promise.resolve(
+					jsonResponse(200, {
+						session: `session${sessionKeys.length}`,
+						expires_in: 3600,
+					})
+				);
+			}
+			const { session, ...envelope } = body.envelope;
+			if (session === 'session1' && sessionKeys.length === 1) {
+				return Promise.resolve(
+					jsonResponse(400, { detail: 'Unknown or expired session.' })
+				);
+			}
+			const key = sessionKeys[Number(session.slice(-1)) - 1];
+			return Promise.resolve(jsonResponse(200, open(key, envelope)));
+		});
+	});
+
+	test('opens a new session when the server forgot the old one', async () => {
+		const response = await putSealed('/api/target/ping', publicKeyPem, {
+			hosts: 'host1',
+		});
+
+		expect(response.status).toBe(200);
+		expect(await response.json()).toEqual({ hosts: 'host1' });
+		expect(sessionKeys).toHaveLength(2);
+	});
+
+	test('reuses the session', async () => {
+		await putSealed('/api/target/ping', publicKeyPem, { hosts: 'host1' });
+		const response = await putSealed('/api/target/ping', publicKeyPem, {
+			hosts: 'host2',
+		});
+
+		expect(await response.json()).toEqual({ hosts: 'host2' });
+		expect(sessionKeys).toHaveLength(2);
+		expect(global.fetch).toHaveBeenCalledTimes(5);
+	});
+});
@@ -1,6 +1,5 @@
 import React, { useEffect, useState } from 'react';
 import { useDispatch, useSelector } from 'react-redux';
-import * as forge from 'node-forge';
 import Paper from '@mui/material/Paper';
 import Stack from '@mui/material/Stack';
 import Grid from '@mui/material/Grid';
@@ -17,6 +16,7 @@ import Backdrop from '@mui/material/Backdrop';
 import CircularProgress from '@mui/material/CircularProgress';
 import SvgIcon from '@mui/material/SvgIcon';
 
+import { putSealed } from '../../app/session';
 import BackgroundImage from './BackgroundImage.jpg';
 
 import { ReactComponent as LinuxImage } from './linux.svg';
@@ -76,36 +76,15 @@ export default function ConfigureTarget() {
 		);
 	}
 
-	const publicKey = forge.pki.publicKeyFromPem(rsaKey);
-	const encrypt = (text) => {
-		const encrypted = publicKey.encrypt(text, 'RSA-OAEP', {
-			md: forge.md.sha256.create(),
-			mgf1: {
-				md: forge.md.sha256.create(),
-			},
-		});
-		return forge.util.encode64(encrypted);
-	};
-
 	const handleClick = () => {
-		const encryptedUsername = encrypt(username);
-		const encryptedPassword = encrypt(password);
 		let hostsRaw = hosts.replace(/,|\s|\n/g, ',');
 		hostsRaw = hostsRaw.replace(/,{2,}/g, ',').replace(/,$/, '');
-		const encryptedHosts = encrypt(hostsRaw);
-		const encryptedOs = encrypt(os);
 
-		fetch(`${window.location.origin}/api/target/configure`, {
-			method: 'PUT',
-			headers: {
-				'Content-Type': 'application/json',
-			},
-			body: JSON.stringify({
-				user: encryptedUsername,
-				password: encryptedPassword,
-				hosts: encryptedHosts,
-				os: encryptedOs,
-			}),
+		putSealed(`${window.location.origin}/api/target/configure`, rsaKey, {
+			user: username,
+			password,
+			hosts: hostsRaw,
+			os,
 		})
 			.then((response) => [response.json(), response.ok])
 			.then(async (dataParam) => {
@@ -1,5 +1,4 @@
 import React, { useEffect, useState } from 'react';
-import forge from 'node-forge';
 import {
 	Alert,
 	Backdrop,
@@ -19,6 +18,9 @@ import {
 } from '@mui/material';
 import CloseIcon from '@mui/icons-material/Close';
 
+import summarizePing from '../../app/ping';
+import { putSealed } from '../../app/session';
+
 // eslint-disable-next-line
 export default function CustomForm({ playbookPath, inventoryPath }) {
 	const [rsaKey, setRsaKey] = useState('');
@@ -54,21 +56,6 @@ export default function CustomForm({ playbookPath, inventoryPath }) {
 	useEffect(() => {
 		fetchRSAKey();
 	}, []);
-	let publicKey = '';
-	if (rsaKey !== '') {
-		publicKey = forge.pki.publicKeyFromPem(rsaKey);
-	} else {
-		publicKey = '';
-	}
-	const encrypt = (text) => {
-		const encrypted = publicKey.encrypt(text, 'RSA-OAEP', {
-			md: forge.md.sha256.create(),
-			mgf1: {
-				md: forge.md.sha256.create(),
-			},
-		});
-		return forge.util.encode64(encrypted);
-	};
 
 	if (rsaKey === '') {
 		return (
@@ -83,21 +70,12 @@ export default function CustomForm({ playbookPath, inventoryPath }) {
 
 	const handlePing = () => {
 		setBackdropOpen(true);
-		const encryptedUsername = encrypt(username);
-		const encryptedPassword = encrypt(password);
-		const encryptedHosts = encrypt(inventoryPath);
 
-		fetch(`${window.location.origin}/api/target/ping`, {
-			method: 'PUT',
-			headers: {
-				'Content-Type': 'application/json',
-			},
-			body: JSON.stringify({
-				hosts: encryptedHosts,
-				user: encryptedUsername,
-				password: encryptedPassword,
-				verbosity,
-			}),
+		putSealed(`${window.location.origin}/api/target/ping`, rsaKey, {
+			hosts: inventoryPath,
+			user: username,
+			password,
+			verbosity,
 		})
 			.then((response) => [response.json(), response.ok])
 			.then(async (dataParam) => {
@@ -106,11 +84,19 @@ export default function CustomForm({ playbookPath, inventoryPath }) {
 				if (!status) {
 					throw new Error(data.detail);
 				}
+				const { message, unreachable, total } = summarizePing(data);
 				setSnackbarOpen(true);
-				setSnackbarMessage('Ping successful');
+				if (unreachable.length === 0) {
+					setSnackbarMessage('Ping successful');
+					setMessageColor('success');
+				} else {
+					setSnackbarMessage(
+						`Ping failed on ${unreachable.length} of ${total} hosts`
+					);
+					setMessageColor(unreachable.length === total ? 'error' : 'warning');
+				}
 				setBackdropOpen(false);
-				setMessageColor('success');
-				setDialogMessage(data);
+				setDialogMessage(message);
 			})
 			.catch((error) => {
 				setSnackbarOpen(true);
@@ -123,36 +109,22 @@ export default function CustomForm({ playbookPath, inventoryPath }) {
 
 	const handleRun = () => {
 		setBackdropOpen(true);
-		const encryptedUsername = encrypt(username);
-		const encryptedPassword = encrypt(password);
-		const encryptedPlaybook = encrypt(playbookPath);
-		const encryptedInventory = encrypt(inventoryPath);
-		const encryptedTags = encrypt(tags);
-		const encryptedExtraArgs = encrypt(extraArgs);
 		// select all extraVars where key and value are not empty
-		const encryptedExtraVars = encrypt(
-			JSON.stringify(
-				extraVars.filter(
-					(extraVar) => extraVar.key !== '' && extraVar.value !== ''
-				)
+		const selectedExtraVars = JSON.stringify(
+			extraVars.filter(
+				(extraVar) => extraVar.key !== '' && extraVar.value !== ''
 			)
 		);
 
-		fetch(`${window.location.origin}/api/custom/run`, {
-			method: 'PUT',
-			headers: {
-				'Content-Type': 'application/json',
-			},
-			body: JSON.stringify({
-				playbook: encryptedPlaybook,
-				hosts: encryptedInventory,
-				user: encryptedUsername,
-				password: encryptedPassword,
-				verbosity,
-				tags: encryptedTags,
-				extra_args: encryptedExtraArgs,
-				extra_vars: encryptedExtraVars,
-			}),
+		putSealed(`${window.location.origin}/api/custom/run`, rsaKey, {
+			playbook: playbookPath,
+			hosts: inventoryPath,
+			user: username,
+			password,
+			verbosity,
+			tags,
+			extra_args: extraArgs,
+			extra_vars: selectedExtraVars,
 		})
 			.then((response) => [response.json(), response.ok])
 			.then(async (dataParam) => {
@@ -1,6 +1,5 @@
 import React, { useEffect, useState } from 'react';
 import { useDispatch, useSelector } from 'react-redux';
-import * as forge from 'node-forge';
 import Grid from '@mui/material/Grid';
 import Paper from '@mui/material/Paper';
 import Stack from '@mui/material/Stack';
@@ -21,6 +20,8 @@ import DialogContentText from '@mui/material/DialogContentText';
 import DialogTitle from '@mui/material/DialogTitle';
 import { useNavigate } from 'react-router-dom';
 
+import summarizePing from '../../app/ping';
+import { putSealed } from '../../app/session';
 import BackgroundImage from './BackgroundImage.jpg';
 
 export default function Home() {
@@ -137,40 +138,15 @@ export default function Home() {
 		dispatch({ type: 'hosts/setHosts', payload: value });
 	};
 
-	let publicKey = '';
-	if (rsaKey !== '') {
-		publicKey = forge.pki.publicKeyFromPem(rsaKey);
-	} else {
-		publicKey = '';
-	}
-	const encrypt = (text) => {
-		const encrypted = publicKey.encrypt(text, 'RSA-OAEP', {
-			md: forge.md.sha256.create(),
-			mgf1: {
-				md: forge.md.sha256.create(),
-			},
-		});
-		return forge.util.encode64(encrypted);
-	};
-
 	const handlePing = () => {
 		setBackdropOpen(true);
-		const encryptedUsername = encrypt(username);
-		const encryptedPassword = encrypt(password);
 		let hostsRaw = hosts.replace(/,|\s|\n/g, ',');
 		hostsRaw = hostsRaw.replace(/,{2,}/g, ',').replace(/,$/, '');
-		const encryptedHosts = encrypt(hostsRaw);
 
-		fetch(`${window.location.origin}/api/target/ping`, {
-			method: 'PUT',
-			headers: {
-				'Content-Type': 'application/json',
-			},
-			body: JSON.stringify({
-				hosts: encryptedHosts,
-				user: encryptedUsername,
-				password: encryptedPassword,
-			}),
+		putSealed(`${window.location.origin}/api/target/ping`, rsaKey, {
+			hosts: hostsRaw,
+			user: username,
+			password,
 		})
 			.then((response) => [response.json(), response.ok])
 			.then(async (dataParam) => {
@@ -179,12 +155,20 @@ export default function Home() {
 				if (!status) {
 					throw new Error(data.detail);
 				}
+				const { message, unreachable, total } = summarizePing(data);
 				setShowNavigateButton(false);
 				setSnackbarOpen(true);
-				setSnackbarMessage('Ping successful');
+				if (unreachable.length === 0) {
+					setSnackbarMessage('Ping successful');
+					setMessageColor('success');
+				} else {
+					setSnackbarMessage(
+						`Ping failed on ${unreachable.length} of ${total} hosts`
+					);
+					setMessageColor(unreachable.length === total ? 'error' : 'warning');
+				}
 				setBackdropOpen(false);
-				setMessageColor('success');
-				setDialogMessage(data);
+				setDialogMessage(message);
 			})
 			.catch((error) => {
 				if (error.message.includes('Failed to fetch')) {
@@ -202,24 +186,15 @@ export default function Home() {
 
 	const handleInstallUninstall = (install) => {
 		setBackdropOpen(true);
-		const encryptedUsername = encrypt(username);
-		const encryptedPassword = encrypt(password);
 		let hostsRaw = hosts.replace(/,|\s|\n/g, ',');
 		hostsRaw = hostsRaw.replace(/,{2,}/g, ',').replace(/,$/, '');
-		const encryptedHosts = encrypt(hostsRaw);
 
 		const apiUrl = install ? '/api/target/install' : '/api/target/uninstall';
-		fetch(window.location.origin + apiUrl, {
-			method: 'PUT',
-			headers: {
-				'Content-Type': 'application/json',
-			},
-			body: JSON.stringify({
-				hosts: encryptedHosts,
-				user: encryptedUsername,
-				password: encryptedPassword,
-				tags: selectedTags,
-			}),
+		putSealed(window.location.origin + apiUrl, rsaKey, {
+			hosts: hostsRaw,
+			user: username,
+			password,
+			tags: selectedTags,
 		})
 			.then((response) => [response.json(), response.ok])
 			.then(async (dataParam) => {